@@ -0,0 +1,236 @@
+from pathlib import Path
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+from time import time
+from typing import Tuple, Dict, Optional, Callable, List
+
+import numba
+import numpy as np
+
+from basic.image.ToolsManager import ToolsManager
+from basic.image.numba_threading import configure_numba_threading_layer
+from basic.network.core.time_ms import time_ms
+
+
+class PipelineStage:
+    """Один этап конвейера: берёт кадр из входной очереди, обрабатывает и кладёт в выходную."""
+
+    def __init__(self, name: str, handler: Callable[[Dict], Dict],
+                 input_queue: Optional[Queue], output_queue: Queue, stop_event: Event):
+        self.name = name
+        self.handler = handler
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.stop_event = stop_event
+        self.frames = 0
+        self.busy_time = 0.0
+        self.error: Optional[Exception] = None
+        self._started_time = None
+        self._thread = Thread(target=self._run, name=f"{name}Stage", daemon=True)
+
+    def start(self) -> None:
+        self._started_time = time()
+        self._thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._thread.join(timeout)
+
+    def _get(self) -> Optional[Dict]:
+        if self.input_queue is None:
+            return dict()
+        while not self.stop_event.is_set():
+            try:
+                return self.input_queue.get(timeout=0.1)
+            except Empty:
+                continue
+        return None
+
+    def _put(self, frame: Dict) -> bool:
+        while not self.stop_event.is_set():
+            try:
+                self.output_queue.put(frame, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _run(self) -> None:
+        try:
+            while not self.stop_event.is_set():
+                frame = self._get()
+                if frame is None:
+                    break
+                _start_time = time()
+                frame = self.handler(frame)
+                self.busy_time += time() - _start_time
+                self.frames += 1
+                if not self._put(frame):
+                    break
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+            print(f"{self.name}: {e}")
+
+    def get_stats(self) -> Dict:
+        elapsed = time() - self._started_time if self._started_time is not None else 0.0
+        return {
+            "frames": self.frames,
+            "mean_time": self.busy_time / self.frames if self.frames else 0.0,
+            "throughput": self.frames / elapsed if elapsed > 0 else 0.0,
+            "utilization": self.busy_time / elapsed if elapsed > 0 else 0.0,
+            "queue_depth": self.output_queue.qsize(),
+        }
+
+
+class EncodePipeline:
+    """
+    Конвейерный режим кодирования: этапы работают в отдельных потоках и перекрываются между кадрами.
+
+    capture:    open -> convert -> resize -> quantize (новый опорный кадр)
+    difference: compute_difference -> pack -> update_reference
+    compress:   compress
+
+    Разность вычисляется строго по порядку кадров в одном потоке, и после каждого кадра
+    опорный кадр обновляется, поэтому каждый кадр на выходе нужно отправить клиенту
+    (пропуск кадра нарушит восстановление на стороне клиента).
+    Очереди ограничены, поэтому при медленной отправке захват останавливается, а не копит кадры.
+    """
+
+    def __init__(self, tools_manager: ToolsManager, queue_size: int = 1, path: Optional[Path] = None):
+        self.name = self.__class__.__name__
+        self.tools_manager = tools_manager
+        self.path = path
+        self._stop_event = Event()
+        self._quantized_queue = Queue(maxsize=queue_size)
+        self._packed_queue = Queue(maxsize=queue_size)
+        self._compressed_queue = Queue(maxsize=queue_size)
+        self.stages: List[PipelineStage] = [
+            PipelineStage("capture", self._capture, None, self._quantized_queue, self._stop_event),
+            PipelineStage("difference", self._difference, self._quantized_queue, self._packed_queue, self._stop_event),
+            PipelineStage("compress", self._compress, self._packed_queue, self._compressed_queue, self._stop_event),
+        ]
+        self._started = False
+
+    def _capture(self, frame: Dict) -> Dict:
+        frame["captured_time_ms"] = time_ms()
+        frame["stats"], frame["reference"] = self.tools_manager.capture_reference(self.path)
+        return frame
+
+    def _difference(self, frame: Dict) -> Dict:
+        stats = frame["stats"]
+        stats["time_to_compute_difference"], data = self.tools_manager.compute_difference(frame["reference"])
+        stats["time_to_pack"], frame["packed"] = self.tools_manager.pack(data, stats.get("palette"))
+        # Следующий кадр сравнивается с этим: кадр обязательно будет отправлен
+        self.tools_manager.update_reference(frame["reference"])
+        return frame
+
+    def _compress(self, frame: Dict) -> Dict:
+        stats = frame["stats"]
+        stats["time_to_compress"], frame["compressed"] = self.tools_manager.compress(frame.pop("packed"))
+        stats.update(self.tools_manager.get_compression_stats())
+        stats["encoded_size"] = len(frame["compressed"])
+        frame["encoded_time_ms"] = time_ms()
+        stats["total_time"] = (frame["encoded_time_ms"] - frame["captured_time_ms"]) / 1000
+        return frame
+
+    @property
+    def running(self) -> bool:
+        return self._started and not self._stop_event.is_set()
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        # Этапы запускают ядра numba из своих потоков: см. configure_numba_threading_layer
+        if not configure_numba_threading_layer() and numba.threading_layer() == "tbb":
+            print(f"{self.name}: numba threading layer is already tbb, "
+                  f"call configure_numba_threading_layer before the first kernel")
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self) -> None:
+        """
+        Останавливает этапы и ждёт их завершения без таймаута: этап проверяет _stop_event между кадрами
+        и в ожидании очередей, поэтому выходит, как только закончит текущий захват или сжатие.
+        После возврата инструменты ToolsManager (сессию захвата mss, пулы компрессора) можно закрывать.
+        """
+        self._stop_event.set()
+        for stage in self.stages:
+            stage.join()
+
+    def get(self, timeout: Optional[float] = None) -> Tuple[Dict, np.ndarray, bytes, int, int]:
+        """
+        Возвращает следующий закодированный кадр по порядку.
+
+        Returns:
+            (stats, reference, compressed, captured_time_ms, encoded_time_ms)
+
+        Raises:
+            queue.Empty: кадр не готов за timeout.
+            RuntimeError: один из этапов завершился с ошибкой.
+        """
+        if not self._started:
+            raise RuntimeError(f"{self.name}: Pipeline is not started")
+        _deadline = None if timeout is None else time() + timeout
+        while True:
+            self._raise_stage_error()
+            wait = 0.1 if _deadline is None else min(0.1, max(0.0, _deadline - time()))
+            try:
+                frame = self._compressed_queue.get(timeout=wait)
+                break
+            except Empty:
+                if _deadline is not None and time() >= _deadline:
+                    raise
+        return (frame["stats"], frame["reference"], frame["compressed"],
+                frame["captured_time_ms"], frame["encoded_time_ms"])
+
+    def _raise_stage_error(self) -> None:
+        for stage in self.stages:
+            if stage.error is not None:
+                raise RuntimeError(f"{self.name}: {stage.name} stage failed: {stage.error}") from stage.error
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Статистика по этапам; bottleneck - этап с наибольшим средним временем обработки кадра."""
+        stats = {stage.name: stage.get_stats() for stage in self.stages}
+        stats["bottleneck"] = max(self.stages, key=lambda stage: stats[stage.name]["mean_time"]).name
+        return stats
+
+    def print_stats(self) -> None:
+        stats = self.get_stats()
+        for stage in self.stages:
+            stage_stats = stats[stage.name]
+            print(f"{stage.name.ljust(12)}: "
+                  f"frames={stage_stats['frames']:<6} "
+                  f"mean={stage_stats['mean_time']:.6f} "
+                  f"fps={stage_stats['throughput']:.2f} "
+                  f"util={stage_stats['utilization']:.2f} "
+                  f"queue={stage_stats['queue_depth']}")
+        print(f"{'bottleneck'.ljust(12)}: {stats['bottleneck']}")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __str__(self) -> str:
+        return f"{self.name}({self.tools_manager}, queue_size={self._compressed_queue.maxsize})"
+
+
+if __name__ == "__main__":
+    configure_numba_threading_layer()
+    tools_manager = ToolsManager(1279, 719, 2, 100)
+    path = Path(__file__).parent / "data" / "ch1.jpg"
+    tools_manager.encode_image(path)  # прогрев numba
+    _start_time = time()
+    for _ in range(50):
+        _, reference, _ = tools_manager.encode_image(path)
+        tools_manager.update_reference(reference)
+    print(f"{tools_manager.name}.encode_image: {50 / (time() - _start_time):.2f} fps")
+    with EncodePipeline(tools_manager, queue_size=2, path=path) as pipeline:
+        _start_time = time()
+        for _ in range(50):
+            pipeline.get()
+        print(f"{pipeline}: {50 / (time() - _start_time):.2f} fps")
+        pipeline.print_stats()
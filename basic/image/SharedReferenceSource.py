@@ -0,0 +1,82 @@
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Tuple, Dict, Optional
+
+import numpy as np
+
+from basic.image.ToolsManager import ToolsManager
+
+
+class SharedReferenceSource:
+    """
+    Общий захват и квантование кадра для клиентов с одинаковыми параметрами, квантователем и дизерингом ToolsManager.
+
+    Каждый клиент держит свой ToolsManager (свой опорный кадр, разность, упаковку и сжатие),
+    а первая половина кодирования (open -> convert -> resize -> quantize) выполняется один раз
+    на всех: клиент получает последний захваченный кадр, если ещё не видел его и кадр не старше
+    MAX_FRAME_AGE, иначе захватывает новый. Квантованный кадр только читается клиентами
+    (update_reference копирует его), поэтому один массив безопасно раздаётся всем.
+    """
+    MAX_FRAME_AGE = 0.050  # секунды
+
+    _sources: Dict[Tuple[Tuple[int, int, int, int], str, str], "SharedReferenceSource"] = dict()
+    _sources_lock = Lock()
+
+    def __init__(self, parameters: Tuple[int, int, int, int], quantizer: str = "gray", dither: str = "none"):
+        self.name = self.__class__.__name__
+        self.parameters = parameters
+        self.quantizer = quantizer
+        self.dither = dither
+        self.clients = 0
+        self.captures = 0
+        self.shares = 0
+        # Палитра общего квантователя ("comb") уходит клиентам в encode_stats["palette"]
+        self._tools_manager = ToolsManager(*parameters, dither=dither, quantizer=quantizer)
+        self._lock = Lock()
+        self._frame_index = 0
+        self._frame_time = 0.0
+        self._stats: Optional[Dict] = None
+        self._reference: Optional[np.ndarray] = None
+
+    @classmethod
+    def acquire(cls, parameters: Tuple[int, int, int, int], quantizer: str = "gray",
+                dither: str = "none") -> "SharedReferenceSource":
+        """Возвращает источник для параметров (width, height, colors, scale_percent), создавая его при необходимости."""
+        with cls._sources_lock:
+            source = cls._sources.get((parameters, quantizer, dither))
+            if source is None:
+                source = cls._sources[parameters, quantizer, dither] = cls(parameters, quantizer, dither)
+            source.clients += 1
+            return source
+
+    def release(self) -> None:
+        """Отключает клиента; последний клиент закрывает сессию захвата."""
+        with self._sources_lock:
+            self.clients -= 1
+            if self.clients > 0:
+                return
+            if self._sources.get((self.parameters, self.quantizer, self.dither)) is self:
+                del self._sources[self.parameters, self.quantizer, self.dither]
+        with self._lock:
+            self._tools_manager.close()
+
+    def get_reference(self, last_index: int, path: Optional[Path] = None) -> Tuple[int, Dict, np.ndarray]:
+        """
+        Возвращает квантованный кадр, новее кадра last_index.
+
+        Returns:
+            (frame_index, encode_stats, reference). encode_stats - копия, её можно дополнять.
+        """
+        with self._lock:
+            if self._frame_index > last_index and time() - self._frame_time <= self.MAX_FRAME_AGE:
+                self.shares += 1
+                return self._frame_index, dict(self._stats, shared_frame=True), self._reference
+            self._stats, self._reference = self._tools_manager.capture_reference(path)
+            self._frame_time = time()
+            self._frame_index += 1
+            self.captures += 1
+            return self._frame_index, dict(self._stats, shared_frame=False), self._reference
+
+    def __str__(self) -> str:
+        return f"{self.name}({self.parameters}, {self.quantizer}, {self.dither}, clients={self.clients}, captures={self.captures}, shares={self.shares})"
@@ -4,11 +4,17 @@ from typing import Tuple, Dict, Optional
 
 import numpy as np
 from PIL import Image
-from mss import mss
 
+from basic.image.capturing.ABC_Capturer import Capturer
+from basic.image.capturing.MSSCapturer import MSSCapturer
+from basic.image.compression.AdaptiveCompressor import AdaptiveCompressor
+from basic.image.compression.LZ4Compressor import LZ4Compressor
+from basic.image.compression.ZstdCompressor import ZstdCompressor
 from basic.image.compression.base_compressors import BZ2Compressor, ZlibCompressor
+from basic.image.compression.stream_compressors import ZlibStreamCompressor, ZstdStreamCompressor
 from basic.image.difference.GrayscaleDifferenceHandler import GrayscaleDifferenceHandler
 from basic.image.packing.NoTampingPacker import NoTampingPacker
+from basic.image.packing.RunLengthPacker import RunLengthPacker
 from basic.image.packing.ShiftPacker import ShiftPacker
 from basic.image.quanting.GrayQuantizer import GrayQuantizer
 from basic.image.quanting.RGBQuantizer import RGBQuantizer
@@ -19,31 +25,140 @@ from basic.image.resizing.CVResizerIntScale import CVResizerIntScale
 
 class ToolsManager:
     QUANTIZER_MAP = {"gray": GrayQuantizer, "rgb": RGBQuantizer, "comb": CombQuantizer, "bin": BinQuantizer}
+    PACKER_MAP = {"bytes": NoTampingPacker, "run_length": RunLengthPacker}
+    COMPRESSOR_MAP = {"bz2": BZ2Compressor, "zlib": ZlibCompressor, "zstd": ZstdCompressor, "lz4": LZ4Compressor,
+                      "zlib_stream": ZlibStreamCompressor, "zstd_stream": ZstdStreamCompressor,
+                      "adaptive": AdaptiveCompressor}
+    COMPRESSOR_NAMES = tuple(COMPRESSOR_MAP)  # индекс имени - код компрессора при рукопожатии
+    # Квантователи, дающие кадр HxW индексов для разности; индекс имени - код квантователя при рукопожатии
+    QUANTIZER_NAMES = ("gray", "comb")
+    # "comb": палитра подстраивается под экран и передаётся в кадре, таблица квантования уменьшенная
+    COMB_LUT_MODE = "565"
+    DITHER_NAMES = GrayQuantizer.DITHER_MODES  # индекс имени - код дизеринга при рукопожатии
+    DIFFERENCE_TILE_SIZE = 32  # 0 - разность всего кадра, иначе только изменившиеся плитки
 
     def __init__(self, width: int = 2, height: int = 2,
-                 colors: int = 2, scale_percent: int = 100):
+                 colors: int = 2, scale_percent: int = 100, compressor: str = "zstd", dither: str = "none",
+                 quantizer: str = "gray"):
         self.name = self.__class__.__name__
         self.parameters = width, height, colors, scale_percent
         self._resizer = CVResizerIntScale(scale_percent=scale_percent, original_size=(width, height))
-        self._quantizer = self.QUANTIZER_MAP["gray"](colors)
-        self._packer = NoTampingPacker(colors)
-        self._compressor = BZ2Compressor()
-        self._difference_handler = GrayscaleDifferenceHandler(colors, scale_percent, shape=(height, width))
+        if quantizer not in self.QUANTIZER_NAMES:
+            raise ValueError(f"Unknown quantizer {quantizer!r}, expected one of {self.QUANTIZER_NAMES}")
+        self.quantizer_name = quantizer
+        self.dither = dither
+        if quantizer == "comb":
+            if dither != "none":
+                raise ValueError(f"Dither {dither!r} is supported only by the gray quantizer")
+            self._quantizer = self.QUANTIZER_MAP["comb"](colors, lut_mode=self.COMB_LUT_MODE, palette_mode="adaptive")
+        else:
+            # Дизеринг нужен только кодирующей стороне: деквантование от него не зависит
+            self._quantizer = self.QUANTIZER_MAP["gray"](colors, dither=dither)
+        # Палитра в кадре: флаг и сообщение палитры перед упакованной разностью (см. pack)
+        self.palette_in_band = isinstance(self._quantizer, CombQuantizer)
+        self._sent_palette: Optional[bytes] = None  # палитра, известная клиенту
+        self._pending_palette: Optional[bytes] = None  # палитра последнего упакованного кадра
+        # Без плиток разность кадра почти целиком из нулей, RunLengthPacker убирает их до сжатия и уменьшает кадр
+        # на 5-35% (в 10 раз с lz4). На плитках он не выигрывает: с zstd_stream кадр такого же или большего
+        # размера (прокрутка - вдвое), а упаковка со сжатием в 3-6 раз дольше (PackerBenchmark.test_difference_payloads)
+        # Значения разности уже в диапазоне квантователя, повторная проверка массива не нужна
+        packer = "bytes" if self.DIFFERENCE_TILE_SIZE else "run_length"
+        self._packer = self.PACKER_MAP[packer](self._quantizer.bits_per_color, validation="off")
+        self.compressor_name = compressor
+        self._compressor = self.COMPRESSOR_MAP[compressor]()
+        self._difference_handler = GrayscaleDifferenceHandler(
+            self._quantizer.COLORS, scale_percent, shape=(height, width), tile_size=self.DIFFERENCE_TILE_SIZE)
+        self._capturer = MSSCapturer()
+        # Захват сразу в оттенки серого из BGRA-буфера, если квантователь работает с серым
+        self.use_fused_gray = isinstance(self._quantizer, GrayQuantizer)
+        self._resized_gray_buffer: Optional[np.ndarray] = None
+        # Общий источник квантованных кадров (SharedReferenceSource), если захват разделяется между клиентами
+        self._reference_source = None
+        self._shared_frame_index = 0
 
     def update_reference(self, reference: np.ndarray) -> None:
+        """Фиксирует отправку последнего упакованного кадра: он становится опорным, его палитра - известной клиенту."""
         self._difference_handler.update_reference(reference)
+        self._sent_palette = self._pending_palette
 
-    @staticmethod
-    def open(path: Optional[Path] = None):
+    def set_capturer(self, capturer: Capturer) -> None:
+        """Подменяет источник захвата экрана (например, ImageCapturer в тестах), прежняя сессия закрывается."""
+        self._capturer.close()
+        self._capturer = capturer
+
+    def set_reference_source(self, reference_source) -> None:
+        """Подключает общий источник квантованных кадров; None - захват собственной сессией."""
+        self._reference_source = reference_source
+        self._shared_frame_index = 0
+
+    @property
+    def stateful_compression(self) -> bool:
+        """Сжатие с контекстом между кадрами: каждый сжатый кадр должен быть отправлен по порядку."""
+        return self._compressor.STATEFUL
+
+    def set_compression_dictionary(self, dictionary: Optional[bytes]) -> None:
+        """Подключает словарь сжатия (см. ZstdCompressor.train_dictionary), он должен совпадать у сервера и клиента."""
+        if not hasattr(self._compressor, "set_dictionary"):
+            raise ValueError(f"{self.name}: {self._compressor.name} does not support dictionaries")
+        self._compressor.set_dictionary(dictionary)
+
+    def setup_capture(self) -> float:
+        """Открывает сессию захвата экрана, если она ещё не открыта. Возвращает время открытия."""
+        _start_time = time()
+        if self._capturer.closed:
+            self._capturer.open()
+        time_to_setup_capture = time() - _start_time
+        return time_to_setup_capture
+
+    def open(self, path: Optional[Path] = None):
         _start_time = time()
         if path is None:
-            with mss() as sct:
-                image_to_encode = sct.grab(sct.monitors[1])
+            self.setup_capture()
+            image_to_encode = self._capturer.grab()
         else:
             image_to_encode = Image.open(path)
         time_to_open = time() - _start_time
         return time_to_open, image_to_encode
 
+    def grab_raw(self) -> Tuple[float, memoryview]:
+        _start_time = time()
+        self.setup_capture()
+        data = self._capturer.grab_raw()
+        time_to_grab = time() - _start_time
+        return time_to_grab, data
+
+    def convert_gray(self, raw: memoryview) -> Tuple[float, np.ndarray]:
+        _start_time = time()
+        data = self._capturer.to_gray(raw)
+        time_to_convert = time() - _start_time
+        return time_to_convert, data
+
+    def convert_rgb(self, raw: memoryview) -> Tuple[float, np.ndarray]:
+        _start_time = time()
+        data = self._capturer.to_rgb(raw)
+        time_to_convert = time() - _start_time
+        return time_to_convert, data
+
+    def resize_gray(self, gray_array: np.ndarray) -> Tuple[float, np.ndarray]:
+        _start_time = time()
+        if self._resized_gray_buffer is None:
+            target_width, target_height = self._resizer.target_size
+            self._resized_gray_buffer = np.empty((target_height, target_width), dtype=np.uint8)
+        data = self._resizer.resize_into(gray_array, self._resized_gray_buffer)
+        time_to_resize = time() - _start_time
+        return time_to_resize, data
+
+    def quantize_gray(self, gray_array: np.ndarray) -> Tuple[float, np.ndarray]:
+        _start_time = time()
+        data = self._quantizer.quantize_gray(gray_array)
+        time_to_quantize = time() - _start_time
+        return time_to_quantize, data
+
+    def close(self) -> None:
+        """Закрывает сессию захвата экрана и пулы потоков компрессора."""
+        self._capturer.close()
+        self._compressor.close()
+
     @staticmethod
     def convert(image_to_convert) -> Tuple[float, np.ndarray]:
         _start_time = time()
@@ -71,33 +186,91 @@ class ToolsManager:
         time_to_quantize = time() - _start_time
         return time_to_quantize, data
 
+    def adapt_palette(self, image_array: np.ndarray) -> Tuple[float, bytes]:
+        """Подстраивает палитру под кадр перед quantize. Возвращает сообщение текущей палитры."""
+        _start_time = time()
+        self._quantizer.adapt_palette(image_array)
+        data = self._quantizer.pack_palette()
+        time_to_adapt_palette = time() - _start_time
+        return time_to_adapt_palette, data
+
     def dequantize(self, image_array: np.ndarray) -> Tuple[float, np.ndarray]:
         _start_time = time()
         data = self._quantizer.dequantize(image_array)
         time_to_dequantize = time() - _start_time
         return time_to_dequantize, data
 
-    def compute_difference(self, image_array: np.ndarray) -> Tuple[float, np.ndarray]:
+    def compute_difference(self, image_array: np.ndarray) -> Tuple[float, np.ndarray | Tuple[np.ndarray, np.ndarray]]:
+        """В плиточном режиме возвращает (dirty_mask, tiles), иначе разностный кадр."""
         _start_time = time()
-        data = self._difference_handler.compute_difference(image_array)
+        if self._difference_handler.tiled:
+            data = self._difference_handler.compute_tiled_difference(image_array)
+        else:
+            data = self._difference_handler.compute_difference(image_array)
         time_to_compute_difference = time() - _start_time
         return time_to_compute_difference, data
 
-    def apply_difference(self, difference: np.ndarray) -> Tuple[float, np.ndarray]:
+    def apply_difference(self, difference: np.ndarray | Tuple[np.ndarray, np.ndarray]) -> Tuple[float, np.ndarray]:
         _start_time = time()
-        data = self._difference_handler.apply_difference(difference)
+        if self._difference_handler.tiled:
+            data = self._difference_handler.apply_tiled_difference(*difference)
+        else:
+            data = self._difference_handler.apply_difference(difference)
         time_to_apply_difference = time() - _start_time
         return time_to_apply_difference, data
 
-    def pack(self, image_array: np.ndarray) -> Tuple[float, bytes]:
+    def _pack_palette_flag(self, palette: bytes) -> bytes:
+        """1 и сообщение палитры, если клиент её ещё не получил, иначе 0."""
+        self._pending_palette = palette
+        if palette == self._sent_palette:
+            return b"\x00"
+        return b"\x01" + palette
+
+    def _unpack_palette_flag(self, data: bytes | memoryview) -> int:
+        """Применяет палитру из кадра, если она передана. Возвращает размер заголовка палитры."""
+        if not data[0]:
+            return 1
+        palette_size = self._quantizer.BYTES_PER_PALETTE_SIZE + 3 * self._quantizer.COLORS
+        self._quantizer.unpack_palette(bytes(data[1:1 + palette_size]))
+        return 1 + palette_size
+
+    def pack(self, difference: np.ndarray | Tuple[np.ndarray, np.ndarray],
+             palette: Optional[bytes] = None) -> Tuple[float, bytes]:
+        """
+        В плиточном режиме: битовая карта плиток + упакованные плитки (если есть изменения).
+        С палитрой в кадре (palette_in_band) перед ними идёт флаг палитры: palette - сообщение
+        палитры, которой квантован кадр (encode_stats["palette"]), оно передаётся, пока клиент
+        не получит его (update_reference).
+        """
         _start_time = time()
-        data = self._packer.pack_array(image_array)
+        header = self._pack_palette_flag(palette) if self.palette_in_band else b""
+        if self._difference_handler.tiled:
+            dirty_mask, tiles = difference
+            data = header + self._difference_handler.pack_dirty_mask(dirty_mask)
+            if tiles.size:
+                data += self._packer.pack_array(tiles)
+        else:
+            data = self._packer.pack_array(difference)
+            if header:
+                data = header + data
         time_to_pack = time() - _start_time
         return time_to_pack, data
 
-    def unpack(self, data: bytes) -> Tuple[float, np.ndarray]:
+    def unpack(self, data: bytes) -> Tuple[float, np.ndarray | Tuple[np.ndarray, np.ndarray]]:
         _start_time = time()
-        data = self._packer.unpack_array(data)
+        if self.palette_in_band:
+            data = memoryview(data)[self._unpack_palette_flag(data):]
+        if self._difference_handler.tiled:
+            mask_size = self._difference_handler.dirty_mask_size
+            dirty_mask = self._difference_handler.unpack_dirty_mask(data)
+            if len(data) > mask_size:
+                tiles = self._packer.unpack_array(data[mask_size:])
+            else:
+                tile_size = self._difference_handler.tile_size
+                tiles = np.empty((0, tile_size, tile_size), dtype=np.uint8)
+            data = dirty_mask, tiles
+        else:
+            data = self._packer.unpack_array(data)
         time_to_unpack = time() - _start_time
         return time_to_unpack, data
 
@@ -107,22 +280,53 @@ class ToolsManager:
         time_to_compress = time() - _start_time
         return time_to_compress, data
 
+    def get_compression_stats(self) -> Dict:
+        """Решение компрессора о последнем сжатом кадре (например, выбранный алгоритм AdaptiveCompressor)."""
+        return self._compressor.get_stats()
+
     def decompress(self, data_to_compress: bytes) -> Tuple[float, bytes]:
         _start_time = time()
         data = self._compressor.decompress(data_to_compress)
         time_to_decompress = time() - _start_time
         return time_to_decompress, data
 
+    def capture_reference(self, path: Optional[Path] = None) -> Tuple[Dict, np.ndarray]:
+        """Первая половина кодирования: open -> convert -> resize -> quantize."""
+        if self._reference_source is not None:
+            self._shared_frame_index, encode_stats, reference = self._reference_source.get_reference(
+                self._shared_frame_index, path)
+            return encode_stats, reference
+        encode_stats = dict()
+        encode_stats["time_to_setup_capture"] = self.setup_capture() if path is None else 0.0
+        if path is None and self.use_fused_gray:
+            encode_stats["convert_path"] = "bgra2gray"
+            encode_stats["time_to_open"], raw = self.grab_raw()
+            encode_stats["time_to_convert"], gray = self.convert_gray(raw)
+            encode_stats["time_to_resize"], data = self.resize_gray(gray)
+            encode_stats["time_to_quantize"], reference = self.quantize_gray(data)
+        else:
+            if path is None:
+                # Экран захватывается в BGRA, квантователи и клиент работают с RGB
+                encode_stats["convert_path"] = "bgra2rgb"
+                encode_stats["time_to_open"], raw = self.grab_raw()
+                encode_stats["time_to_convert"], converted = self.convert_rgb(raw)
+            else:
+                encode_stats["convert_path"] = "rgb"
+                encode_stats["time_to_open"], image_to_encode = self.open(path)
+                encode_stats["time_to_convert"], converted = self.convert(image_to_encode)
+            encode_stats["time_to_resize"], data = self.resize(converted)
+            if self.palette_in_band:
+                encode_stats["time_to_adapt_palette"], encode_stats["palette"] = self.adapt_palette(data)
+            encode_stats["time_to_quantize"], reference = self.quantize(data)
+        return encode_stats, reference
+
     def encode_image(self, path: Optional[Path] = None) -> Tuple[Dict, np.ndarray, bytes]:
         _start_time = time()
-        encode_stats = dict()
-        encode_stats["time_to_open"], image_to_encode = self.open(path)
-        encode_stats["time_to_convert"], converted = self.convert(image_to_encode)
-        encode_stats["time_to_resize"], data = self.resize(converted)
-        encode_stats["time_to_quantize"], reference = self.quantize(data)
+        encode_stats, reference = self.capture_reference(path)
         encode_stats["time_to_compute_difference"], data = self.compute_difference(reference)
-        encode_stats["time_to_pack"], data = self.pack(data)
+        encode_stats["time_to_pack"], data = self.pack(data, encode_stats.get("palette"))
         encode_stats["time_to_compress"], compressed = self.compress(data)
+        encode_stats.update(self.get_compression_stats())
         encode_stats["total_time"] = time() - _start_time
         encode_stats["encoded_size"] = len(compressed)
         return encode_stats, reference, compressed
@@ -142,7 +346,9 @@ class ToolsManager:
     @staticmethod
     def print_encode_stats(encode_stats: Dict, left_indent: int = 8) -> None:
         data_to_print = [
+            f'{"time_to_setup_capture".ljust(22)}{encode_stats["time_to_setup_capture"]:.6f}',
             f'{"time_to_open".ljust(22)}{encode_stats["time_to_open"]:.6f}',
+            f'{"convert_path".ljust(22)}{encode_stats["convert_path"]}',
             f'{"time_to_convert".ljust(22)}{encode_stats["time_to_convert"]:.6f}',
             f'{"time_to_resize".ljust(22)}{encode_stats["time_to_resize"]:.6f}',
             f'{"time_to_quantize".ljust(22)}{encode_stats["time_to_quantize"]:.6f}',
@@ -152,6 +358,8 @@ class ToolsManager:
             f'{"total_time".ljust(22)}{encode_stats["total_time"]:.6f}',
             f'{"encoded_size".ljust(22)}{encode_stats["encoded_size"]} B'
         ]
+        if "compressor" in encode_stats:
+            data_to_print.append(f'{"compressor".ljust(22)}{encode_stats["compressor"]}')
         left_indent_str = left_indent * " "
         print(left_indent_str, f"\n{left_indent_str}".join(data_to_print), sep='')
 
@@ -204,3 +412,4 @@ if __name__ == "__main__":
     #     stats, decoded = tools_manager.decode_image(encoded)
     #     tools_manager.print_decode_stats(stats)
     #     tools_manager.show_decoded_image(decoded)
+    # tools_manager.close()
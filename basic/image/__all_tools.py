@@ -10,3 +10,5 @@ from basic.image.compression.ThreadCombCompressor import ThreadCombCompressor
 from basic.image.compression.ThreadCompressor import ThreadCompressor
 from basic.image.compression.AdaptiveCompressor import AdaptiveCompressor
 from basic.image.compression.CompetitionCompressor import CompetitionCompressor
+from basic.image.compression.ZstdCompressor import ZstdCompressor
+from basic.image.compression.LZ4Compressor import LZ4Compressor
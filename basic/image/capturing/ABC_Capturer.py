@@ -0,0 +1,120 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class Capturer(ABC):
+    """
+    Абстрактный базовый класс для долгоживущей сессии захвата экрана.
+
+    Сессия открывается один раз (open), переиспользуется между кадрами (grab)
+    и закрывается при отключении клиента (close).
+    """
+
+    def __init__(self):
+        self.name = self.__class__.__name__
+        self._buffer: Optional[np.ndarray] = None
+        self._gray_buffer: Optional[np.ndarray] = None
+        self._rgb_buffer: Optional[np.ndarray] = None  # выделяется при первом to_rgb
+
+    @abstractmethod
+    def open(self) -> None:
+        """Открывает сессию захвата и выделяет буфер кадра."""
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """Закрывает сессию захвата."""
+        pass
+
+    @property
+    @abstractmethod
+    def closed(self) -> bool:
+        pass
+
+    @property
+    @abstractmethod
+    def size(self) -> Tuple[int, int]:
+        """Возвращает размер захватываемой области (width, height)."""
+        pass
+
+    @abstractmethod
+    def _grab_raw(self) -> memoryview:
+        """Захватывает кадр и возвращает memoryview на сырые байты BGRA без копирования."""
+        pass
+
+    def _allocate_buffers(self, width: int, height: int) -> None:
+        self._buffer = np.empty((height, width, 4), dtype=np.uint8)
+        self._gray_buffer = np.empty((height, width), dtype=np.uint8)
+
+    def _validate_opened(self) -> None:
+        if self.closed:
+            raise RuntimeError(f"{self.name}: Capture session is closed")
+
+    def grab_raw(self) -> memoryview:
+        """
+        Захватывает кадр без копирования.
+
+        Returns:
+            memoryview на байты BGRA кадра, действителен до следующего захвата.
+        """
+        self._validate_opened()
+        return self._grab_raw()
+
+    def grab(self) -> np.ndarray:
+        """
+        Захватывает кадр в переиспользуемый буфер.
+
+        Returns:
+            Массив BGRA формы (height, width, 4). Буфер перезаписывается следующим вызовом grab.
+        """
+        self._validate_opened()
+        self._buffer.reshape(-1)[:] = np.frombuffer(self._grab_raw(), dtype=np.uint8)
+        return self._buffer
+
+    def to_gray(self, raw: memoryview) -> np.ndarray:
+        """
+        Переводит сырой кадр BGRA в оттенки серого за один проход cv2.
+
+        Returns:
+            Массив формы (height, width) в предвыделенном буфере, перезаписывается следующим вызовом.
+        """
+        self._validate_opened()
+        bgra = np.frombuffer(raw, dtype=np.uint8).reshape(self._buffer.shape)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=self._gray_buffer)
+
+    def grab_gray(self) -> np.ndarray:
+        """Захватывает кадр сразу в оттенках серого, минуя копию BGRA."""
+        return self.to_gray(self.grab_raw())
+
+    def to_rgb(self, raw: memoryview) -> np.ndarray:
+        """
+        Переводит сырой кадр BGRA в RGB за один проход cv2 (порядок каналов квантователей и клиента).
+
+        Returns:
+            Массив формы (height, width, 3) в переиспользуемом буфере, перезаписывается следующим вызовом.
+        """
+        self._validate_opened()
+        if self._rgb_buffer is None:
+            self._rgb_buffer = np.empty(self._buffer.shape[:2] + (3,), dtype=np.uint8)
+        bgra = np.frombuffer(raw, dtype=np.uint8).reshape(self._buffer.shape)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=self._rgb_buffer)
+
+    def grab_rgb(self) -> np.ndarray:
+        """Захватывает кадр сразу в RGB, минуя копию BGRA."""
+        return self.to_rgb(self.grab_raw())
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __str__(self) -> str:
+        return f"{self.name}(size={self.size if not self.closed else None})"
+
+    def __repr__(self) -> str:
+        return f"{self.name}(closed={self.closed})"
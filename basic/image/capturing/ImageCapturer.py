@@ -0,0 +1,44 @@
+from pathlib import Path
+from typing import Tuple, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from basic.image.capturing.ABC_Capturer import Capturer
+
+
+class ImageCapturer(Capturer):
+    """Захват из файла изображения вместо экрана: отдаёт один и тот же кадр BGRA (для тестов и бенчмарков)"""
+
+    def __init__(self, path: Path, size: Optional[Tuple[int, int]] = None):
+        super().__init__()
+        self.path = path
+        self._target_size = size
+        self._frame: Optional[np.ndarray] = None
+
+    def open(self) -> None:
+        if not self.closed:
+            return
+        rgb = np.asarray(Image.open(self.path).convert("RGB"), dtype=np.uint8)
+        if self._target_size is not None:
+            rgb = cv2.resize(rgb, self._target_size, interpolation=cv2.INTER_AREA)
+        self._frame = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGRA)
+        self._allocate_buffers(self._frame.shape[1], self._frame.shape[0])
+
+    def close(self) -> None:
+        self._frame = None
+        self._buffer = None
+        self._gray_buffer = None
+        self._rgb_buffer = None
+
+    @property
+    def closed(self) -> bool:
+        return self._frame is None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self._frame.shape[1], self._frame.shape[0]
+
+    def _grab_raw(self) -> memoryview:
+        return memoryview(self._frame).cast("B")
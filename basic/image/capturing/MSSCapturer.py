@@ -0,0 +1,67 @@
+from typing import Tuple
+
+from mss import mss
+
+from basic.image.capturing.ABC_Capturer import Capturer
+
+
+class MSSCapturer(Capturer):
+    """Сессия захвата экрана через один экземпляр mss, открытый на всё время работы с клиентом."""
+
+    def __init__(self, monitor_index: int = 1):
+        super().__init__()
+        self.monitor_index = monitor_index
+        self._sct = None
+        self._monitor = None
+        self._screenshot = None
+
+    def open(self) -> None:
+        if not self.closed:
+            return
+        self._sct = mss()
+        self._monitor = self._sct.monitors[self.monitor_index]
+        self._allocate_buffers(self._monitor["width"], self._monitor["height"])
+
+    def close(self) -> None:
+        if self._sct is not None:
+            self._sct.close()
+        self._sct = None
+        self._monitor = None
+        self._screenshot = None
+        self._buffer = None
+        self._gray_buffer = None
+        self._rgb_buffer = None
+
+    @property
+    def closed(self) -> bool:
+        return self._sct is None
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self._monitor["width"], self._monitor["height"]
+
+    def _grab_raw(self) -> memoryview:
+        # Держим ссылку на снимок, чтобы его bytearray BGRA жил до следующего захвата
+        self._screenshot = self._sct.grab(self._monitor)
+        return memoryview(self._screenshot.raw)
+
+
+if __name__ == "__main__":
+    from time import time
+
+    _start_time = time()
+    for _ in range(10):
+        with mss() as sct:
+            sct.grab(sct.monitors[1])
+    print("mss() per frame".ljust(20), f"{(time() - _start_time) / 10:.6f}")
+
+    with MSSCapturer() as capturer:
+        _start_time = time()
+        for _ in range(10):
+            capturer.grab()
+        print("MSSCapturer.grab".ljust(20), f"{(time() - _start_time) / 10:.6f}")
+        _start_time = time()
+        for _ in range(10):
+            capturer.grab_gray()
+        print("MSSCapturer.grab_gray".ljust(20), f"{(time() - _start_time) / 10:.6f}")
+        print(capturer, capturer.grab().shape)
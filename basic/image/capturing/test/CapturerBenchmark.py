@@ -0,0 +1,131 @@
+from pathlib import Path
+from time import time
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+from basic.image.capturing.ABC_Capturer import Capturer
+from basic.image.quanting.GrayQuantizer import GrayQuantizer
+from basic.image.resizing.CVResizerIntScale import CVResizerIntScale
+
+
+class CapturerBenchmark:
+    """Сравнение пути BGRA -> RGB -> GRAY (ToolsManager.convert + GrayQuantizer) с прямым BGRA -> GRAY"""
+    SCALE_PERCENTS = [100, 80, 60]
+
+    def __init__(self, capturer: Capturer, colors: int = 3):
+        self.capturer = capturer
+        self.colors = colors
+
+    @staticmethod
+    def _test_rgb_path(raw: memoryview, shape: Tuple[int, int, int], resizer: CVResizerIntScale,
+                       quantizer: GrayQuantizer, iterations: int) -> Tuple[float, float, float]:
+        convert_times, resize_times, quantize_times = [], [], []
+        for _ in range(iterations):
+            start_time = time()
+            data = np.asarray(np.frombuffer(raw, dtype=np.uint8).reshape(shape), dtype=np.uint8)[:, :, :3]
+            convert_times.append(time() - start_time)
+            start_time = time()
+            data = resizer.resize(data)
+            resize_times.append(time() - start_time)
+            start_time = time()
+            quantizer.quantize(data)
+            quantize_times.append(time() - start_time)
+        return float(np.mean(convert_times)), float(np.mean(resize_times)), float(np.mean(quantize_times))
+
+    def _test_gray_path(self, raw: memoryview, resizer: CVResizerIntScale, quantizer: GrayQuantizer,
+                        iterations: int) -> Tuple[float, float, float]:
+        convert_times, resize_times, quantize_times = [], [], []
+        width, height = resizer.target_size
+        resized_buffer = np.empty((height, width), dtype=np.uint8)
+        for _ in range(iterations):
+            start_time = time()
+            data = self.capturer.to_gray(raw)
+            convert_times.append(time() - start_time)
+            start_time = time()
+            data = resizer.resize_into(data, resized_buffer)
+            resize_times.append(time() - start_time)
+            start_time = time()
+            quantizer.quantize_gray(data)
+            quantize_times.append(time() - start_time)
+        return float(np.mean(convert_times)), float(np.mean(resize_times)), float(np.mean(quantize_times))
+
+    def test(self, iterations: int = 100):
+        with self.capturer:
+            width, height = self.capturer.size
+            raw = self.capturer.grab_raw()
+            quantizer = GrayQuantizer(self.colors)
+            print(self.capturer, (height, width, 4), f"iterations={iterations}")
+            print("scale".rjust(20), "convert".rjust(10), "resize".rjust(10), "quantize".rjust(10),
+                  "total".rjust(10), sep="\t")
+            for scale_percent in self.SCALE_PERCENTS:
+                resizer = CVResizerIntScale(scale_percent, original_size=(width, height))
+                rgb_times = self._test_rgb_path(raw, (height, width, 4), resizer, quantizer, iterations)
+                gray_times = self._test_gray_path(raw, resizer, quantizer, iterations)
+                for path_name, times in (("rgb", rgb_times), ("bgra2gray", gray_times)):
+                    print(f"{scale_percent}% {path_name}".rjust(20),
+                          *[f"{t:.6f}".rjust(10) for t in times], f"{sum(times):.6f}".rjust(10), sep="\t")
+
+    @staticmethod
+    def test_channel_order(quantizers=("comb", "gray"), size: Tuple[int, int] = (320, 240)):
+        """
+        Известный кадр (полосы красного, зелёного и синего) проходит ToolsManager.encode_image/decode_image
+        через захват BGRA; у "comb" каждая полоса должна вернуться своим цветом, а не с переставленными R и B.
+        """
+        from io import BytesIO
+
+        from PIL import Image
+
+        from basic.image.ToolsManager import ToolsManager
+        from basic.image.capturing.ImageCapturer import ImageCapturer
+
+        width, height = size
+        stripes = ((255, 0, 0), (0, 255, 0), (0, 0, 255))
+        rgb = np.zeros((height, width, 3), dtype=np.uint8)
+        for k, color in enumerate(stripes):
+            rgb[:, k * width // 3:(k + 1) * width // 3] = color
+        png = BytesIO()
+        Image.fromarray(rgb).save(png, format="PNG")
+
+        print("quantizer".rjust(20), "convert_path".rjust(12), *[f"{color}".rjust(16) for color in stripes], sep="\t")
+        for quantizer in quantizers:
+            encoder = ToolsManager(width, height, 16, 100, quantizer=quantizer)
+            decoder = ToolsManager(width, height, 16, 100, quantizer=quantizer)
+            png.seek(0)
+            encoder.set_capturer(ImageCapturer(png))
+            stats, reference, encoded = encoder.encode_image()
+            _, decoded = decoder.decode_image(encoded)
+            means = [decoded[:, k * width // 3 + 4:(k + 1) * width // 3 - 4].reshape(-1, 3).mean(axis=0)
+                     for k in range(len(stripes))]
+            print(quantizer.rjust(20), stats["convert_path"].rjust(12),
+                  *[str(tuple(int(v) for v in mean)).rjust(16) for mean in means], sep="\t")
+            if quantizer == "comb":
+                for k, mean in enumerate(means):
+                    assert int(np.argmax(mean)) == k, f"{quantizer}: stripe {stripes[k]} decoded as {mean}"
+            encoder.close()
+            decoder.close()
+
+
+if __name__ == "__main__":
+    from basic.image.capturing.ImageCapturer import ImageCapturer
+
+    img_path = Path(__file__).parent.parent.parent / "data" / "a10.jpg"
+    cv2.setNumThreads(0)
+    CapturerBenchmark(ImageCapturer(img_path, (1920, 1080))).test(200)
+    CapturerBenchmark.test_channel_order()
+
+"""
+ImageCapturer(size=(1920, 1080)) (1080, 1920, 4) iterations=200
+               scale	   convert	    resize	  quantize	     total
+            100% rgb	  0.000056	  0.000010	  0.023196	  0.023262
+      100% bgra2gray	  0.001331	  0.000007	  0.001655	  0.002993
+             80% rgb	  0.000053	  0.024835	  0.001912	  0.026799
+       80% bgra2gray	  0.001375	  0.002358	  0.001096	  0.004829
+             60% rgb	  0.000050	  0.024079	  0.001132	  0.025262
+       60% bgra2gray	  0.001294	  0.001664	  0.000595	  0.003553
+
+           quantizer	convert_path	     (255, 0, 0)	     (0, 255, 0)	     (0, 0, 255)
+                comb	    bgra2rgb	     (255, 0, 0)	     (0, 255, 0)	     (0, 0, 255)
+                gray	   bgra2gray	    (68, 68, 68)	 (153, 153, 153)	    (17, 17, 17)
+"""
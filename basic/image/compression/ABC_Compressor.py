@@ -1,8 +1,16 @@
 from abc import ABC, abstractmethod
+from typing import Dict
 
 
 class Compressor(ABC):
     """Базовый класс для компрессоров"""
+    # True - сжатие зависит от предыдущих кадров: каждый сжатый кадр обязан дойти
+    # до клиента по порядку, иначе контекст распаковки разойдётся с контекстом сжатия
+    STATEFUL = False
+    # False - экземпляр хранит общий контекст (например, zstd), и его compress/decompress нельзя
+    # вызывать из нескольких потоков одновременно: ThreadCompressor и ThreadCombCompressor
+    # вызывают такой экземпляр под блокировкой
+    THREAD_SAFE = True
 
     def __init__(self):
         self.name = self.__class__.__name__
@@ -14,3 +22,15 @@ class Compressor(ABC):
     @abstractmethod
     def decompress(self, compressed_data: bytes) -> bytes:
         pass
+
+    def get_stats(self) -> Dict:
+        """Сведения о последнем вызове compress (решения адаптивных компрессоров), по умолчанию пусто."""
+        return dict()
+
+    def close(self) -> None:
+        """Освобождает ресурсы компрессора (пулы потоков и т.п.), по умолчанию ничего не делает."""
+        pass
+
+    def reset(self) -> None:
+        """Сбрасывает контекст сжатия и распаковки (для компрессоров с состоянием)."""
+        pass
@@ -1,58 +1,153 @@
 from time import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from basic.image.compression.LZ4Compressor import LZ4Compressor
+from basic.image.compression.ZstdCompressor import ZstdCompressor
 from basic.image.compression.base_compressors import *
 
 
 class AdaptiveCompressor(Compressor):
-    """Компрессор с адаптивным выбором алгоритма сжатия."""
+    """
+    Компрессор с адаптивным выбором алгоритма сжатия по модели стоимости.
+
+    Для каждого алгоритма хранятся экспоненциальные скользящие средние (EWMA) коэффициента сжатия
+    и времени сжатия одного байта. Модель ведётся отдельно для каждой корзины входных данных:
+    порядок размера (len(data).bit_length()) и доля ненулевых байт (для упакованной разности -
+    доля изменившихся пикселей). Выбирается алгоритм с наименьшей оценкой времени
+    сжатия + передачи: time_per_byte * size + ratio * size * 8 / bandwidth.
+
+    Алгоритм, ещё не измеренный в корзине, сначала пробуется; затем раз в EXPLORE_PERIOD кадров
+    корзины по кругу перепроверяется один из алгоритмов, чтобы модель успевала за изменением данных.
+    Номер выбранного алгоритма записывается в первый байт результата.
+    """
+    THREAD_SAFE = False  # Модель/счётчики выбора и вложенные компрессоры
     BYTES_PER_INDEX = 1
-
-    TEST_DATA_SIZE = 1024  # Размер тестовых данных
-    MIN_DATA_FOR_TESTING = TEST_DATA_SIZE * 16  # Минимальный размер для тестирования
-
-    TEST_PART = 0.2
-
-    def __init__(self):
+    CHANGE_BUCKETS = 8  # Число корзин доли ненулевых байт
+    EXPLORE_PERIOD = 64  # Период перепроверки алгоритмов в корзине (в кадрах)
+
+    def __init__(self, compressors: Optional[List[Compressor]] = None,
+                 bandwidth: float = 100e6, smoothing: float = 0.2):
+        """
+        Args:
+            compressors: Алгоритмы для выбора (без состояния между кадрами)
+            bandwidth: Пропускная способность канала в бит/с
+            smoothing: Вес нового измерения в EWMA
+        """
         super().__init__()
-        self.compressors = [BZ2Compressor(), ZlibCompressor()]
-
-    def _select_test_data(self, data: bytes) -> bytes:
-        """Выбирает репрезентативные данные для тестирования."""
-        if len(data) <= self.TEST_DATA_SIZE:
-            return data
-
-        # Берем данные из начала, середины и конца для лучшего покрытия
-        chunk_size = self.TEST_DATA_SIZE // 3
-        start_chunk = data[:chunk_size]
-        middle_chunk = data[len(data) // 2 - chunk_size // 2: len(data) // 2 + chunk_size // 2]
-        end_chunk = data[-chunk_size:]
-
-        return start_chunk + middle_chunk + end_chunk
+        if compressors is None:
+            compressors = [LZ4Compressor(), ZstdCompressor(), ZlibCompressor(), BZ2Compressor()]
+        if not 0 < len(compressors) <= 256 ** self.BYTES_PER_INDEX:
+            raise ValueError(f"{self.name}: Compressors count must be in 1..{256 ** self.BYTES_PER_INDEX}")
+        if any(compressor.STATEFUL for compressor in compressors):
+            raise ValueError(f"{self.name}: Stateful compressors can not be switched between frames")
+        if bandwidth <= 0:
+            raise ValueError(f"{self.name}: Bandwidth must be positive, got {bandwidth}")
+        self.compressors = compressors
+        self.bandwidth = bandwidth
+        self.smoothing = smoothing
+        # корзина -> [ratio, time_per_byte, samples] для каждого алгоритма
+        self._model: Dict[Tuple[int, int], np.ndarray] = dict()
+        self._bucket_frames: Dict[Tuple[int, int], int] = dict()
+        self.choices = [0] * len(compressors)
+        self._last_stats: Dict = dict()
+
+    def _get_bucket(self, data: bytes) -> Tuple[int, int]:
+        nonzero_fraction = np.count_nonzero(np.frombuffer(data, dtype=np.uint8)) / len(data)
+        return len(data).bit_length(), min(int(nonzero_fraction * self.CHANGE_BUCKETS), self.CHANGE_BUCKETS - 1)
+
+    def estimate_costs(self, size: int, model: np.ndarray) -> np.ndarray:
+        """Оценка времени сжатия + передачи size байт в секундах для каждого алгоритма."""
+        return model[:, 1] * size + model[:, 0] * size * 8 / self.bandwidth
+
+    def _choose(self, bucket: Tuple[int, int], size: int) -> Tuple[int, float, bool]:
+        model = self._model.get(bucket)
+        if model is None:
+            model = self._model[bucket] = np.zeros((len(self.compressors), 3), dtype=np.float64)
+        frames = self._bucket_frames.get(bucket, 0)
+        self._bucket_frames[bucket] = frames + 1
+
+        not_measured = np.flatnonzero(model[:, 2] == 0)
+        if not_measured.size:
+            return int(not_measured[0]), float("nan"), True
+        costs = self.estimate_costs(size, model)
+        if frames and frames % self.EXPLORE_PERIOD == 0:
+            index = (frames // self.EXPLORE_PERIOD) % len(self.compressors)
+            return index, float(costs[index]), True
+        index = int(np.argmin(costs))
+        return index, float(costs[index]), False
+
+    def _update(self, bucket: Tuple[int, int], index: int, size: int, compressed_size: int, elapsed: float) -> None:
+        row = self._model[bucket][index]
+        ratio, time_per_byte = compressed_size / size, elapsed / size
+        if row[2] == 0:
+            row[0], row[1] = ratio, time_per_byte
+        else:
+            row[0] += self.smoothing * (ratio - row[0])
+            row[1] += self.smoothing * (time_per_byte - row[1])
+        row[2] += 1
 
     def compress(self, data: bytes) -> bytes:
         if not data:
             return b''
 
-        if len(data) < self.MIN_DATA_FOR_TESTING:
-            return self.compressors[0].compress(data)
+        bucket = self._get_bucket(data)
+        index, estimated_cost, explored = self._choose(bucket, len(data))
 
-        # data_for_test = self._select_test_data_by_part(data)
+        _start_time = time()
+        compressed = self.compressors[index].compress(data)
+        self._update(bucket, index, len(data), len(compressed), time() - _start_time)
 
-        step = int(len(data) // len(data) * self.TEST_PART)
-        if step < 4:
-            return self.compressors[0].compress(data)
-        data_for_test = data[::step]
-
-        time_results = []
-        for compressor in self.compressors:
-            _start_time = time()
-            compressor.compress(data_for_test)
-            time_results.append(time() - _start_time)
-        chosen_compressor_index = min(range(len(self.compressors)), key=lambda i: time_results[i])
-
-        header = chosen_compressor_index.to_bytes(self.BYTES_PER_INDEX, 'big')
-
-        return header + self.compressors[chosen_compressor_index].compress(data)
+        self.choices[index] += 1
+        self._last_stats = {
+            "compressor": self.compressors[index].name,
+            "compressor_estimated_cost": estimated_cost,
+            "compressor_explored": explored,
+        }
+        return index.to_bytes(self.BYTES_PER_INDEX, 'big') + compressed
 
     def decompress(self, compressed_data: bytes) -> bytes:
+        if not compressed_data:
+            return b''
         chosen_compressor_index = int.from_bytes(compressed_data[:self.BYTES_PER_INDEX], 'big')
-        return self.compressors[chosen_compressor_index].compress(compressed_data[self.BYTES_PER_INDEX:])
+        if chosen_compressor_index >= len(self.compressors):
+            raise ValueError(f"{self.name}: Unknown compressor index {chosen_compressor_index}")
+        return self.compressors[chosen_compressor_index].decompress(compressed_data[self.BYTES_PER_INDEX:])
+
+    def get_stats(self) -> Dict:
+        return dict(self._last_stats)
+
+    def close(self) -> None:
+        for compressor in self.compressors:
+            compressor.close()
+
+    def print_model(self) -> None:
+        """Печатает модель: для каждой корзины EWMA коэффициента сжатия и времени сжатия байта."""
+        names = [compressor.name.replace("Compressor", "") for compressor in self.compressors]
+        print(f"{self.name}: bandwidth={self.bandwidth / 1e6:.1f} Mbit/s, choices={dict(zip(names, self.choices))}")
+        print("size<2^k".rjust(8), "change".rjust(8), *(f"{name}(ratio/ns per B)".rjust(22) for name in names))
+        for (size_bits, change_bucket), model in sorted(self._model.items()):
+            print(str(size_bits).rjust(8), f"<{(change_bucket + 1) / self.CHANGE_BUCKETS:.2f}".rjust(8),
+                  *((f"{ratio:.3f}/{time_per_byte * 1e9:.2f}" if samples else "-").rjust(22)
+                    for ratio, time_per_byte, samples in model))
+
+
+if __name__ == "__main__":
+    from pathlib import Path
+
+    from basic.image.compression.test.CompressorBenchmark import CompressorBenchmark
+
+    benchmark = CompressorBenchmark(Path(__file__).parent.parent / "data" / "a10.jpg")
+    frames = [benchmark._prepare(scale, 4) for scale in range(40, 100, 10)]
+    frames += benchmark._prepare_difference_frames(100)
+    for bandwidth in (1e6, 100e6, 10e9):
+        compressor = AdaptiveCompressor(bandwidth=bandwidth)
+        sizes = []
+        for _ in range(3):
+            for frame in frames:
+                compressed = compressor.compress(frame)
+                assert compressor.decompress(compressed) == frame
+                sizes.append(len(compressed))
+        compressor.print_model()
+        print(f"mean compressed size: {np.mean(sizes):.1f} B")
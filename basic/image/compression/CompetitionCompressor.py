@@ -1,49 +1,157 @@
-import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED, ALL_COMPLETED
+from typing import Dict, List, Optional
 
 from basic.image.compression.base_compressors import *
 
 
 class CompetitionCompressor(Compressor):
+    """
+    Сжимает данные всеми алгоритмами одновременно и берёт результат победителя.
+
+    Режимы:
+        "first"    - первый готовый результат;
+        "smallest" - самый маленький из результатов, готовых к сроку deadline.
+    Если к сроку не готов ни один результат, берётся первый готовый.
+
+    Кандидаты выполняются в долгоживущем пуле потоков (по потоку на алгоритм), пул создаётся
+    при первом использовании и закрывается в close. Ещё не начатые задачи проигравших отменяются,
+    а уже начатые дорабатывают в пуле, их результат отбрасывается (прервать сжатие внутри zlib/bz2 нельзя).
+    Пока задача кандидата не завершилась, новые кадры ему не отдаются (счётчик skipped): иначе задача
+    следующего кадра ждала бы в очереди за отброшенной, а один экземпляр компрессора (например, контекст
+    zstd) вызывался бы из двух потоков одновременно. Победитель прошлого кадра свободен всегда,
+    поэтому в каждом кадре участвует хотя бы один кандидат.
+    Номер победителя записывается в первый байт результата, счётчик побед - в wins.
+    """
+    THREAD_SAFE = False  # Модель/счётчики выбора и вложенные компрессоры
     BYTES_PER_INDEX = 1
+    MODES = ("first", "smallest")
 
-    def __init__(self):
+    def __init__(self, compressors: Optional[List[Compressor]] = None, mode: str = "first", deadline: float = 0.05):
+        """
+        Args:
+            compressors: Алгоритмы-участники (без состояния между кадрами)
+            mode: Режим выбора победителя, см. MODES
+            deadline: Срок ожидания результатов в режиме "smallest" в секундах
+        """
         super().__init__()
-        self.compressors = [BZ2Compressor(), ZlibCompressor()]
+        if compressors is None:
+            compressors = [BZ2Compressor(), ZlibCompressor()]
+        if not 0 < len(compressors) <= 256 ** self.BYTES_PER_INDEX:
+            raise ValueError(f"{self.name}: Compressors count must be in 1..{256 ** self.BYTES_PER_INDEX}")
+        if any(compressor.STATEFUL for compressor in compressors):
+            raise ValueError(f"{self.name}: Stateful compressors can not compete")
+        if mode not in self.MODES:
+            raise ValueError(f"{self.name}: Unknown mode {mode!r}, expected one of {self.MODES}")
+        self.compressors = compressors
+        self.mode = mode
+        self.deadline = deadline
+        self.wins = [0] * len(compressors)
+        self.discarded = 0  # Число отброшенных результатов проигравших, уже начавших сжатие
+        self.skipped = 0  # Число пропусков кандидатов, ещё занятых отброшенной задачей
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: List[Optional[Future]] = [None] * len(compressors)  # Последняя задача кандидата
+        self._last_stats: Dict = dict()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.compressors), thread_name_prefix=self.name)
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._in_flight = [None] * len(self.compressors)
+
+    @staticmethod
+    def _succeeded(futures: List[Future]) -> List[Future]:
+        return [future for future in futures if future.done() and future.exception() is None]
+
+    def _wait_first(self, futures: List[Future]) -> List[Future]:
+        """Ждёт первый успешный результат; ошибки отдельных кандидатов пропускаются."""
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = self._succeeded(list(done))
+            if succeeded:
+                return succeeded
+        raise RuntimeError(f"{self.name}: All compressors failed: {futures[0].exception()}")
 
     def compress(self, data: bytes) -> bytes:
         if not data:
             return b''
 
-        self.compressors = [BZ2Compressor(), ZlibCompressor()]
+        executor = self._get_executor()
+        indices = [index for index, future in enumerate(self._in_flight) if future is None or future.done()]
+        self.skipped += len(self.compressors) - len(indices)
+        futures = []
+        for index in indices:
+            self._in_flight[index] = executor.submit(self.compressors[index].compress, data)
+            futures.append(self._in_flight[index])
 
-        result = None
-        result_ready = threading.Event()
-        lock = threading.Lock()
+        if self.mode == "smallest":
+            wait(futures, timeout=self.deadline, return_when=ALL_COMPLETED)
+            finished = self._succeeded(futures) or self._wait_first(futures)
+        else:
+            finished = self._wait_first(futures)
+        winner = min(finished, key=lambda future: len(future.result()))
+        index = indices[futures.index(winner)]
 
-        def worker(compressor: Compressor, index):
-            nonlocal result
-            while True:
-                compressed = compressor.compress(data)
-                with lock:
-                    if not result_ready.is_set():
-                        result = index.to_bytes(self.BYTES_PER_INDEX, 'big') + compressed
-                        result_ready.set()
+        for future in futures:
+            if future is not winner and not future.cancel() and not future.done():
+                self.discarded += 1
 
-        workers = []
-        tool_index = 0
-        for tool in self.compressors:
-            worker_thread = threading.Thread(target=worker, args=(tool, tool_index))
-            workers.append(worker_thread)
-            worker_thread.start()
-            tool_index += 1
+        self.wins[index] += 1
+        self._last_stats = {
+            "compressor": self.compressors[index].name,
+            "compressor_candidates_done": len(finished),
+            "compressor_candidates_skipped": len(self.compressors) - len(indices),
+        }
+        return index.to_bytes(self.BYTES_PER_INDEX, 'big') + winner.result()
 
-        result_ready.wait(timeout=10)
+    def decompress(self, compressed_data: bytes) -> bytes:
+        if not compressed_data:
+            return b''
+        chosen_compressor_index = int.from_bytes(compressed_data[:self.BYTES_PER_INDEX], 'big')
+        if chosen_compressor_index >= len(self.compressors):
+            raise ValueError(f"{self.name}: Unknown compressor index {chosen_compressor_index}")
+        return self.compressors[chosen_compressor_index].decompress(compressed_data[self.BYTES_PER_INDEX:])
 
-        if result is None:
-            raise RuntimeError("result is None")
+    def get_stats(self) -> Dict:
+        return dict(self._last_stats)
 
-        return result
+    def get_wins(self) -> Dict[str, int]:
+        """Число побед каждого алгоритма (алгоритм - индекс и имя, имена могут повторяться)."""
+        return {f"{index}:{compressor.name}": wins
+                for index, (compressor, wins) in enumerate(zip(self.compressors, self.wins))}
 
-    def decompress(self, compressed_data: bytes) -> bytes:
-        chosen_compressor_index = int.from_bytes(compressed_data[:self.BYTES_PER_INDEX], 'big')
-        return self.compressors[chosen_compressor_index].compress(compressed_data[self.BYTES_PER_INDEX:])
+    def __str__(self) -> str:
+        return (f"{self.name}(mode={self.mode}, wins={self.get_wins()}, discarded={self.discarded}, "
+                f"skipped={self.skipped})")
+
+
+if __name__ == "__main__":
+    import threading
+    from pathlib import Path
+    from time import time
+
+    from basic.image.compression.LZ4Compressor import LZ4Compressor
+    from basic.image.compression.ZstdCompressor import ZstdCompressor
+    from basic.image.compression.test.CompressorBenchmark import CompressorBenchmark
+
+    benchmark = CompressorBenchmark(Path(__file__).parent.parent / "data" / "a10.jpg")
+    frames = [benchmark._prepare(scale, 4) for scale in range(40, 100, 10)]
+    frames += benchmark._prepare_difference_frames(100)
+    for mode in CompetitionCompressor.MODES:
+        compressor = CompetitionCompressor(
+            [LZ4Compressor(), ZstdCompressor(), ZlibCompressor(), BZ2Compressor()], mode=mode)
+        _start_time = time()
+        sizes = []
+        for frame in frames:
+            compressed = compressor.compress(frame)
+            assert compressor.decompress(compressed) == frame
+            sizes.append(len(compressed))
+        print(f"{compressor}: {(time() - _start_time) / len(frames) * 1000:.3f} ms per frame, "
+              f"mean size {sum(sizes) / len(sizes):.1f} B")
+        compressor.close()
+    print(f"threads after close: {threading.active_count()}")
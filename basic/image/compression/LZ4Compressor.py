@@ -0,0 +1,21 @@
+import lz4.frame
+
+from basic.image.compression.ABC_Compressor import Compressor
+
+
+class LZ4Compressor(Compressor):
+    """Компрессор LZ4 (формат frame): самое быстрое сжатие и распаковка ценой степени сжатия."""
+
+    def __init__(self, level: int = 0):
+        """
+        Args:
+            level: Уровень сжатия (0 - быстрый режим, 3..16 - режим HC)
+        """
+        super().__init__()
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4.frame.compress(data, compression_level=self.level, store_size=True)
+
+    def decompress(self, compressed_data: bytes) -> bytes:
+        return lz4.frame.decompress(compressed_data)
@@ -1,4 +1,6 @@
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from math import ceil
 from typing import List, Optional
 
@@ -6,7 +8,21 @@ from basic.image.compression.base_compressors import *
 
 
 class ThreadCombCompressor(Compressor):
+    """
+    Сжимает данные чанками, на каждый чанк соревнуются все компрессоры: берётся первый готовый результат.
+
+    Соревнующиеся воркеры работают в долгоживущем пуле потоков компрессора (по потоку
+    на компрессор, иначе соревнования нет), пул создаётся при первом сжатии и закрывается в close.
+
+    Формат: chunk_count | data_length | индексы компрессоров | длины сжатых чанков | сжатые чанки.
+    По data_length известны границы каждого распакованного чанка, поэтому чанки
+    распаковываются в том же пуле параллельно сразу на свои места в выходном буфере.
+    Компрессоры без THREAD_SAFE (например, ZstdCompressor) работают под блокировкой своего экземпляра:
+    чанки, выигранные одним таким экземпляром, распаковываются по очереди.
+    """
+    THREAD_SAFE = False  # Вложенные компрессоры используются всеми вызовами
     BYTES_PER_CHUNK_COUNT = 1
+    BYTES_PER_DATA_LENGTH = 4
     BYTES_PER_CHUNK_LENGTH = 4
     BYTES_PER_CHUNK_INDEX = 1
 
@@ -20,6 +36,22 @@ class ThreadCombCompressor(Compressor):
             self.compressors = [BZ2Compressor(), ZlibCompressor()]
         else:
             self.compressors = compressors
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._locks = {id(compressor): threading.Lock() for compressor in self.compressors}
+
+    def _guard(self, compressor: Compressor):
+        """Блокировка экземпляра, который нельзя вызывать из нескольких потоков одновременно."""
+        return nullcontext() if compressor.THREAD_SAFE else self._locks[id(compressor)]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.compressors), thread_name_prefix=self.name)
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
     @classmethod
     def _calculate_chunk_count(cls, data_length: int) -> int:
@@ -66,7 +98,8 @@ class ThreadCombCompressor(Compressor):
                         task = data[offset:offset + chunk_length]
 
                 # Выполнение задачи
-                result = compressor.compress(task)
+                with self._guard(compressor):
+                    result = compressor.compress(task)
 
                 # Фиксация результата
                 with lock:
@@ -76,21 +109,16 @@ class ThreadCombCompressor(Compressor):
                         result_list[task_index] = result
                         tool_index_list[task_index] = index
 
-        workers = []
-        tool_index = 0
-        for tool in self.compressors:
-            worker_thread = threading.Thread(target=worker, args=(tool, tool_index))
-            workers.append(worker_thread)
-            worker_thread.start()
-            tool_index += 1
-
-        for worker_thread in workers:
-            worker_thread.join()
+        executor = self._get_executor()
+        workers = [executor.submit(worker, tool, tool_index) for tool_index, tool in enumerate(self.compressors)]
+        for worker_future in workers:
+            worker_future.result()
 
         if None in result_list:
             raise RuntimeError("Not all chunks were compressed")
 
         header_chunk_count = chunk_count.to_bytes(self.BYTES_PER_CHUNK_COUNT, 'big')
+        header_data_length = len(data).to_bytes(self.BYTES_PER_DATA_LENGTH, 'big')
         indexes_info = b''.join(
             i.to_bytes(self.BYTES_PER_CHUNK_INDEX, 'big') for i in tool_index_list
         )
@@ -98,33 +126,54 @@ class ThreadCombCompressor(Compressor):
             len(chunk).to_bytes(self.BYTES_PER_CHUNK_LENGTH, 'big') for chunk in result_list
         )
 
-        return header_chunk_count + indexes_info + chunks_length_info + b''.join(result_list)
+        return header_chunk_count + header_data_length + indexes_info + chunks_length_info + b''.join(result_list)
 
-    def decompress(self, compressed_data: bytes) -> bytes:
+    def decompress(self, compressed_data: bytes) -> bytearray:
         if not compressed_data:
-            return b''
+            return bytearray()
 
-        chunk_count = int.from_bytes(compressed_data[:self.BYTES_PER_CHUNK_COUNT], 'big')
+        compressed_view = memoryview(compressed_data)
+        chunk_count = int.from_bytes(compressed_view[:self.BYTES_PER_CHUNK_COUNT], 'big')
         offset = self.BYTES_PER_CHUNK_COUNT
+        data_length = int.from_bytes(compressed_view[offset:offset + self.BYTES_PER_DATA_LENGTH], 'big')
+        offset += self.BYTES_PER_DATA_LENGTH
 
         compressors_indexes = []
         for _ in range(chunk_count):
-            compressor_index = int.from_bytes(compressed_data[offset:offset + self.BYTES_PER_CHUNK_INDEX], 'big')
+            compressor_index = int.from_bytes(compressed_view[offset:offset + self.BYTES_PER_CHUNK_INDEX], 'big')
             compressors_indexes.append(compressor_index)
             offset += self.BYTES_PER_CHUNK_INDEX
 
         chunk_lengths = []
         for _ in range(chunk_count):
-            chunk_length = int.from_bytes(compressed_data[offset:offset + self.BYTES_PER_CHUNK_LENGTH], 'big')
+            chunk_length = int.from_bytes(compressed_view[offset:offset + self.BYTES_PER_CHUNK_LENGTH], 'big')
             chunk_lengths.append(chunk_length)
             offset += self.BYTES_PER_CHUNK_LENGTH
 
-        decompressed_chunks = []
+        result = bytearray(data_length)
+        output_chunk_length = self._calculate_chunk_length(data_length, chunk_count)
+
+        def worker(compressor: Compressor, chunk_data: memoryview, output_start: int, output_end: int):
+            with self._guard(compressor):
+                decompressed = compressor.decompress(chunk_data)
+            if len(decompressed) != output_end - output_start:
+                raise ValueError(f"{self.name}: Decompressed chunk length {len(decompressed)} "
+                                 f"does not match expected {output_end - output_start}")
+            result[output_start:output_end] = decompressed
+
+        tasks = []
         for i in range(chunk_count):
-            compressor_index = compressors_indexes[i]
-            chunk_length = chunk_lengths[i]
-            chunk_data = compressed_data[offset:offset + chunk_length]
-            decompressed_chunks.append(self.compressors[compressor_index].decompress(chunk_data))
-            offset += chunk_length
+            output_start = min(i * output_chunk_length, data_length)
+            output_end = min(output_start + output_chunk_length, data_length)
+            chunk_data = compressed_view[offset:offset + chunk_lengths[i]]
+            tasks.append((self.compressors[compressors_indexes[i]], chunk_data, output_start, output_end))
+            offset += chunk_lengths[i]
+
+        if chunk_count == 1:
+            worker(*tasks[0])
+        else:
+            executor = self._get_executor()
+            for future in [executor.submit(worker, *task) for task in tasks]:
+                future.result()
 
-        return b''.join(decompressed_chunks)
+        return result
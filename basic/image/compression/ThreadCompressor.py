@@ -1,4 +1,7 @@
+import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from math import ceil
 from typing import List, Optional
 
@@ -6,7 +9,20 @@ from basic.image.compression.base_compressors import *
 
 
 class ThreadCompressor(Compressor):
+    """
+    Делит данные на len(compressors) чанков и сжимает их параллельно.
+
+    Чанки сжимаются и распаковываются в долгоживущем пуле потоков компрессора (размер пула - число ядер,
+    но не больше числа чанков), пул создаётся при первом использовании и закрывается в close.
+
+    Формат: chunk_count | data_length | длины сжатых чанков | сжатые чанки.
+    По data_length известны границы каждого распакованного чанка, поэтому чанки
+    распаковываются параллельно сразу на свои места в выходном буфере: чанк i - компрессором i,
+    как и при сжатии. Компрессоры без THREAD_SAFE работают под блокировкой своего экземпляра.
+    """
+    THREAD_SAFE = False  # Вложенные компрессоры используются всеми вызовами
     BYTES_PER_CHUNK_COUNT = 1
+    BYTES_PER_DATA_LENGTH = 4
     BYTES_PER_CHUNK_LENGTH = 4
 
     MIN_CHUNK_LENGTH = 8192
@@ -18,66 +34,100 @@ class ThreadCompressor(Compressor):
             self.compressors = [BZ2Compressor(), BZ2Compressor()]
         else:
             self.compressors = compressors
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._locks = {id(compressor): threading.Lock() for compressor in self.compressors}
+
+    def _guard(self, compressor: Compressor):
+        """Блокировка экземпляра, который нельзя вызывать из нескольких потоков одновременно."""
+        return nullcontext() if compressor.THREAD_SAFE else self._locks[id(compressor)]
+
+    def _compress_guarded(self, compressor: Compressor, data: bytes) -> bytes:
+        with self._guard(compressor):
+            return compressor.compress(data)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            max_workers = max(1, min(len(self.compressors), os.cpu_count() or 1))
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
 
     def compress(self, data: bytes) -> bytes:
         if not data:
             return b''
 
         if len(data) < self.MIN_DATA_FOR_TESTING:
-            return int(1).to_bytes(self.BYTES_PER_CHUNK_COUNT, 'big') + self.compressors[0].compress(data)
+            compressed = self.compressors[0].compress(data)
+            return (int(1).to_bytes(self.BYTES_PER_CHUNK_COUNT, 'big') +
+                    len(data).to_bytes(self.BYTES_PER_DATA_LENGTH, 'big') +
+                    len(compressed).to_bytes(self.BYTES_PER_CHUNK_LENGTH, 'big') + compressed)
 
         chunk_count = len(self.compressors)
         chunk_length = ceil(len(data) / chunk_count)
-        result_list = [None] * chunk_count
-        lock = threading.Lock()
-
-        def worker(compressor: Compressor, chunk_index: int):
-            with lock:
-                offset = chunk_index * chunk_length
-                if chunk_index == chunk_count - 1:  # Последний чанк может быть меньше
-                    task = data[offset:]
-                else:
-                    task = data[offset:offset + chunk_length]
-            result = compressor.compress(task)
-            with lock:
-                result_list[chunk_index] = result
-
-        workers = []
-        for i in range(chunk_count):
-            worker_thread = threading.Thread(target=worker, args=(self.compressors[i], i))
-            workers.append(worker_thread)
-            worker_thread.start()
-
-        for worker_thread in workers:
-            worker_thread.join()
-
-        if None in result_list:
-            raise RuntimeError("Not all chunks were compressed")
+        view = memoryview(data)
+
+        executor = self._get_executor()
+        futures = []
+        for chunk_index, compressor in enumerate(self.compressors):
+            offset = chunk_index * chunk_length
+            if chunk_index == chunk_count - 1:  # Последний чанк может быть меньше
+                task = view[offset:]
+            else:
+                task = view[offset:offset + chunk_length]
+            futures.append(executor.submit(self._compress_guarded, compressor, task))
+        result_list = [future.result() for future in futures]
 
         header_chunk_count = chunk_count.to_bytes(self.BYTES_PER_CHUNK_COUNT, 'big')
+        header_data_length = len(data).to_bytes(self.BYTES_PER_DATA_LENGTH, 'big')
         chunks_length_info = b''.join(
             len(chunk).to_bytes(self.BYTES_PER_CHUNK_LENGTH, 'big') for chunk in result_list
         )
 
-        return header_chunk_count + chunks_length_info + b''.join(result_list)
+        return header_chunk_count + header_data_length + chunks_length_info + b''.join(result_list)
 
-    def decompress(self, compressed_data: bytes) -> bytes:
+    def decompress(self, compressed_data: bytes) -> bytearray:
         if not compressed_data:
-            return b''
-        chunk_count = int.from_bytes(compressed_data[:self.BYTES_PER_CHUNK_COUNT], 'big')
+            return bytearray()
+        compressed_view = memoryview(compressed_data)
+        chunk_count = int.from_bytes(compressed_view[:self.BYTES_PER_CHUNK_COUNT], 'big')
         offset = self.BYTES_PER_CHUNK_COUNT
+        data_length = int.from_bytes(compressed_view[offset:offset + self.BYTES_PER_DATA_LENGTH], 'big')
+        offset += self.BYTES_PER_DATA_LENGTH
 
         chunk_lengths = []
         for _ in range(chunk_count):
-            chunk_length = int.from_bytes(compressed_data[offset:offset + self.BYTES_PER_CHUNK_LENGTH], 'big')
+            chunk_length = int.from_bytes(compressed_view[offset:offset + self.BYTES_PER_CHUNK_LENGTH], 'big')
             chunk_lengths.append(chunk_length)
             offset += self.BYTES_PER_CHUNK_LENGTH
 
-        decompressed_chunks = []
+        result = bytearray(data_length)
+        output_chunk_length = ceil(data_length / chunk_count)
+
+        def worker(compressor: Compressor, chunk_data: memoryview, output_start: int, output_end: int):
+            with self._guard(compressor):
+                decompressed = compressor.decompress(chunk_data)
+            if len(decompressed) != output_end - output_start:
+                raise ValueError(f"{self.name}: Decompressed chunk length {len(decompressed)} "
+                                 f"does not match expected {output_end - output_start}")
+            result[output_start:output_end] = decompressed
+
+        tasks = []
         for i in range(chunk_count):
-            chunk_length = chunk_lengths[i]
-            chunk_data = compressed_data[offset:offset + chunk_length]
-            decompressed_chunks.append(self.compressors[0].decompress(chunk_data))
-            offset += chunk_length
+            output_start = min(i * output_chunk_length, data_length)
+            output_end = min(output_start + output_chunk_length, data_length)
+            tasks.append((self.compressors[i % len(self.compressors)],
+                          compressed_view[offset:offset + chunk_lengths[i]], output_start, output_end))
+            offset += chunk_lengths[i]
+
+        if chunk_count == 1:
+            worker(*tasks[0])
+        else:
+            executor = self._get_executor()
+            for future in [executor.submit(worker, *task) for task in tasks]:
+                future.result()
 
-        return b''.join(decompressed_chunks)
+        return result
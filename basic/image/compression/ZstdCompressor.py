@@ -0,0 +1,70 @@
+from pathlib import Path
+from typing import List, Optional
+
+import zstandard
+
+from basic.image.compression.ABC_Compressor import Compressor
+
+
+class ZstdCompressor(Compressor):
+    """
+    Компрессор Zstandard с уровнями, многопоточностью и необязательным словарём.
+
+    Словарь обучается на примерах упакованных разностных кадров (train_dictionary) и должен
+    совпадать на сервере и клиенте: его байты передаются клиенту (dictionary) и подключаются
+    через set_dictionary. Маленькие разностные кадры со словарём сжимаются заметно лучше.
+    Контексты zstandard нельзя использовать из нескольких потоков одновременно.
+    """
+    THREAD_SAFE = False
+
+    def __init__(self, level: int = 3, threads: int = 0, dictionary: Optional[bytes] = None):
+        """
+        Args:
+            level: Уровень сжатия (1..22, отрицательные - быстрые режимы)
+            threads: Число потоков сжатия (0 - без потоков, -1 - по числу ядер)
+            dictionary: Байты словаря, обученного train_dictionary
+        """
+        super().__init__()
+        self.level = level
+        self.threads = threads
+        self._dictionary: Optional[zstandard.ZstdCompressionDict] = None
+        self._compressor: Optional[zstandard.ZstdCompressor] = None
+        self._decompressor: Optional[zstandard.ZstdDecompressor] = None
+        self.set_dictionary(dictionary)
+
+    @property
+    def dictionary(self) -> Optional[bytes]:
+        """Байты текущего словаря для передачи клиенту или None."""
+        return self._dictionary.as_bytes() if self._dictionary is not None else None
+
+    def set_dictionary(self, dictionary: Optional[bytes]) -> None:
+        """Подключает словарь (None - без словаря) и пересоздаёт контексты сжатия."""
+        self._dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        self._compressor = zstandard.ZstdCompressor(
+            level=self.level, threads=self.threads, dict_data=self._dictionary, write_content_size=True)
+        self._decompressor = zstandard.ZstdDecompressor(dict_data=self._dictionary)
+
+    @staticmethod
+    def train_dictionary(samples: List[bytes], dictionary_size: int = 16384) -> bytes:
+        """
+        Обучает словарь на примерах кадров.
+
+        Args:
+            samples: Примеры упакованных разностных кадров (нужно хотя бы несколько десятков)
+            dictionary_size: Максимальный размер словаря в байтах
+        """
+        return zstandard.train_dictionary(dictionary_size, [bytes(sample) for sample in samples]).as_bytes()
+
+    def save_dictionary(self, path: Path) -> None:
+        if self._dictionary is None:
+            raise RuntimeError(f"{self.name}: Dictionary is not set")
+        Path(path).write_bytes(self.dictionary)
+
+    def load_dictionary(self, path: Path) -> None:
+        self.set_dictionary(Path(path).read_bytes())
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompress(self, compressed_data: bytes) -> bytes:
+        return self._decompressor.decompress(compressed_data)
@@ -0,0 +1,64 @@
+import zlib
+from typing import Optional
+
+import zstandard
+
+from basic.image.compression.ABC_Compressor import Compressor
+
+
+class ZlibStreamCompressor(Compressor):
+    """
+    Поток zlib на всё соединение: каждый кадр завершается Z_SYNC_FLUSH и декодируется сразу,
+    а следующие кадры ссылаются на данные предыдущих (окно 32 KB).
+    """
+    STATEFUL = True
+    THREAD_SAFE = False
+
+    def __init__(self, level: int = 6):
+        super().__init__()
+        self.level = level
+        self._compressobj = None
+        self._decompressobj = None
+        self.reset()
+
+    def reset(self) -> None:
+        self._compressobj = zlib.compressobj(self.level)
+        self._decompressobj = zlib.decompressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressobj.compress(data) + self._compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def decompress(self, compressed_data: bytes) -> bytes:
+        return self._decompressobj.decompress(compressed_data)
+
+
+class ZstdStreamCompressor(Compressor):
+    """
+    Поток zstd на всё соединение: каждый кадр завершается сбросом блока и декодируется сразу,
+    а следующие кадры ссылаются на данные предыдущих (окно зависит от уровня, от 1 MB).
+    """
+    STATEFUL = True
+    THREAD_SAFE = False
+
+    def __init__(self, level: int = 3, dictionary: Optional[bytes] = None):
+        super().__init__()
+        self.level = level
+        self._dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        self._compressobj = None
+        self._decompressobj = None
+        self.reset()
+
+    def set_dictionary(self, dictionary: Optional[bytes]) -> None:
+        """Подключает словарь (см. ZstdCompressor.train_dictionary) и начинает поток заново."""
+        self._dictionary = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        self.reset()
+
+    def reset(self) -> None:
+        self._compressobj = zstandard.ZstdCompressor(level=self.level, dict_data=self._dictionary).compressobj()
+        self._decompressobj = zstandard.ZstdDecompressor(dict_data=self._dictionary).decompressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressobj.compress(data) + self._compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def decompress(self, compressed_data: bytes) -> bytes:
+        return self._decompressobj.decompress(compressed_data)
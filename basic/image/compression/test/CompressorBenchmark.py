@@ -1,11 +1,29 @@
 from math import inf
 from pathlib import Path
 from time import time
+from typing import List
 
+import cv2
 import numpy as np
 from PIL import Image
 
 from basic.image.__all_tools import *
+from basic.image.ToolsManager import ToolsManager
+
+
+class SpawnPerCall:
+    """Обёртка, воспроизводящая прежнее поведение: новые потоки создаются и завершаются на каждом вызове"""
+
+    def __init__(self, compressor: Compressor):
+        self.compressor = compressor
+        self.name = f"{compressor.name} spawn"
+
+    def compress(self, data: bytes) -> bytes:
+        self.compressor.close()
+        try:
+            return self.compressor.compress(data)
+        finally:
+            self.compressor.close()
 
 
 class CompressorBenchmark:
@@ -25,6 +43,30 @@ class CompressorBenchmark:
             self.cache[(input_scale, input_colors)] = packer.pack_array(quantized)
         return self.cache[(input_scale, input_colors)]
 
+    def _prepare_difference_frames(self, frame_count: int, input_scale: int = 80, input_colors: int = 3,
+                                   seed: int = 0) -> List[bytes]:
+        """Упакованные разностные кадры мелких правок экрана: на каждом кадре на изображение дописывается текст"""
+        key = ("difference", frame_count, input_scale, input_colors, seed)
+        if key not in self.cache.keys():
+            rng = np.random.default_rng(seed)
+            gray = np.array(self.image.convert("L"), dtype=np.uint8)
+            height, width = gray.shape
+            tools_manager = ToolsManager(width, height, input_colors, input_scale)
+            frames = []
+            for frame_index in range(frame_count + 1):
+                position = (int(rng.integers(0, width - 200)), int(rng.integers(30, height)))
+                cv2.putText(gray, f"frame {frame_index}", position, cv2.FONT_HERSHEY_SIMPLEX, 1,
+                            int(rng.integers(0, 256)), 2)
+                _, resized = tools_manager.resize(gray)
+                _, reference = tools_manager.quantize_gray(resized)
+                _, difference = tools_manager.compute_difference(reference)
+                _, packed = tools_manager.pack(difference)
+                tools_manager.update_reference(reference)
+                if frame_index:  # Первый кадр - полный
+                    frames.append(bytes(packed))
+            self.cache[key] = frames
+        return self.cache[key]
+
     @staticmethod
     def _test_compress(compressor: Compressor, data: bytes, iterations: int) -> float:
         """Тестирует скорость сжатия"""
@@ -69,6 +111,56 @@ class CompressorBenchmark:
                 print(f"{func(scale, colors)}".ljust(col_width), end="")
             print()
 
+    def print_call_overhead_table(self, compressors, sizes=(1024, 10240, 1048576), iterations: int = 20):
+        """Время одного вызова compress на данных разного размера: пул потоков против создания потоков на вызов"""
+        source = self._prepare(100, 4)
+        print(f"COMPRESS TIME PER CALL in ms, iterations={iterations}")
+        print(str().ljust(40), "".join(f"{size} B".rjust(12) for size in sizes), sep="")
+        for compressor in compressors:
+            for tested in (SpawnPerCall(compressor), compressor):
+                row = []
+                for size in sizes:
+                    data = (source * (size // len(source) + 1))[:size]
+                    tested.compress(data)  # Прогрев
+                    row.append(f"{self._test_compress(tested, data, iterations) * 1000:.3f}".rjust(12))
+                tools = ",".join(tool.name.replace("Compressor", "") for tool in compressor.compressors)
+                print(f"{tested.name}[{tools}]".ljust(40), "".join(row), sep="")
+            compressor.close()
+
+    def print_difference_frames_table(self, compressors, frame_count: int = 100):
+        """Средний размер и время на маленьких разностных кадрах; словарь zstd обучается на других кадрах"""
+        frames = self._prepare_difference_frames(frame_count)
+        print(f"DIFFERENCE FRAMES: {len(frames)}, MEAN PACKED SIZE: {np.mean([len(f) for f in frames]):.0f} B")
+        print(str().ljust(24), "size(B)".rjust(10), "compress(ms)".rjust(14), "decompress(ms)".rjust(16), sep="")
+        for compressor in compressors:
+            compressed_frames = [compressor.compress(frame) for frame in frames]
+            compress_time = np.mean([self._test_compress(compressor, frame, 3) for frame in frames])
+            decompress_time = np.mean([self._test_decompress(compressor, frame, 3) for frame in frames])
+            name = compressor.name + (f"({compressor.level})" if hasattr(compressor, "level") else "")
+            name += " dict" if getattr(compressor, "dictionary", None) else ""
+            print(name.ljust(24), f"{np.mean([len(c) for c in compressed_frames]):.1f}".rjust(10),
+                  f"{compress_time * 1000:.3f}".rjust(14), f"{decompress_time * 1000:.3f}".rjust(16), sep="")
+
+    def print_back_to_back_table(self, candidate_lists, calls: int = 10, scale: int = 100, colors: int = 4):
+        """
+        Время на кадр при подряд идущих вызовах compress: CompetitionCompressor против каждого
+        участника отдельно. Проигравшие предыдущего кадра не должны задерживать следующий.
+        """
+        data = self._prepare(scale, colors)
+        print(f"BACK-TO-BACK COMPRESS: {calls} calls, {len(data)} B, time per call in ms")
+        for make_candidates in candidate_lists:
+            tools = ",".join(compressor.name.replace("Compressor", "") for compressor in make_candidates())
+            for compressor in make_candidates():
+                compressor.compress(data)  # Прогрев
+                print(f"{compressor.name}".ljust(56), f"{self._test_compress(compressor, data, calls) * 1000:.3f}"
+                      .rjust(10), sep="")
+            for mode in CompetitionCompressor.MODES:
+                compressor = CompetitionCompressor(make_candidates(), mode=mode)
+                elapsed = self._test_compress(compressor, data, calls) * 1000
+                print(f"{compressor.name}({mode})[{tools}]".ljust(56), f"{elapsed:.3f}".rjust(10),
+                      f"  wins={compressor.get_wins()}, skipped={compressor.skipped}", sep="")
+                compressor.close()
+
     @staticmethod
     def print_line():
         print("########################################################")
@@ -155,3 +247,55 @@ if __name__ == "__main__":
     benchmark = CompressorBenchmark(Path(__file__).parent.parent.parent / "data" / "a7.jpg")
     print(benchmark._test_compress(BZ2Compressor(), benchmark._prepare(60, 4), 1))
     print(benchmark._test_compress(ThreadCompressor(), benchmark._prepare(60, 4), 1))
+
+    benchmark = CompressorBenchmark(Path(__file__).parent.parent.parent / "data" / "a10.jpg")
+    dictionary = ZstdCompressor.train_dictionary(benchmark._prepare_difference_frames(300, seed=1))
+    benchmark.print_difference_frames_table([
+        BZ2Compressor(), ZlibCompressor(), ZlibCompressor(1), LZ4Compressor(),
+        ZstdCompressor(3), ZstdCompressor(3, dictionary=dictionary), ZstdCompressor(9, dictionary=dictionary),
+    ])
+
+    benchmark.print_call_overhead_table([
+        ThreadCompressor([ZlibCompressor(1), ZlibCompressor(1)]),
+        ThreadCombCompressor([ZlibCompressor(1), ZlibCompressor(1)]),
+        ThreadCompressor(),
+        ThreadCombCompressor(),
+    ])
+
+    benchmark.print_back_to_back_table([
+        lambda: [BZ2Compressor(), ZlibCompressor()],
+        lambda: [LZ4Compressor(), ZstdCompressor(), ZlibCompressor(), BZ2Compressor()],
+    ])
+
+"""
+DIFFERENCE FRAMES: 100, MEAN PACKED SIZE: 5094 B
+                           size(B)  compress(ms)  decompress(ms)
+BZ2Compressor(9)             268.1         0.218           0.046
+ZlibCompressor(9)            240.4         0.656           0.019
+ZlibCompressor(1)            335.9         0.022           0.013
+LZ4Compressor(0)             606.0         0.008           0.005
+ZstdCompressor(3)            297.6         0.015           0.008
+ZstdCompressor(3) dict       261.1         0.010           0.007
+ZstdCompressor(9) dict       226.6         0.102           0.007
+COMPRESS TIME PER CALL in ms, iterations=20
+                                              1024 B     10240 B   1048576 B
+ThreadCompressor spawn[Zlib,Zlib]              0.009       0.018       5.108
+ThreadCompressor[Zlib,Zlib]                    0.030       0.013       4.028
+ThreadCombCompressor spawn[Zlib,Zlib]          0.206       0.389       5.256
+ThreadCombCompressor[Zlib,Zlib]                0.099       0.199       3.928
+ThreadCompressor spawn[BZ2,BZ2]                0.028       0.105      18.494
+ThreadCompressor[BZ2,BZ2]                      0.019       0.100      22.409
+ThreadCombCompressor spawn[BZ2,Zlib]           0.361       0.647      63.831
+ThreadCombCompressor[BZ2,Zlib]                 0.127       0.345      53.098
+BACK-TO-BACK COMPRESS: 10 calls, 2068448 B, time per call in ms
+BZ2Compressor                                               36.314
+ZlibCompressor                                             223.487
+CompetitionCompressor(first)[BZ2,Zlib]                      70.355  wins={'0:BZ2Compressor': 10, '1:ZlibCompressor': 0}, skipped=8
+CompetitionCompressor(smallest)[BZ2,Zlib]                   67.717  wins={'0:BZ2Compressor': 10, '1:ZlibCompressor': 0}, skipped=8
+LZ4Compressor                                                1.164
+ZstdCompressor                                               2.591
+ZlibCompressor                                             213.627
+BZ2Compressor                                               28.597
+CompetitionCompressor(first)[LZ4,Zstd,Zlib,BZ2]              5.627  wins={'0:LZ4Compressor': 10, '1:ZstdCompressor': 0, '2:ZlibCompressor': 0, '3:BZ2Compressor': 0}, skipped=24
+CompetitionCompressor(smallest)[LZ4,Zstd,Zlib,BZ2]          27.911  wins={'0:LZ4Compressor': 0, '1:ZstdCompressor': 10, '2:ZlibCompressor': 0, '3:BZ2Compressor': 0}, skipped=15
+"""
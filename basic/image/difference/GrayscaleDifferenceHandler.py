@@ -1,16 +1,27 @@
+from math import ceil
 from typing import Tuple
 
 import numpy as np
+from numba import njit, prange
 
 from basic.image.resizing.ABC_ImageResizer import ImageResizer
 
 
 class GrayscaleDifferenceHandler:
-    def __init__(self, max_value: int, scale_percent: int, shape: Tuple[int, int]):
+    """
+    Разностное кодирование кадров по модулю max_value без выделения памяти на каждый кадр.
+
+    При tile_size > 0 работает в плиточном режиме: кадр делится на блоки tile_size x tile_size,
+    и разность передаётся только для изменившихся (грязных) плиток вместе с битовой картой плиток.
+    """
+    MIN_TILE_SIZE = 8
+
+    def __init__(self, max_value: int, scale_percent: int, shape: Tuple[int, int], tile_size: int = 0):
         self.name = self.__class__.__name__
 
-        if not (0 < max_value < 256):
-            raise ValueError(f"{self.name}: Number of max_value must be between 1 and 255, got {max_value}")
+        # Разность считается в int16, поэтому модуль 256 (все значения uint8, например 256 цветов CombQuantizer) допустим
+        if not (0 < max_value <= 256):
+            raise ValueError(f"{self.name}: Number of max_value must be between 1 and 256, got {max_value}")
 
         if scale_percent < 1 or scale_percent > 100:
             raise ValueError(f"{self.name}: Scale percent must be between 1 and 100, got {scale_percent}")
@@ -18,10 +29,36 @@ class GrayscaleDifferenceHandler:
         if shape[0] <= 0 or shape[1] <= 0:
             raise ValueError(f"{self.name}: Image dimensions must be positive, got {shape}")
 
+        if tile_size != 0 and tile_size < self.MIN_TILE_SIZE:
+            raise ValueError(f"{self.name}: Tile size must be 0 or at least {self.MIN_TILE_SIZE}, got {tile_size}")
+
         self.max_value = max_value
         self.scale_percent = scale_percent
+        self.tile_size = tile_size
         self.reference_shape = ImageResizer.calculate_target_size(shape, self.scale_percent / 100)
+
         self._reference_frame = np.zeros(self.reference_shape, dtype=np.uint8)
+        # Переиспользуемые буферы, чтобы не выделять память на каждый кадр
+        self._difference_frame = np.empty(self.reference_shape, dtype=np.uint8)
+        if self.tiled:
+            height, width = self.reference_shape
+            self.tiles_shape = ceil(height / tile_size), ceil(width / tile_size)
+        else:
+            self.tiles_shape = (1, 1)
+        tiles_count = self.tiles_shape[0] * self.tiles_shape[1]
+        self._dirty_mask = np.zeros(self.tiles_shape, dtype=np.bool_)
+        self._changed_rows = np.zeros((self.tiles_shape[0], self.reference_shape[1]), dtype=np.uint8)
+        self._tile_positions = np.zeros((tiles_count, 2), dtype=np.int32)
+        self._tiles = np.empty((tiles_count, tile_size, tile_size) if self.tiled else (0, 0, 0), dtype=np.uint8)
+
+    @property
+    def tiled(self) -> bool:
+        return self.tile_size > 0
+
+    @property
+    def dirty_mask_size(self) -> int:
+        """Размер упакованной битовой карты плиток в байтах."""
+        return (self.tiles_shape[0] * self.tiles_shape[1] + 7) // 8
 
     def _validate_frame_shape(self, frame: np.ndarray) -> None:
         """Проверяет соответствие формы кадра ожидаемой."""
@@ -31,52 +68,177 @@ class GrayscaleDifferenceHandler:
                 f"got {frame.shape}"
             )
 
+    @staticmethod
+    @njit(parallel=True, cache=True)
+    def _modular_subtract(minuend: np.ndarray, subtrahend: np.ndarray, max_value: int, out: np.ndarray) -> None:
+        """out = (minuend - subtrahend) mod max_value для значений в [0, max_value-1], out может быть minuend."""
+        for i in prange(out.shape[0]):
+            for j in range(out.shape[1]):
+                value = np.int16(minuend[i, j]) - np.int16(subtrahend[i, j])
+                if value < 0:
+                    value += max_value
+                out[i, j] = value
+
+    @staticmethod
+    @njit(parallel=True, cache=True)
+    def _mark_dirty_tiles(reference: np.ndarray, current: np.ndarray, tile_size: int,
+                          dirty_mask: np.ndarray, changed_rows: np.ndarray) -> None:
+        height, width = current.shape
+        rows, cols = dirty_mask.shape
+        for row in prange(rows):
+            # Сначала OR отличий по всем строкам полосы плиток (векторизуется), затем свёртка по плиткам
+            changed = changed_rows[row]
+            for i in range(row * tile_size, min(row * tile_size + tile_size, height)):
+                for j in range(width):
+                    changed[j] |= reference[i, j] ^ current[i, j]
+            for col in range(cols):
+                tile_changed = 0
+                for j in range(col * tile_size, min(col * tile_size + tile_size, width)):
+                    tile_changed |= changed[j]
+                    changed[j] = 0
+                dirty_mask[row, col] = tile_changed != 0
+
+    @staticmethod
+    @njit(cache=True)
+    def _index_dirty_tiles(dirty_mask: np.ndarray, tile_positions: np.ndarray) -> int:
+        """Записывает (row, col) изменившихся плиток в tile_positions, возвращает их количество."""
+        count = 0
+        for row in range(dirty_mask.shape[0]):
+            for col in range(dirty_mask.shape[1]):
+                if dirty_mask[row, col]:
+                    tile_positions[count, 0] = row
+                    tile_positions[count, 1] = col
+                    count += 1
+        return count
+
+    @staticmethod
+    @njit(parallel=True, cache=True)
+    def _compute_tiles(reference: np.ndarray, current: np.ndarray, max_value: int, tile_size: int,
+                       tile_positions: np.ndarray, count: int, tiles: np.ndarray) -> None:
+        height, width = current.shape
+        for k in prange(count):
+            row_start = tile_positions[k, 0] * tile_size
+            col_start = tile_positions[k, 1] * tile_size
+            tile_height = min(tile_size, height - row_start)
+            tile_width = min(tile_size, width - col_start)
+            if tile_height < tile_size or tile_width < tile_size:  # Плитки на краю кадра дополняются нулями
+                tiles[k] = 0
+            for i in range(tile_height):
+                reference_row = reference[row_start + i, col_start:col_start + tile_width]
+                current_row = current[row_start + i, col_start:col_start + tile_width]
+                tile_row = tiles[k, i, :tile_width]
+                for j in range(tile_width):
+                    value = np.int16(reference_row[j]) - np.int16(current_row[j])  # D = R - C
+                    if value < 0:
+                        value += max_value
+                    tile_row[j] = value
+
+    @staticmethod
+    @njit(parallel=True, cache=True)
+    def _apply_tiles(reference: np.ndarray, max_value: int, tile_size: int,
+                     tile_positions: np.ndarray, count: int, tiles: np.ndarray) -> None:
+        height, width = reference.shape
+        for k in prange(count):
+            row_start = tile_positions[k, 0] * tile_size
+            col_start = tile_positions[k, 1] * tile_size
+            tile_width = min(tile_size, width - col_start)
+            for i in range(min(tile_size, height - row_start)):
+                reference_row = reference[row_start + i, col_start:col_start + tile_width]
+                tile_row = tiles[k, i, :tile_width]
+                for j in range(tile_width):
+                    value = np.int16(reference_row[j]) - np.int16(tile_row[j])  # R - D = R - (R - C) = C
+                    if value < 0:
+                        value += max_value
+                    reference_row[j] = value
+
     def compute_difference(self, current_frame: np.ndarray) -> np.ndarray:
         """
-        Вычисляет разностный кадр между текущим и reference кадром.
+        Вычисляет разностный кадр между текущим и reference кадром без выделения памяти.
 
         Args:
             current_frame: Текущий кадр для сравнения
 
         Returns:
-            Разностный кадр в диапазоне [0, max_value-1]
+            Разностный кадр в диапазоне [0, max_value-1] (переиспользуемый буфер, действителен до следующего вызова)
         """
         self._validate_frame_shape(current_frame)
-
-        # Оптимизированное вычисление разности по модулю
-        difference = np.subtract(
-            self._reference_frame.astype(np.int16),  # Предотвращаем переполнение
-            current_frame.astype(np.int16),
-            dtype=np.int16
-        )  # D = R - C
-        difference = np.mod(difference, self.max_value, dtype=np.int16)
-
-        return difference.astype(np.uint8)
+        self._modular_subtract(self._reference_frame, current_frame, self.max_value, self._difference_frame)  # D = R - C
+        return self._difference_frame
 
     def apply_difference(self, difference_frame: np.ndarray) -> np.ndarray:
         """
-        Применяет разностный кадр к reference frame и возвращает результат.
+        Применяет разностный кадр к reference frame на месте и возвращает результат.
 
         Args:
             difference_frame: Разностный кадр для применения
 
         Returns:
-            Новый реконструированный кадр
+            Новый реконструированный кадр (reference frame)
         """
         self._validate_frame_shape(difference_frame)
+        self._modular_subtract(self._reference_frame, difference_frame, self.max_value,
+                               self._reference_frame)  # R - D = R - (R - C) = C
+        return self._reference_frame
+
+    def compute_tiled_difference(self, current_frame: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Вычисляет разность только для изменившихся плиток без выделения памяти.
+
+        Args:
+            current_frame: Текущий кадр для сравнения
+
+        Returns:
+            (dirty_mask, tiles): булева карта изменившихся плиток формы tiles_shape
+            и разность этих плиток формы (dirty_count, tile_size, tile_size) в диапазоне [0, max_value-1].
+            Оба массива - переиспользуемые буферы, действительны до следующего вызова.
+        """
+        if not self.tiled:
+            raise ValueError(f"{self.name}: Tiled difference requires tile_size > 0")
+        self._validate_frame_shape(current_frame)
+
+        self._mark_dirty_tiles(self._reference_frame, current_frame, self.tile_size,
+                               self._dirty_mask, self._changed_rows)
+        count = self._index_dirty_tiles(self._dirty_mask, self._tile_positions)
+        self._compute_tiles(self._reference_frame, current_frame, self.max_value, self.tile_size,
+                            self._tile_positions, count, self._tiles)
+
+        return self._dirty_mask, self._tiles[:count]
+
+    def apply_tiled_difference(self, dirty_mask: np.ndarray, tiles: np.ndarray) -> np.ndarray:
+        """
+        Применяет разность изменившихся плиток к reference frame на месте.
+
+        Args:
+            dirty_mask: Булева карта изменившихся плиток формы tiles_shape
+            tiles: Разность изменившихся плиток формы (dirty_count, tile_size, tile_size)
+
+        Returns:
+            Новый реконструированный кадр (reference frame)
+        """
+        if not self.tiled:
+            raise ValueError(f"{self.name}: Tiled difference requires tile_size > 0")
+        if dirty_mask.shape != self.tiles_shape:
+            raise ValueError(f"{self.name}: Expected dirty mask shape {self.tiles_shape}, got {dirty_mask.shape}")
+
+        count = self._index_dirty_tiles(dirty_mask, self._tile_positions)
+        if tiles.shape != (count, self.tile_size, self.tile_size):
+            raise ValueError(
+                f"{self.name}: Expected tiles shape {(count, self.tile_size, self.tile_size)}, got {tiles.shape}")
 
-        # Вычисляем новый кадр с применением разности
-        new_frame = np.subtract(
-            self._reference_frame.astype(np.int16),
-            difference_frame.astype(np.int16),
-            dtype=np.int16
-        )  # R - D = R - (R - C) = C
-        new_frame = np.mod(new_frame, self.max_value, dtype=np.int16)
-        new_frame = new_frame.astype(np.uint8)
+        self._apply_tiles(self._reference_frame, self.max_value, self.tile_size, self._tile_positions, count, tiles)
+        return self._reference_frame
 
-        self._reference_frame = new_frame
+    def pack_dirty_mask(self, dirty_mask: np.ndarray) -> bytes:
+        """Упаковывает карту плиток в биты (dirty_mask_size байт)."""
+        return np.packbits(dirty_mask, axis=None).tobytes()
 
-        return new_frame
+    def unpack_dirty_mask(self, data: bytes) -> np.ndarray:
+        """Распаковывает карту плиток из первых dirty_mask_size байт."""
+        if len(data) < self.dirty_mask_size:
+            raise ValueError(f"{self.name}: Dirty mask needs {self.dirty_mask_size} bytes, got {len(data)}")
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8, count=self.dirty_mask_size),
+                             count=self.tiles_shape[0] * self.tiles_shape[1])
+        return bits.astype(bool).reshape(self.tiles_shape)
 
     def update_reference(self, new_frame: np.ndarray) -> None:
         """
@@ -86,7 +248,7 @@ class GrayscaleDifferenceHandler:
             new_frame: Новый reference frame
         """
         self._validate_frame_shape(new_frame)
-        self._reference_frame = new_frame.astype(np.uint8)
+        self._reference_frame[:] = new_frame
 
     @property
     def reference_frame(self) -> np.ndarray:
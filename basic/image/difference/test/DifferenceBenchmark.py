@@ -0,0 +1,96 @@
+from time import time
+from typing import Callable, Tuple
+
+import numpy as np
+
+from basic.image.difference.GrayscaleDifferenceHandler import GrayscaleDifferenceHandler
+
+
+class DifferenceBenchmark:
+    """Сравнение прежней реализации на временных int16-массивах с реализацией на переиспользуемых буферах"""
+    SHAPES = {"1080p": (1080, 1920), "4K": (2160, 3840)}
+    MAX_VALUE = 3
+    TILE_SIZE = 32
+    CHANGED_PART = 0.01  # Доля изменившихся строк для "спокойного" кадра
+
+    def __init__(self):
+        self._rng = np.random.default_rng(0)
+
+    @staticmethod
+    def legacy_compute_difference(reference: np.ndarray, current: np.ndarray, max_value: int) -> np.ndarray:
+        difference = np.subtract(reference.astype(np.int16), current.astype(np.int16), dtype=np.int16)
+        difference = np.mod(difference, max_value, dtype=np.int16)
+        return difference.astype(np.uint8)
+
+    @staticmethod
+    def legacy_apply_difference(reference: np.ndarray, difference: np.ndarray, max_value: int) -> np.ndarray:
+        new_frame = np.subtract(reference.astype(np.int16), difference.astype(np.int16), dtype=np.int16)
+        new_frame = np.mod(new_frame, max_value, dtype=np.int16)
+        return new_frame.astype(np.uint8)
+
+    def _generate_frames(self, shape: Tuple[int, int], changed_part: float) -> Tuple[np.ndarray, np.ndarray]:
+        reference = self._rng.integers(0, self.MAX_VALUE, shape, dtype=np.uint8)
+        current = reference.copy()
+        changed_rows = max(1, int(shape[0] * changed_part))
+        current[:changed_rows] = self._rng.integers(0, self.MAX_VALUE, (changed_rows, shape[1]), dtype=np.uint8)
+        return reference, current
+
+    @staticmethod
+    def _measure(func: Callable, iterations: int) -> float:
+        func()  # Компиляция numba и прогрев кэшей
+        times = []
+        for _ in range(iterations):
+            start_time = time()
+            func()
+            times.append(time() - start_time)
+        return float(np.mean(times))
+
+    def test(self, iterations: int = 50):
+        print(f"max_value={self.MAX_VALUE}", f"tile_size={self.TILE_SIZE}", f"iterations={iterations}")
+        print(str().rjust(24), "compute(sec)".rjust(12), "apply(sec)".rjust(12), sep="\t")
+        for shape_name, shape in self.SHAPES.items():
+            for changed_name, changed_part in (("full", 1.0), ("idle", self.CHANGED_PART)):
+                reference, current = self._generate_frames(shape, changed_part)
+                legacy_difference = self.legacy_compute_difference(reference, current, self.MAX_VALUE)
+
+                handler = GrayscaleDifferenceHandler(self.MAX_VALUE, 100, shape)
+                handler.update_reference(reference)
+                tiled_handler = GrayscaleDifferenceHandler(self.MAX_VALUE, 100, shape, self.TILE_SIZE)
+                tiled_handler.update_reference(reference)
+                dirty_mask, tiles = tiled_handler.compute_tiled_difference(current)
+                dirty_mask, tiles = dirty_mask.copy(), tiles.copy()
+
+                rows = [
+                    ("legacy", lambda: self.legacy_compute_difference(reference, current, self.MAX_VALUE),
+                     lambda: self.legacy_apply_difference(reference, legacy_difference, self.MAX_VALUE)),
+                    ("in-place", lambda: handler.compute_difference(current),
+                     lambda: handler.apply_difference(legacy_difference)),
+                    ("in-place tiled", lambda: tiled_handler.compute_tiled_difference(current),
+                     lambda: tiled_handler.apply_tiled_difference(dirty_mask, tiles)),
+                ]
+                for row_name, compute, apply in rows:
+                    compute_time = self._measure(compute, iterations)
+                    apply_time = self._measure(apply, iterations)
+                    print(f"{shape_name} {changed_name} {row_name}".rjust(24),
+                          f"{compute_time:.6f}".rjust(12), f"{apply_time:.6f}".rjust(12), sep="\t")
+
+
+if __name__ == "__main__":
+    DifferenceBenchmark().test()
+
+"""
+max_value=3 tile_size=32 iterations=50
+                        	compute(sec)	  apply(sec)
+       1080p full legacy	    0.024757	    0.027040
+     1080p full in-place	    0.000577	    0.000575
+1080p full in-place tiled	    0.001603	    0.000991
+       1080p idle legacy	    0.016967	    0.026919
+     1080p idle in-place	    0.000562	    0.000552
+1080p idle in-place tiled	    0.000366	    0.000035
+          4K full legacy	    0.087178	    0.094179
+        4K full in-place	    0.002687	    0.002631
+  4K full in-place tiled	    0.014730	    0.005665
+          4K idle legacy	    0.058773	    0.088173
+        4K idle in-place	    0.002351	    0.002557
+  4K idle in-place tiled	    0.001582	    0.000067
+"""
@@ -0,0 +1,24 @@
+import numba
+from numba import config
+
+
+def configure_numba_threading_layer() -> bool:
+    """
+    Ставит слой потоков numba omp первым. Ядра с parallel=True запускаются не из главного потока
+    (потоки клиентов сервера, этапы EncodePipeline), а слой tbb в этом случае подвисает
+    при завершении интерпретатора.
+
+    Слой выбирается один раз на процесс при первом запуске параллельного ядра и действует на весь
+    процесс, поэтому настройка вызывается явно при старте сервера, до создания ToolsManager.
+    Возвращает False, если слой уже выбран и изменить его нельзя.
+    """
+    try:
+        numba.threading_layer()
+    except ValueError:  # Слой ещё не выбран
+        config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+        return True
+    return False
+
+
+if __name__ == "__main__":
+    print(configure_numba_threading_layer(), config.THREADING_LAYER_PRIORITY)
@@ -12,9 +12,18 @@ class Packer(ABC):
     BYTES_PER_DIMENSION = 2
     MAX_DIMENSIONS = 2 ** 8 - 1
     MAX_DIMENSION_SIZE = 2 ** 16 - 1
+    # Проверка значений массива: "full" - весь массив, "sampled" - непрерывный блок из VALIDATION_SAMPLE_SIZE
+    # значений, сдвигающийся от вызова к вызову, "off" - только тип и размер (для вызывающего кода,
+    # который сам гарантирует диапазон значений)
+    VALIDATION_MODES = ("full", "sampled", "off")
+    VALIDATION_SAMPLE_SIZE = 16384
 
-    def __init__(self, bits_per_value: int = 8):
+    def __init__(self, bits_per_value: int = 8, validation: str = "full"):
         self.name = self.__class__.__name__
+        if validation not in self.VALIDATION_MODES:
+            raise ValueError(f"Unknown validation mode {validation!r}, expected one of {self.VALIDATION_MODES}")
+        self.validation = validation
+        self._sample_offset = 0
         self.bits_per_value = None
         self.max_value = None
         self.set_bits_per_value(bits_per_value)
@@ -44,13 +53,20 @@ class Packer(ABC):
         if array.dtype != np.uint8:
             raise ValueError(f"Array must have dtype uint8, got {array.dtype}")
 
-        if array.min() < 0:
+        # uint8 не бывает отрицательным, остаётся проверить только верхнюю границу
+        if self.validation == "off" or self.max_value == 255:
+            return
+        if self.validation == "full":
+            values = array
+        else:
+            flatten_array = array.reshape(-1)
+            start = self._sample_offset % flatten_array.size
+            values = flatten_array[start:start + self.VALIDATION_SAMPLE_SIZE]
+            self._sample_offset = start + self.VALIDATION_SAMPLE_SIZE
+        max_value = values.max()
+        if max_value > self.max_value:
             raise ValueError(
-                f"Array contains negative values {array.min()}, but packer doesn't support signed values")
-
-        if array.max() > self.max_value:
-            raise ValueError(
-                f"Array values up to {array.max()} exceed maximum packable " +
+                f"Array values up to {max_value} exceed maximum packable " +
                 f"value {self.max_value} for {self.bits_per_value} bits")
 
     @staticmethod
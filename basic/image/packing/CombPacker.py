@@ -3,24 +3,33 @@ from typing import TypeAlias
 import numpy as np
 from numba import njit, prange
 
+from basic.image.packing.NumbaWarmRegistry import NumbaWarmRegistry
 from basic.image.packing.ShiftPacker import ShiftPacker
 
 
 class CombPacker(ShiftPacker):
-    def __init__(self, bits_per_value: int = 8):
-        super().__init__(bits_per_value)
+    DENSE = False  # Ядра numba работают с раскладкой по uint16/32/64
+
+    def __init__(self, bits_per_value: int = 8, validation: str = "full"):
+        super().__init__(bits_per_value, validation)
+
+    def set_bits_per_value(self, bits_per_value: int):
+        super().set_bits_per_value(bits_per_value)
         self.warm_njit()
 
-    def warm_njit(self):
-        """Прогрев для различных возможных размеров входных данных, создаёт компиляторы njit заранее"""
-        test_cases = [np.ones((1, 1, 1), dtype=np.uint8), np.ones((1, 1), dtype=np.uint8),
-                      np.ones((1,), dtype=np.uint8),]
-        initial_bits_per_value = self.bits_per_value
-        for bits_per_value in self._MASK_MAP.keys():
-            self.set_bits_per_value(bits_per_value)
-            for test_data in test_cases:
-                self.unpack_array(self.pack_array(test_data))
-        self.set_bits_per_value(initial_bits_per_value)
+    def warm_njit(self) -> float:
+        """
+        Прогревает ядра numba только для текущей ширины значений, один раз на процесс.
+
+        Сигнатура ядер зависит лишь от типа слова (uint8/16/32/64), ширины 1 и 8 упаковываются без ядер.
+        Возвращает время прогрева (0 - ядра уже прогреты).
+        """
+        if self.bits_per_value in (1, 8):
+            return 0.0
+        dtype = np.dtype(self._TYPES_MAP[self.bits_per_value][0])
+        return NumbaWarmRegistry.warm(
+            (CombPacker.__name__, dtype.name),
+            lambda: self.unpack_array(self.pack_array(np.ones((1,), dtype=np.uint8))))
 
     @staticmethod
     @njit(parallel=True, cache=True)
@@ -2,57 +2,58 @@ import numpy as np
 from numba import njit, prange
 
 from basic.image.packing.ABC_Packer import Packer
+from basic.image.packing.NumbaWarmRegistry import NumbaWarmRegistry
 
 
 class NumbaPacker(Packer):
+    """Плотная упаковка битовым потоком: значения подряд по bits_per_value бит, старшие биты первыми."""
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.warm_njit()
 
-    def warm_njit(self):
-        """Прогрев для различных возможных размеров входных данных, создаёт компиляторы njit заранее"""
-        test_cases = [np.ones((1, 1, 1), dtype=np.uint8), np.ones((1, 1), dtype=np.uint8),
-                      np.ones((1,), dtype=np.uint8),]
-        initial_bits_per_value = self.bits_per_value
-        for bits_per_value in range(1, 9):
-            self.set_bits_per_value(bits_per_value)
-            for test_data in test_cases:
-                self.unpack_array(self.pack_array(test_data))
-        self.set_bits_per_value(initial_bits_per_value)
+    def warm_njit(self) -> float:
+        """
+        Прогревает ядра numba один раз на процесс: ширина - аргумент ядра, а не часть сигнатуры,
+        поэтому одного вызова хватает для всех ширин. Возвращает время прогрева (0 - уже прогреты).
+        """
+        return NumbaWarmRegistry.warm(
+            NumbaPacker.__name__, lambda: self.unpack_array(self.pack_array(np.ones((1,), dtype=np.uint8))))
 
     @staticmethod
     @njit(parallel=True, cache=True)
-    def _pack_array_numba(array: np.ndarray, data_size: int, bits_per_value: int) -> bytes:
-        result = np.zeros(data_size, dtype=np.uint8)
-        for i in prange(array.size):
-            value = array[i]
-            start_bit = i * bits_per_value
-            for bit in range(bits_per_value):
-                if value & (1 << bit):
-                    byte_pos = (start_bit + bit) // 8
-                    bit_pos = (start_bit + bit) % 8
-                    result[byte_pos] |= (1 << bit_pos)
-        return result.tobytes()
+    def _pack_array_numba(array: np.ndarray, data_size: int, bits_per_value: int) -> np.ndarray:
+        # 8 значений по bits_per_value бит занимают ровно bits_per_value байт, поэтому каждая
+        # итерация prange пишет только свои байты (без гонок при |= в общий байт)
+        groups = (array.size + 7) // 8
+        result = np.zeros(groups * bits_per_value, dtype=np.uint8)
+        for group in prange(groups):
+            accumulator = np.uint64(0)
+            for i in range(group * 8, group * 8 + 8):
+                value = np.uint64(array[i]) if i < array.size else np.uint64(0)
+                accumulator = (accumulator << np.uint64(bits_per_value)) | value
+            offset = group * bits_per_value
+            for byte in range(bits_per_value):
+                shift = np.uint64(8 * (bits_per_value - 1 - byte))
+                result[offset + byte] = np.uint8((accumulator >> shift) & np.uint64(0xFF))
+        return result[:data_size]
 
     @staticmethod
     @njit(parallel=True, cache=True)
     def _unpack_array_numba(data_array: np.ndarray, total_elements: int, bits_per_value: int) -> np.ndarray:
-        result = np.zeros(total_elements, dtype=np.uint8)
-        total_bits = data_array.size * 8
-
-        for i in prange(total_elements):
-            start_bit = i * bits_per_value
-            value = 0
-            for bit in range(bits_per_value):
-                current_bit = start_bit + bit
-                if current_bit < total_bits:
-                    byte_pos = current_bit // 8
-                    bit_pos = current_bit % 8
-                    if data_array[byte_pos] & (1 << bit_pos):
-                        value |= (1 << bit)
-            result[i] = value
-
-        return result
+        groups = (total_elements + 7) // 8
+        result = np.zeros(groups * 8, dtype=np.uint8)
+        mask = np.uint64((1 << bits_per_value) - 1)
+        for group in prange(groups):
+            offset = group * bits_per_value
+            accumulator = np.uint64(0)
+            for byte in range(offset, offset + bits_per_value):
+                value = np.uint64(data_array[byte]) if byte < data_array.size else np.uint64(0)
+                accumulator = (accumulator << np.uint64(8)) | value
+            for i in range(8):
+                shift = np.uint64(bits_per_value * (7 - i))
+                result[group * 8 + i] = np.uint8((accumulator >> shift) & mask)
+        return result[:total_elements]
 
     def pack_array(self, array: np.ndarray) -> bytes:
         # Предварительные вычисления вне Numba
@@ -60,7 +61,7 @@ class NumbaPacker(Packer):
         total_bytes = (total_bits + 7) // 8
 
         # Вызов Numba-функции
-        packed_data = self._pack_array_numba(array.flatten(), total_bytes, self.bits_per_value)
+        packed_data = self._pack_array_numba(array.reshape(-1), total_bytes, self.bits_per_value).tobytes()
 
         header = self._pack_shape(array.shape)
         return header + packed_data
@@ -0,0 +1,37 @@
+from threading import RLock
+from time import time
+from typing import Callable, Dict, Hashable
+
+
+class NumbaWarmRegistry:
+    """
+    Общий на процесс реестр прогретых ядер numba.
+
+    Ядро с данной сигнатурой (ключом) прогревается один раз на процесс при первом запросе:
+    остальные экземпляры упаковщиков с тем же ключом прогрев пропускают. Ядра объявлены
+    с cache=True, поэтому прогрев в новом процессе загружает машинный код из __pycache__,
+    а не компилирует его заново.
+    """
+    _warmed: Dict[Hashable, float] = dict()  # ключ -> время прогрева в секундах
+    _lock = RLock()
+
+    @classmethod
+    def warm(cls, key: Hashable, warm_function: Callable[[], object]) -> float:
+        """Вызывает warm_function, если ключ ещё не прогрет. Возвращает затраченное время (0 - уже прогрет)."""
+        if key in cls._warmed:
+            return 0.0
+        with cls._lock:
+            if key in cls._warmed:
+                return 0.0
+            _start_time = time()
+            warm_function()
+            cls._warmed[key] = time() - _start_time
+            return cls._warmed[key]
+
+    @classmethod
+    def is_warmed(cls, key: Hashable) -> bool:
+        return key in cls._warmed
+
+    @classmethod
+    def get_stats(cls) -> Dict[Hashable, float]:
+        return dict(cls._warmed)
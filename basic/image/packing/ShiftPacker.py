@@ -6,6 +6,18 @@ from basic.image.packing.ABC_Packer import Packer
 
 
 class ShiftPacker(Packer):
+    """
+    Плотная упаковка значений шириной 1-8 бит без потерянных битов.
+
+    Массив раскладывается на битовые плоскости: плоскость k - k-й бит всех значений,
+    упакованный np.packbits. Размер данных - bits_per_value * ceil(size / 8) байт.
+    Заголовок и плоскости собираются в одном массиве, который затем копируется в bytes.
+
+    DENSE = False - прежняя раскладка, несколько значений в одном uint16/32/64
+    (часть битов теряется, например 5 значений по 3 бита в uint16), её использует CombPacker.
+    """
+    DENSE = True
+
     _TYPES_MAP = {
         # bits_per_value: (dtype, dtype_bits_count, values_per_dtype)
         1: (np.uint8, 8, 8),
@@ -24,9 +36,14 @@ class ShiftPacker(Packer):
         dtype, dtype_bits_count, values_per_dtype = _TYPES_MAP[bits_per_value]
         _SHIFTS_MAP[bits_per_value] = bits_per_value * np.arange(values_per_dtype, dtype=dtype)[::-1]
     # print(*list(_SHIFTS_MAP.items()), sep="\n")
+    # _PLANE_LUT[k][byte] - 8 байт (по порядку в памяти) со значениями битов byte (старший первым), сдвинутыми на k
+    _PLANE_LUT = np.stack([
+        (np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1) << plane).view(np.uint64).reshape(256)
+        for plane in range(8)
+    ])
 
-    def __init__(self, bits_per_value: int = 8):
-        super().__init__(bits_per_value)
+    def __init__(self, bits_per_value: int = 8, validation: str = "full"):
+        super().__init__(bits_per_value, validation)
 
     @staticmethod
     def _tamp_array_by_shift(flatted_array: np.ndarray, target_dtype: TypeAlias,
@@ -52,10 +69,60 @@ class ShiftPacker(Packer):
             untamped[value_pos_in_dtype::values_per_dtype] = (tamped_array >> shift) & bit_mask
         return untamped
 
+    @staticmethod
+    def _pack_planes(flatten_array: np.ndarray, bits_per_value: int, out: np.ndarray) -> None:
+        """Пишет bits_per_value битовых плоскостей массива подряд в out."""
+        plane_size = (flatten_array.size + 7) // 8
+        bit = np.empty_like(flatten_array)
+        for plane in range(bits_per_value):
+            # packbits считает любой ненулевой байт единицей, поэтому сдвиг к младшему биту не нужен
+            np.bitwise_and(flatten_array, 1 << plane, out=bit)
+            out[plane * plane_size:(plane + 1) * plane_size] = np.packbits(bit)
+
+    @staticmethod
+    def _unpack_planes(planes: np.ndarray, bits_per_value: int, size: int) -> np.ndarray:
+        """Собирает значения из плоскостей: байт плоскости k по таблице даёт 8 значений сразу (как uint64)."""
+        plane_size = (size + 7) // 8
+        if planes.size != bits_per_value * plane_size:
+            raise ValueError(f"Packed data size {planes.size} does not match {bits_per_value} planes " +
+                             f"of {plane_size} bytes")
+        if bits_per_value == 1:
+            return np.unpackbits(planes, count=size)
+        result = np.empty(plane_size, dtype=np.uint64)
+        values = np.empty(plane_size, dtype=np.uint64)
+        np.take(ShiftPacker._PLANE_LUT[0], planes[:plane_size], out=result)
+        for plane in range(1, bits_per_value):
+            np.take(ShiftPacker._PLANE_LUT[plane], planes[plane * plane_size:(plane + 1) * plane_size], out=values)
+            np.bitwise_or(result, values, out=result)
+        return result.view(np.uint8)[:size]
+
+    def _pack_dense(self, array: np.ndarray) -> bytes:
+        header = self._pack_shape(array.shape)
+        flatten_array = array.reshape(-1)
+        if self.bits_per_value == 8:
+            return header + flatten_array.tobytes()
+        # Буфер новый на каждый вызов: результат живёт дольше вызова (в конвейере кадр ещё сжимается,
+        # пока упаковывается следующий), переиспользуемый буфер перезаписал бы его
+        out = np.empty(len(header) + self.bits_per_value * ((flatten_array.size + 7) // 8), dtype=np.uint8)
+        out[:len(header)] = np.frombuffer(header, dtype=np.uint8)
+        self._pack_planes(flatten_array, self.bits_per_value, out[len(header):])
+        return out.tobytes()
+
+    def _unpack_dense(self, data: bytes) -> np.ndarray:
+        shape, packed_array = self._unpack_shape_header(data)
+        size = int(np.prod(shape))
+        planes = np.frombuffer(packed_array, dtype=np.uint8)
+        if self.bits_per_value == 8:
+            return planes.reshape(shape)
+        return self._unpack_planes(planes, self.bits_per_value, size).reshape(shape)
+
     def pack_array(self, array: np.ndarray) -> bytes:
-        """Упаковка через сдвиги с сохранением формы массива"""
+        """Упаковка с сохранением формы массива"""
         self._validate_array(array)
 
+        if self.DENSE:
+            return self._pack_dense(array)
+
         flatten_array = array.flatten()
 
         if self.bits_per_value == 1:
@@ -73,7 +140,12 @@ class ShiftPacker(Packer):
         return header + packed_array
 
     def unpack_array(self, data: bytes) -> np.ndarray:
-        """Распаковка через сдвиги с восстановлением формы из заголовка"""
+        """Распаковка с восстановлением формы из заголовка"""
+        if self.DENSE:
+            array = self._unpack_dense(data)
+            self._validate_array(array)
+            return array
+
         shape, packed_array = self._unpack_shape_header(data)  # Распаковываем заголовок
         expected_size = int(np.prod(shape))
 
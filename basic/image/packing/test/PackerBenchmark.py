@@ -137,29 +137,208 @@ class PackerBenchmark:
                 print(f"{ratio:.6f}".rjust(10), end="\t")
             print()
 
+    TEST_VALIDATION_DATA_SHAPES = [(1080, 1920, 1), (1200, 800, 1), (200, 200, 1)]
+
+    @staticmethod
+    def _test_validate(packer: Packer, array: np.ndarray, iterations: int) -> float:
+        start_time = time()
+        for _ in range(iterations):
+            packer._validate_array(array)
+        return (time() - start_time) / iterations
+
+    def test_validation(self, packer_classes: List[type], bits_per_value: int = 4, iterations: int = 200):
+        """
+        Время одной проверки массива (Packer._validate_array) в каждом режиме Packer.VALIDATION_MODES
+        и доля, которую режим экономит в pack + unpack (массив проверяется и при упаковке, и при распаковке).
+        """
+        modes = Packer.VALIDATION_MODES
+        print(f"bits_per_value={bits_per_value}", f"iterations={iterations}")
+        print("validate(sec)".rjust(28), *[mode.rjust(10) for mode in modes], sep="\t")
+        validate_times = dict()
+        for shape in self.TEST_VALIDATION_DATA_SHAPES:
+            array = self._generate_test_data(bits_per_value, shape)
+            # _validate_array общий для всех упаковщиков (Packer), достаточно одного класса
+            validate_times[shape] = [self._test_validate(packer_classes[0](bits_per_value, validation=mode),
+                                                         array, iterations) for mode in modes]
+            print(str(shape).rjust(28), *[f"{t:.6f}".rjust(10) for t in validate_times[shape]], sep="\t")
+
+        print("saving vs full".rjust(28), "pack+unpack".rjust(12), *[mode.rjust(10) for mode in modes[1:]], sep="\t")
+        for packer_class in packer_classes:
+            for shape in self.TEST_VALIDATION_DATA_SHAPES:
+                packer = packer_class(bits_per_value, validation="full")
+                total = (self._test_performance_packing(packer, bits_per_value, shape, iterations) +
+                         self._test_performance_unpacking(packer, bits_per_value, shape, iterations))
+                full_time = validate_times[shape][0]
+                savings = [f"{2 * (full_time - t) / total:.1%}".rjust(10) for t in validate_times[shape][1:]]
+                print(f"{packer_class.__name__} {shape[:2]}".rjust(28), f"{total:.6f}".rjust(12), *savings, sep="\t")
+
+    def test_sparse(self, packers: List[Packer], fractions=(0.0, 0.001, 0.01, 0.1), iterations: int = 100):
+        """Размер и время pack + unpack на почти нулевых данных (доля ненулевых значений - fraction)"""
+        shape = self.TEST_SPEED_DATA_SHAPE_REGULAR
+        rng = np.random.default_rng(0)
+        print(np.prod(shape), shape, f"iterations={iterations}")
+        print("ratio/pack+unpack(sec)".rjust(24), *[f"{fraction}".rjust(18) for fraction in fractions], sep="\t")
+        data = [((rng.random(shape) < fraction) * rng.integers(1, 4, shape)).astype(np.uint8)
+                for fraction in fractions]
+        for packer in packers:
+            packer.set_bits_per_value(2)
+            row = []
+            for array in data:
+                packed = packer.pack_array(array)
+                assert np.array_equal(packer.unpack_array(packed), array)
+                start_time = time()
+                for _ in range(iterations):
+                    packer.unpack_array(packer.pack_array(array))
+                row.append(f"{len(packed) / array.size:.4f}/{(time() - start_time) / iterations:.6f}".rjust(18))
+            print(packer.name.rjust(24), *row, sep="\t")
+
+    @staticmethod
+    def _difference_scenario(name: str, gray: np.ndarray, frame_index: int, rng: np.random.Generator) -> np.ndarray:
+        """Кадр сценария: text - дописанный текст (правки накапливаются), scroll - прокрутка области, drag - окно."""
+        import cv2
+
+        height, width = gray.shape
+        if name == "text":
+            cv2.putText(gray, f"frame {frame_index}", (int(rng.integers(0, width - 200)), int(rng.integers(30, height))),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, int(rng.integers(0, 256)), 2)
+            return gray
+        frame = gray.copy()
+        if name == "scroll":
+            frame[height // 5:height * 4 // 5, width // 6:width * 5 // 6] = np.roll(
+                gray[height // 5:height * 4 // 5, width // 6:width * 5 // 6], -8 * frame_index, axis=0)
+        else:
+            x = width // 20 + 15 * frame_index
+            frame[height // 4:height // 4 + height // 3, x:x + width // 4] = gray[:height // 3, :width // 4]
+        return frame
+
+    def test_difference_payloads(self, path, packers: List[Packer], compressor_names=("zstd_stream", "zstd", "lz4"),
+                                 scenarios=("text", "scroll", "drag"), tile_sizes=(32, 0), colors: int = 3,
+                                 scale_percent: int = 80, frames: int = 30):
+        """
+        Размер и время pack + compress на настоящих разностных кадрах ToolsManager: плитки изменившихся
+        областей (tile_size > 0) и разность всего кадра (tile_size = 0). По нему выбирается упаковщик
+        ToolsManager для каждого режима разности.
+        """
+        from PIL import Image
+
+        from basic.image.ToolsManager import ToolsManager
+        from basic.image.difference.GrayscaleDifferenceHandler import GrayscaleDifferenceHandler
+        from basic.image.quanting.GrayQuantizer import GrayQuantizer
+        from basic.image.resizing.CVResizerIntScale import CVResizerIntScale
+
+        source = np.array(Image.open(path).convert("L"), dtype=np.uint8)
+        height, width = source.shape
+        resizer = CVResizerIntScale(scale_percent, original_size=(width, height))
+        quantizer = GrayQuantizer(colors)
+        print(path.name, (height, width), f"colors={colors}", f"scale={scale_percent}", f"frames={frames}")
+        print("B/pack+compress(ms)".rjust(28), *[packer.name.rjust(18) for packer in packers], sep="\t")
+        for tile_size in tile_sizes:
+            for scenario in scenarios:
+                handler = GrayscaleDifferenceHandler(colors, scale_percent, (height, width), tile_size)
+                rng = np.random.default_rng(0)
+                gray = source.copy()
+                payloads = []
+                for frame_index in range(frames + 1):
+                    reference = quantizer.quantize_gray(
+                        resizer.resize(self._difference_scenario(scenario, gray, frame_index, rng)))
+                    if tile_size:
+                        payload = handler.compute_tiled_difference(reference)[1]
+                    else:
+                        payload = handler.compute_difference(reference)
+                    if frame_index and payload.size:  # Первый кадр - полный
+                        payloads.append(payload.copy())
+                    handler.update_reference(reference)
+                for compressor_name in compressor_names:
+                    row = []
+                    for packer in packers:
+                        packer.set_bits_per_value(quantizer.bits_per_color)
+                        compressor = ToolsManager.COMPRESSOR_MAP[compressor_name]()
+                        size = 0
+                        start_time = time()
+                        for payload in payloads:
+                            size += len(compressor.compress(packer.pack_array(payload)))
+                        elapsed = (time() - start_time) / len(payloads)
+                        row.append(f"{size // len(payloads)}/{elapsed * 1000:.3f}".rjust(18))
+                        compressor.close()
+                    print(f"tile={tile_size} {scenario} {compressor_name}".rjust(28), *row, sep="\t")
+
 
 if __name__ == "__main__":
     from basic.image.packing.ShiftPacker import ShiftPacker
     from basic.image.packing.NumbaPacker import NumbaPacker
     from basic.image.packing.CombPacker import CombPacker
     from basic.image.packing.NoTampingPacker import NoTampingPacker
+    from basic.image.packing.RunLengthPacker import RunLengthPacker
 
     tester = PackerBenchmark()
-    tester.test([NoTampingPacker(), CombPacker(), ShiftPacker(), NumbaPacker()], iterations=200)
+    tester.test([NoTampingPacker(), CombPacker(), ShiftPacker(), NumbaPacker(), RunLengthPacker()], iterations=200)
+    tester.test_validation([NoTampingPacker, CombPacker, ShiftPacker], iterations=200)
+    tester.test_sparse([NoTampingPacker(), ShiftPacker(), RunLengthPacker()])
+    from pathlib import Path
+    tester.test_difference_payloads(Path(__file__).parent.parent.parent / "data" / "a10.jpg",
+                                    [NoTampingPacker(validation="off"), RunLengthPacker(validation="off")])
 
 """
-960000 (1200, 800, 1)
+960000 (1200, 800, 1) iterations=200
                     	         1	         2	         3	         4	         5	         6	         7	         8	       avg
+     NoTampingPacker	       yes	       yes	       yes	       yes	       yes	       yes	       yes	       yes	
+        packing(sec)	  0.001921	  0.001902	  0.001882	  0.001869	  0.001954	  0.001903	  0.001899	  0.001877	0.001901
+      unpacking(sec)	  0.000093	  0.000094	  0.000093	  0.000096	  0.000093	  0.000096	  0.000094	  0.000069	0.000091
+      compress_ratio	  1.000007	  1.000007	  1.000007	  1.000007	  1.000007	  1.000007	  1.000007	  1.000007	
           CombPacker	       yes	       yes	       yes	       yes	       yes	       yes	       yes	       yes	
-        packing(sec)	  0.000398	  0.002230	  0.003542	  0.001677	  0.003887	  0.005066	  0.007511	  0.001155	0.003183
-      unpacking(sec)	  0.000221	  0.001034	  0.001268	  0.001336	  0.001152	  0.001231	  0.001023	  0.000181	0.000931
+        packing(sec)	  0.000205	  0.004229	  0.002782	  0.001482	  0.001576	  0.002475	  0.002488	  0.000282	0.001940
+      unpacking(sec)	  0.000171	  0.001774	  0.001951	  0.001808	  0.001971	  0.001950	  0.002024	  0.000094	0.001468
       compress_ratio	  0.125007	  0.250007	  0.400007	  0.500007	  0.666674	  0.800007	  0.888899	  1.000007	
          ShiftPacker	       yes	       yes	       yes	       yes	       yes	       yes	       yes	       yes	
-        packing(sec)	  0.000354	  0.003762	  0.004726	  0.003742	  0.005323	  0.006845	  0.012456	  0.001044	0.004782
-      unpacking(sec)	  0.000219	  0.003056	  0.003603	  0.002980	  0.004960	  0.007007	  0.009924	  0.000143	0.003987
-      compress_ratio	  0.125007	  0.250007	  0.400007	  0.500007	  0.666674	  0.800007	  0.888899	  1.000007	
+        packing(sec)	  0.000263	  0.000467	  0.000629	  0.000829	  0.000967	  0.001143	  0.001368	  0.000170	0.000729
+      unpacking(sec)	  0.000222	  0.001171	  0.001838	  0.002373	  0.003108	  0.003627	  0.004214	  0.000098	0.002081
+      compress_ratio	  0.125007	  0.250007	  0.375007	  0.500007	  0.625007	  0.750007	  0.875007	  1.000007	
          NumbaPacker	       yes	       yes	       yes	       yes	       yes	       yes	       yes	       yes	
-        packing(sec)	  0.001034	  0.001542	  0.002297	  0.003532	  0.004357	  0.004984	  0.005846	  0.006955	0.003818
-      unpacking(sec)	  0.001096	  0.001758	  0.002824	  0.003582	  0.004433	  0.005014	  0.006185	  0.007077	0.003996
+        packing(sec)	  0.002189	  0.002419	  0.002570	  0.002853	  0.002597	  0.002784	  0.003151	  0.003503	0.002758
+      unpacking(sec)	  0.001293	  0.001566	  0.001703	  0.001520	  0.002133	  0.002324	  0.002580	  0.002636	0.001969
       compress_ratio	  0.125007	  0.250007	  0.375007	  0.500007	  0.625007	  0.750007	  0.875007	  1.000007	
+     RunLengthPacker	       yes	       yes	       yes	       yes	       yes	       yes	       yes	       yes	
+        packing(sec)	  0.017412	  0.015328	  0.011652	  0.009045	  0.007689	  0.006672	  0.005816	  0.005564	0.009897
+      unpacking(sec)	  0.004915	  0.004933	  0.004729	  0.004639	  0.004572	  0.004503	  0.004378	  0.004447	0.004639
+      compress_ratio	  0.998038	  1.000019	  1.000020	  1.000020	  1.000020	  1.000020	  1.000020	  1.000020	
+bits_per_value=4 iterations=200
+               validate(sec)	      full	   sampled	       off
+             (1080, 1920, 1)	  0.000079	  0.000007	  0.000001
+              (1200, 800, 1)	  0.000022	  0.000004	  0.000001
+               (200, 200, 1)	  0.000003	  0.000004	  0.000001
+              saving vs full	 pack+unpack	   sampled	       off
+NoTampingPacker (1080, 1920)	    0.005330	      2.7%	      2.9%
+ NoTampingPacker (1200, 800)	    0.000426	      8.0%	      9.8%
+  NoTampingPacker (200, 200)	    0.000026	     -6.5%	     21.3%
+     CombPacker (1080, 1920)	    0.011081	      1.3%	      1.4%
+      CombPacker (1200, 800)	    0.003288	      1.0%	      1.3%
+       CombPacker (200, 200)	    0.000183	     -0.9%	      3.1%
+    ShiftPacker (1080, 1920)	    0.023791	      0.6%	      0.7%
+     ShiftPacker (1200, 800)	    0.006473	      0.5%	      0.6%
+      ShiftPacker (200, 200)	    0.000167	     -1.0%	      3.4%
+960000 (1200, 800, 1) iterations=100
+  ratio/pack+unpack(sec)	               0.0	             0.001	              0.01	               0.1
+         NoTampingPacker	   1.0000/0.000419	   1.0000/0.000400	   1.0000/0.000411	   1.0000/0.000394
+             ShiftPacker	   0.2500/0.001499	   0.2500/0.001565	   0.2500/0.001611	   0.2500/0.001569
+         RunLengthPacker	   0.0000/0.000428	   0.0092/0.001019	   0.0860/0.002254	   0.6137/0.022672
+a10.jpg (1079, 1917) colors=3 scale=80 frames=30
+         B/pack+compress(ms)	   NoTampingPacker	   RunLengthPacker
+    tile=32 text zstd_stream	         306/0.046	         314/0.146
+           tile=32 text zstd	         319/0.023	         327/0.130
+            tile=32 text lz4	         637/0.016	         646/0.112
+  tile=32 scroll zstd_stream	       12087/0.617	       23793/3.981
+         tile=32 scroll zstd	       30918/0.921	       29302/3.794
+          tile=32 scroll lz4	       61267/0.455	       55142/3.154
+    tile=32 drag zstd_stream	        3446/0.169	        4812/1.009
+           tile=32 drag zstd	        5876/0.209	        6201/1.019
+            tile=32 drag lz4	       12503/0.119	       13376/0.938
+     tile=0 text zstd_stream	         393/1.176	         293/0.819
+            tile=0 text zstd	         389/0.847	         321/0.988
+             tile=0 text lz4	        5984/0.593	         630/0.818
+   tile=0 scroll zstd_stream	       33879/2.112	       22799/3.900
+          tile=0 scroll zstd	       33495/1.675	       29330/3.901
+           tile=0 scroll lz4	       63334/0.981	       54691/3.784
+     tile=0 drag zstd_stream	        2966/1.196	        2362/1.512
+            tile=0 drag zstd	        6970/1.149	        6590/2.082
+             tile=0 drag lz4	       18345/0.808	       14487/1.618
 """
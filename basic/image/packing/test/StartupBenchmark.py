@@ -0,0 +1,84 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+ROOT = Path(__file__).parents[4]
+
+# Выполняется в отдельном процессе: скомпилированные ядра numba живут до конца процесса,
+# поэтому каждый запуск сервера измеряется с нуля
+STARTUP_SCRIPT = """
+import json, sys
+from time import time
+_launch_time = time()
+from pathlib import Path
+import numpy as np
+from basic.image.ToolsManager import ToolsManager
+from basic.image.packing.CombPacker import CombPacker
+timings = {"import": time() - _launch_time}
+
+_start_time = time()
+packer = CombPacker(3)
+if sys.argv[1] == "eager":  # Прежний прогрев: все ширины 1-8 и три размерности
+    for bits_per_value in range(1, 9):
+        packer.set_bits_per_value(bits_per_value)
+        for shape in ((1, 1, 1), (1, 1), (1,)):
+            packer.unpack_array(packer.pack_array(np.ones(shape, dtype=np.uint8)))
+    packer.set_bits_per_value(3)
+timings["packer"] = time() - _start_time
+
+_start_time = time()
+tools_manager = ToolsManager(1279, 719, 3, 60)
+timings["tools_manager"] = time() - _start_time
+
+path = Path("basic/image/data/ch1.jpg")
+_start_time = time()
+_, reference, _ = tools_manager.encode_image(path)
+tools_manager.update_reference(reference)
+timings["first_frame"] = time() - _start_time
+timings["launch_to_first_frame"] = time() - _launch_time
+
+_start_time = time()
+tools_manager.encode_image(path)
+timings["next_frame"] = time() - _start_time
+print(json.dumps(timings))
+"""
+
+
+class StartupBenchmark:
+    """Время от запуска процесса сервера до первого закодированного кадра: прогрев ядер numba и их кэш на диске"""
+    COLUMNS = ("import", "packer", "tools_manager", "first_frame", "launch_to_first_frame", "next_frame")
+
+    @staticmethod
+    def _run(warmup: str, cache_dir: str) -> Dict[str, float]:
+        env = dict(os.environ, PYTHONPATH=str(ROOT), NUMBA_CACHE_DIR=cache_dir)
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, warmup], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        return json.loads(output.splitlines()[-1])
+
+    def test(self, runs: int = 3):
+        print(f"runs={runs}, time in sec")
+        print("warmup/cache".rjust(16), *[column.rjust(22) for column in self.COLUMNS], sep="\t")
+        for warmup in ("lazy", "eager"):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                # Первый запуск компилирует ядра в пустой кэш, следующие загружают их с диска
+                for cache, count in (("cold", 1), ("disk", runs)):
+                    results = [self._run(warmup, cache_dir) for _ in range(count)]
+                    row = [sum(result[column] for result in results) / count for column in self.COLUMNS]
+                    print(f"{warmup}/{cache}".rjust(16), *[f"{value:.6f}".rjust(22) for value in row], sep="\t")
+
+
+if __name__ == "__main__":
+    StartupBenchmark().test(runs=5)
+
+"""
+runs=5, time in sec
+    warmup/cache	                import	                packer	         tools_manager	           first_frame	 launch_to_first_frame	            next_frame
+       lazy/cold	              0.552301	              3.167600	              0.001040	              3.336023	              7.056982	              0.015904
+       lazy/disk	              0.546013	              0.338304	              0.001165	              0.037995	              0.923500	              0.014340
+      eager/cold	              0.575815	              9.941741	              0.001310	              2.986913	             13.505807	              0.014357
+      eager/disk	              0.485298	              0.357722	              0.001094	              0.034569	              0.878703	              0.013279
+"""
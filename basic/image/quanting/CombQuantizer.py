@@ -1,11 +1,12 @@
-import bz2
+import hashlib
 import os
-import pickle
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 import numpy as np
+from numba import njit, prange
 
-from basic.image.packing.CombPacker import CombPacker
+from basic.image.packing.NumbaWarmRegistry import NumbaWarmRegistry
 from basic.image.packing.ShiftPacker import ShiftPacker
 from basic.image.quanting.ABC_Quantizer import Quantizer
 from basic.image.quanting.color_utils.generate_soft_palette import generate_soft_palette
@@ -13,122 +14,309 @@ from basic.image.quanting.color_utils.generate_soft_palette import generate_soft
 
 class CombQuantizer(Quantizer):
     CACHE_DIR_PATH = Path(__file__).parent / "cache_comb_lut"
-
-    def __init__(self, colors: int = 4):
+    # Разрядность куба цветов таблицы квантования по каналам (r, g, b):
+    # "full" - 2^24 записей (16 МБ, каждый пиксель - случайное обращение по всей таблице),
+    # "666" и "565" - 256 КБ и 64 КБ, таблица остаётся в L2; ячейка куба берёт цвет палитры, ближайший к её центру
+    LUT_MODES = {"full": (8, 8, 8), "666": (6, 6, 6), "565": (5, 6, 5)}
+    # "fixed" - мягкая палитра generate_soft_palette, "adaptive" - палитра подстраивается под экран (adapt_palette)
+    PALETTE_MODES = ("fixed", "adaptive")
+    BYTES_PER_PALETTE_SIZE = 1  # Сообщение палитры: COLORS - 1 | COLORS * (r, g, b)
+    KMEANS_ITERATIONS = 4
+    PALETTE_MIN_SHIFT = 4  # Цвета, сдвинувшиеся меньше (по каждому каналу), не меняются
+    INCREMENTAL_LUT_RATIO = 16
+    _CELL_CENTRES: Dict[Tuple[int, int, int], np.ndarray] = dict()
+
+    def __init__(self, colors: int = 4, lut_mode: str = "full", palette_mode: str = "fixed",
+                 adapt_period: int = 30, sample_size: int = 4096):
+        """
+        Args:
+            colors: Число цветов палитры (округляется вверх до степени двойки)
+            lut_mode: Разрядность таблицы квантования, см. LUT_MODES
+            palette_mode: Фиксированная или адаптивная палитра, см. PALETTE_MODES
+            adapt_period: Период пересчёта адаптивной палитры в кадрах
+            sample_size: Примерное число пикселей выборки кадра для пересчёта палитры
+        """
+        if lut_mode not in self.LUT_MODES:
+            raise ValueError(f"Unknown lut_mode {lut_mode!r}, expected one of {tuple(self.LUT_MODES)}")
+        if palette_mode not in self.PALETTE_MODES:
+            raise ValueError(f"Unknown palette_mode {palette_mode!r}, expected one of {self.PALETTE_MODES}")
+        if palette_mode == "adaptive" and lut_mode == "full":
+            # Полная таблица 16 МБ: пересчитывать её при каждой смене палитры слишком дорого
+            raise ValueError("Adaptive palette requires a reduced lut_mode ('666' or '565')")
+        self.lut_mode = lut_mode
+        self.lut_bits = self.LUT_MODES[lut_mode]
+        self.palette_mode = palette_mode
+        self.adapt_period = adapt_period
+        self.sample_size = sample_size
+        self._adapt_frames = 0
         os.makedirs(self.CACHE_DIR_PATH, exist_ok=True)
 
         self._palette_rbg = np.empty(1, dtype=np.int8)
-        self._palette_rbg_int32 = np.empty(1, dtype=np.int32)
         self._quant_palette_lut = np.empty(1, dtype=np.int8)
-        self._dequant_palette_lut = np.empty(1, dtype=np.int32)
+        self._dequant_palette_lut = np.empty((1, 3), dtype=np.uint8)
 
         super().__init__(2 ** (colors - 1).bit_length())
 
-        self.shifts = 8 * np.arange(3, dtype=np.uint32)[::-1]
-
         # print(list(self._palette_rbg))
-        # print(list(self._palette_rbg_int32))
         # print(sorted(set(self._quant_palette_lut)))
         # print(sorted(set(self._dequant_palette_lut)))
 
     def set_colors(self, colors: int):
         super().set_colors(colors)
+        self._adapt_frames = 0  # Новая палитра подстраивается уже на следующем кадре
         self._generate_palette()
         self._generate_luts()
 
     def _generate_palette(self):
         self._palette_rbg = np.array(sorted(generate_soft_palette(self.COLORS)), dtype=np.uint8)
 
-        array_flat = self._palette_rbg.flatten()
-        values_per_dtype = 3
-        dtype = np.uint32
-
-        aligned_length = ((array_flat.size + (values_per_dtype - 1)) // values_per_dtype) * values_per_dtype
-        if aligned_length > array_flat.size:
-            aligned_array = np.empty(aligned_length, dtype=dtype)
-            aligned_array[:array_flat.size] = array_flat
-            aligned_array[array_flat.size:] = 0
-        else:
-            aligned_array = array_flat.astype(dtype)
-
-        self._palette_rbg_int32 = (aligned_array[0::3] << 16) | (aligned_array[1::3] << 8) | aligned_array[2::3]
-
-    def _value_to_palette_quant(self, value: int) -> int:
-        r = ((value >> 16) & 0xFF)
-        g = ((value >> 8) & 0xFF)
-        b = (value & 0xFF)
-
-        value_rgb = np.array([r, g, b])
-
-        distances = np.sum((self._palette_rbg - value_rgb) ** 2, axis=1)
-        return int(np.argmin(distances))
-
-    def _quant_to_palette_value(self, quant: int) -> int:
-        return int(self._palette_rbg_int32[quant])
+    @staticmethod
+    def build_quant_lut(palette_rgb: np.ndarray, bits: Tuple[int, int, int] = (8, 8, 8)) -> np.ndarray:
+        """
+        Таблица ячеек куба цветов (r' << (gb + bb) | g' << bb | b', c' = c >> (8 - cb)) -> индекс ближайшего
+        цвета палитры к центру ячейки. При bits = (8, 8, 8) ячейка - один цвет из 2^24.
+
+        argmin |c - p|^2 = argmin (|p|^2 - 2 c·p). Вклад (g, b) для всех 65536 пар считается
+        один раз матричным умножением, затем для каждого r к нему добавляется вектор по палитре.
+        Все величины - целые меньше 2^24, поэтому в float32 они точны, и при равных расстояниях
+        выбирается первый цвет палитры, как при прямом переборе.
+        """
+        palette = palette_rgb.astype(np.float32)
+        # Центры ячеек по каналу; при полной разрядности - сами значения 0..255
+        r_channel, g_channel, b_channel = (
+            np.arange(1 << channel_bits, dtype=np.float32) * (1 << (8 - channel_bits)) + (1 << (8 - channel_bits)) // 2
+            for channel_bits in bits)
+        gb = np.stack(np.meshgrid(g_channel, b_channel, indexing="ij"), axis=-1).reshape(-1, 2)
+        gb_term = gb @ (-2 * palette[:, 1:].T) + np.sum(palette ** 2, axis=1)
+        r_term = -2 * r_channel[:, None] * palette[:, 0]
+
+        plane_size = gb.shape[0]
+        lut = np.empty(r_channel.size * plane_size, dtype=np.uint8)
+        scores = np.empty_like(gb_term)
+        for r in range(r_channel.size):
+            np.add(gb_term, r_term[r], out=scores)
+            lut[r * plane_size:(r + 1) * plane_size] = np.argmin(scores, axis=1)
+        return lut
 
     def _get_cache_filename(self) -> Path:
-        return self.CACHE_DIR_PATH / f"lut_{self.COLORS}.cl"
+        # Хэш палитры в имени: при изменении палитры старая таблица не подхватится
+        palette_hash = hashlib.sha1(self._palette_rbg.tobytes()).hexdigest()[:8]
+        return self.CACHE_DIR_PATH / f"lut_{self.COLORS}_{palette_hash}.npy"
 
     def _generate_luts(self):
-        cache_file = self._get_cache_filename()
-
-        if os.path.exists(cache_file):
-            with open(cache_file, 'rb') as f:
-                decompressed = bz2.decompress(f.read())
-                self._quant_palette_lut, self._dequant_palette_lut = pickle.loads(decompressed)
-        else:
-            print(f"Generating new LUTs for {self.COLORS} colors...")
-            indices = np.arange(16777216, dtype=np.uint32)
+        """
+        Полная таблица квантования хранится несжатым .npy и открывается через mmap: страницы таблицы
+        общие для всех процессов в страничном кэше ОС и читаются с диска по мере обращения.
+        Уменьшенные таблицы строятся в памяти за миллисекунды.
+        Таблица деквантования - цвета палитры (256 x 3, индексы за палитрой - последний цвет).
+        """
+        self._dequant_palette_lut = self._palette_rbg[np.minimum(np.arange(256), self.COLORS - 1)]
+        if self.lut_mode != "full":
+            self._quant_palette_lut = self.build_quant_lut(self._palette_rbg, self.lut_bits)
+            self.warm_njit()
+            return
 
-            quant_vectorized = np.vectorize(self._value_to_palette_quant)
-            dequant_vectorized = np.vectorize(self._quant_to_palette_value)
-
-            self._quant_palette_lut = quant_vectorized(indices).astype(np.uint8)
-            self._dequant_palette_lut = dequant_vectorized(np.minimum(indices, self.COLORS - 1)).astype(np.uint32)
+        cache_file = self._get_cache_filename()
 
-            with open(cache_file, 'wb') as f:
-                data = pickle.dumps((self._quant_palette_lut, self._dequant_palette_lut))
-                compressed = bz2.compress(data)
-                f.write(compressed)
-            print(f"LUTs saved to {cache_file}")
+        quant_lut = None
+        if cache_file.exists():
+            quant_lut = np.load(cache_file, mmap_mode='r')
+            if quant_lut.shape != (1 << 24,) or quant_lut.dtype != np.uint8:
+                quant_lut = None
+        if quant_lut is None:
+            print(f"Generating new LUT for {self.COLORS} colors...")
+            temporary_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(temporary_file, 'wb') as f:
+                np.save(f, self.build_quant_lut(self._palette_rbg))
+            os.replace(temporary_file, cache_file)  # Атомарно для процессов, строящих ту же таблицу
+            quant_lut = np.load(cache_file, mmap_mode='r')
+            print(f"LUT saved to {cache_file}")
+        self._quant_palette_lut = np.asarray(quant_lut)  # ndarray поверх mmap: numba не принимает np.memmap
+        self.warm_njit()
+
+    def warm_njit(self) -> float:
+        """
+        Прогревает ядра numba один раз на процесс. Таблица из mmap только для чтения, а построенная
+        в памяти - нет: это разные сигнатуры ядра, поэтому они прогреваются отдельно.
+        """
+        def warm_function():
+            pixel = np.zeros((1, 1, 3), dtype=np.uint8)
+            self.dequantize(self.quantize(pixel))
+
+        return NumbaWarmRegistry.warm(
+            (CombQuantizer.__name__, self._quant_palette_lut.flags.writeable), warm_function)
+
+    @staticmethod
+    @njit(parallel=True, cache=True)
+    def _quantize_numba(image: np.ndarray, quant_lut: np.ndarray, r_bits: int, g_bits: int, b_bits: int):
+        # Один проход по HxWxC (C >= 3, лишние каналы пропускаются): номер ячейки куба цветов
+        # собирается в регистре и сразу заменяется индексом палитры, промежуточных кадров нет
+        height, width = image.shape[0], image.shape[1]
+        result = np.empty((height, width), dtype=np.uint8)
+        r_shift, g_shift, b_shift = 8 - r_bits, 8 - g_bits, 8 - b_bits
+        for y in prange(height):
+            for x in range(width):
+                index = (((np.int64(image[y, x, 0]) >> r_shift) << (g_bits + b_bits))
+                         | ((np.int64(image[y, x, 1]) >> g_shift) << b_bits)
+                         | (np.int64(image[y, x, 2]) >> b_shift))
+                result[y, x] = quant_lut[index]
+        return result
+
+    @staticmethod
+    @njit(parallel=True, cache=True)
+    def _dequantize_numba(quantized_image: np.ndarray, dequant_lut: np.ndarray):
+        height, width = quantized_image.shape[0], quantized_image.shape[1]
+        result = np.empty((height, width, 3), dtype=np.uint8)
+        for y in prange(height):
+            for x in range(width):
+                palette_index = quantized_image[y, x]
+                result[y, x, 0] = dequant_lut[palette_index, 0]
+                result[y, x, 1] = dequant_lut[palette_index, 1]
+                result[y, x, 2] = dequant_lut[palette_index, 2]
+        return result
+
+    @classmethod
+    def _cell_centres(cls, bits: Tuple[int, int, int]) -> np.ndarray:
+        """Центры всех ячеек куба цветов в порядке номеров ячеек, (cells, 3) float32 (вычисляются один раз)."""
+        centres = cls._CELL_CENTRES.get(bits)
+        if centres is None:
+            cells = np.arange(1 << sum(bits))
+            r_bits, g_bits, b_bits = bits
+            channels = (cells >> (g_bits + b_bits), (cells >> b_bits) & ((1 << g_bits) - 1), cells & ((1 << b_bits) - 1))
+            centres = cls._CELL_CENTRES[bits] = np.stack(
+                [channel * (1 << (8 - channel_bits)) + (1 << (8 - channel_bits)) // 2
+                 for channel, channel_bits in zip(channels, bits)], axis=1).astype(np.float32)
+        return centres
+
+    @staticmethod
+    def _scores(centres: np.ndarray, palette: np.ndarray) -> np.ndarray:
+        """|p|^2 - 2 c·p для каждого центра и цвета палитры: целые меньше 2^24, в float32 точны."""
+        palette = palette.astype(np.float32)
+        return centres @ (-2 * palette.T) + np.sum(palette ** 2, axis=1)
+
+    @classmethod
+    def update_quant_lut(cls, quant_lut: np.ndarray, old_palette: np.ndarray, new_palette: np.ndarray,
+                         bits: Tuple[int, int, int]) -> int:
+        """
+        Обновляет таблицу квантования на месте после смены части цветов палитры.
+        Возвращает число изменившихся цветов.
+
+        Ответ ячейки меняется, только если её прежний цвет изменился (такие ячейки считаются заново
+        по всей палитре) или изменившийся цвет стал ближе прежнего (остальные ячейки сравниваются
+        только с изменившимися цветами). Неизменные цвета, кроме прежнего, проиграли ему и раньше,
+        поэтому результат совпадает с build_quant_lut, включая выбор первого цвета при равенстве.
+        Сравнение всех ячеек с изменившимися цветами окупается, только если их меньше 1/INCREMENTAL_LUT_RATIO
+        палитры (на малых палитрах построение заново - 2-3 мс для "565"), иначе таблица строится заново.
+        """
+        changed = np.flatnonzero(np.any(old_palette != new_palette, axis=1))
+        if changed.size * cls.INCREMENTAL_LUT_RATIO > len(new_palette):
+            quant_lut[:] = cls.build_quant_lut(new_palette, bits)
+            return changed.size
+        if not changed.size:
+            return 0
+        is_changed = np.zeros(len(new_palette), dtype=np.bool_)
+        is_changed[changed] = True
+        centres = cls._cell_centres(bits)
+
+        lost_cells = np.flatnonzero(is_changed[quant_lut])
+        quant_lut[lost_cells] = np.argmin(cls._scores(centres[lost_cells], new_palette), axis=1)
+
+        kept = quant_lut.astype(np.intp)
+        palette = new_palette.astype(np.float32)
+        kept_scores = np.sum(palette ** 2, axis=1)[kept] - 2 * np.einsum("ij,ij->i", centres, palette[kept])
+        changed_scores = cls._scores(centres, new_palette[changed])
+        best = np.argmin(changed_scores, axis=1)
+        candidates = changed[best]
+        candidate_scores = changed_scores[np.arange(best.size), best]
+        # Ячейки с изменившимся прежним цветом уже посчитаны по всей палитре и здесь не меняются
+        better = (candidate_scores < kept_scores) | ((candidate_scores == kept_scores) & (candidates < kept))
+        quant_lut[better] = candidates[better]
+        return changed.size
+
+    def _sample(self, image: np.ndarray) -> np.ndarray:
+        """Около sample_size пикселей кадра по равномерной сетке, (n, 3) float32."""
+        step = max(1, int(np.sqrt(image.shape[0] * image.shape[1] / self.sample_size)))
+        return image[::step, ::step, :3].reshape(-1, 3).astype(np.float32)
+
+    def _fit_palette(self, sample: np.ndarray) -> np.ndarray:
+        """
+        Несколько итераций k-means по выборке, начиная с текущей палитры: номера цветов сохраняются
+        от пересчёта к пересчёту, и палитра от кадра к кадру плавно следует за содержимым экрана.
+        Цвета без пикселей в выборке и сдвинувшиеся меньше PALETTE_MIN_SHIFT остаются прежними.
+        """
+        palette = self._palette_rbg.astype(np.float32)
+        for _ in range(self.KMEANS_ITERATIONS):
+            scores = np.sum(palette ** 2, axis=1) - 2 * sample @ palette.T
+            labels = np.argmin(scores, axis=1)
+            counts = np.bincount(labels, minlength=self.COLORS)
+            used = counts > 0
+            for channel in range(3):
+                sums = np.bincount(labels, weights=sample[:, channel], minlength=self.COLORS)
+                palette[used, channel] = sums[used] / counts[used]
+        new_palette = np.clip(np.rint(palette), 0, 255).astype(np.uint8)
+        shift = np.abs(new_palette.astype(np.int16) - self._palette_rbg.astype(np.int16))
+        still = np.all(shift < self.PALETTE_MIN_SHIFT, axis=1)
+        new_palette[still] = self._palette_rbg[still]
+        return new_palette
+
+    def set_palette(self, palette_rgb: np.ndarray, update_quant_lut: bool = True) -> None:
+        """
+        Устанавливает палитру из COLORS цветов. Таблица квантования обновляется инкрементально;
+        приёмнику она не нужна (update_quant_lut=False), ему достаточно таблицы деквантования.
+        """
+        palette_rgb = np.asarray(palette_rgb, dtype=np.uint8)
+        if palette_rgb.shape != (self.COLORS, 3):
+            raise ValueError(f"{self.name}: Palette shape {palette_rgb.shape} != {(self.COLORS, 3)}")
+        if update_quant_lut:
+            if self.lut_mode == "full":
+                raise ValueError(f"{self.name}: Palette can not be changed with the full LUT")
+            self.update_quant_lut(self._quant_palette_lut, self._palette_rbg, palette_rgb, self.lut_bits)
+        self._palette_rbg = palette_rgb.copy()
+        self._dequant_palette_lut = self._palette_rbg[np.minimum(np.arange(256), self.COLORS - 1)]
+
+    def pack_palette(self) -> bytes:
+        return (self.COLORS - 1).to_bytes(self.BYTES_PER_PALETTE_SIZE, 'big') + self._palette_rbg.tobytes()
+
+    def unpack_palette(self, data: bytes) -> None:
+        """Принимает сообщение pack_palette на стороне приёмника (меняется только деквантование)."""
+        colors = int.from_bytes(data[:self.BYTES_PER_PALETTE_SIZE], 'big') + 1
+        if colors != self.COLORS or len(data) != self.BYTES_PER_PALETTE_SIZE + 3 * colors:
+            raise ValueError(f"{self.name}: Palette message of {len(data)} B does not match {self.COLORS} colors")
+        palette = np.frombuffer(data, dtype=np.uint8, offset=self.BYTES_PER_PALETTE_SIZE).reshape(colors, 3)
+        self.set_palette(palette, update_quant_lut=False)
+
+    def adapt_palette(self, image: np.ndarray) -> Optional[bytes]:
+        """
+        Вызывается для каждого кадра перед quantize. Раз в adapt_period кадров пересчитывает палитру
+        по выборке кадра; если палитра изменилась, возвращает сообщение pack_palette для передачи
+        вместе с кадром, иначе None. Остальные кадры ничего не стоят.
+        """
+        if self.palette_mode != "adaptive":
+            return None
+        frame = self._adapt_frames
+        self._adapt_frames += 1
+        if frame % self.adapt_period:
+            return None
+        new_palette = self._fit_palette(self._sample(image))
+        if np.array_equal(new_palette, self._palette_rbg):
+            return None
+        self.set_palette(new_palette)
+        return self.pack_palette()
 
     def quantize(self, image: np.ndarray) -> np.ndarray:
         if len(image.shape) != 3:
             raise ValueError(f"quantize: len(image.shape) = {len(image.shape)} != 3")
-        if image.shape[2] != 3:
-            if image.shape[2] == 4:
-                image = image[:, :, :3]
-            else:
-                raise ValueError(f"quantize: image.shape[2] = {image.shape[2]} not in [3, 4]")
-        image_shape = image.shape
-
-        # rgb                --shift-->  rbg_int32   --lut---->     palette_index
+        if image.shape[2] not in (3, 4):
+            raise ValueError(f"quantize: image.shape[2] = {image.shape[2]} not in [3, 4]")
 
-        tamped_array = CombPacker._tamp_array_by_shift(
-            image.flatten(), np.uint32, 3, self.shifts)
+        # rgb(a)             --numba: color_index --lut-->  palette_index
 
-        duantized_image_rgb_int32 = self._quant_palette_lut[tamped_array]
-
-        return duantized_image_rgb_int32.reshape((image_shape[0], image_shape[1]))
+        return self._quantize_numba(image, self._quant_palette_lut, *self.lut_bits)
 
     def dequantize(self, quantized_image: np.ndarray) -> np.ndarray:
-        # palette_index      --lut---->  rbg_int32   --shift-->     rgb
-
-        tamped_image = self._dequant_palette_lut[quantized_image].flatten()
-
-        rgb_image_flatten = np.zeros(tamped_image.size * 3, dtype=np.uint8)
-        rgb_image_flatten[0::3] = (tamped_image >> 16) & 0b11111111
-        rgb_image_flatten[1::3] = (tamped_image >> 8) & 0b11111111
-        rgb_image_flatten[2::3] = tamped_image & 0b11111111
-
-        # иногда долго работает в test.py
-        # rgb_image_flatten = CombPacker._untamp_array_by_shift(
-        #     tamped_image, 0b11111111, 3, self.shifts)[:tamped_image.size * 3]
-
-        rgb_image = rgb_image_flatten.reshape((quantized_image.shape[0], quantized_image.shape[1], 3))
-
-        return rgb_image
+        # palette_index      --numba: lut-->  rgb
 
+        return self._dequantize_numba(quantized_image, self._dequant_palette_lut)
 
 if __name__ == "__main__":
     quantizer = CombQuantizer(2 ** 4)
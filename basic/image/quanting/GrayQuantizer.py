@@ -5,12 +5,65 @@ from basic.image.quanting.ABC_Quantizer import Quantizer
 
 
 class GrayQuantizer(Quantizer):
-    def __init__(self, *args, **kwargs):
+    """
+    Квантование оттенков серого через cv2.LUT.
+
+    В режиме dither="bayer" перед таблицей к кадру одним насыщающим cv2.add прибавляется порог
+    упорядоченного дизеринга: матрица Байера bayer_size x bayer_size, замощённая на весь кадр
+    от его левого верхнего угла. Порог в ячейке лежит в [0, шаг уровней), таблица дизеринга - floor по
+    уровням деквантования, поэтому средняя яркость участка сохраняется, а чистые чёрный и белый
+    (фон текста) остаются без узора. Узор привязан к координатам кадра и одинаков во всех кадрах:
+    неизменившиеся пиксели квантуются так же, как в прошлом кадре, и не попадают в разность.
+    Деквантование не меняется, приёмнику режим знать не нужно.
+    """
+    DITHER_MODES = ("none", "bayer")
+
+    def __init__(self, *args, dither: str = "none", bayer_size: int = 4, **kwargs):
+        if dither not in self.DITHER_MODES:
+            raise ValueError(f"Unknown dither {dither!r}, expected one of {self.DITHER_MODES}")
+        if bayer_size < 2 or bayer_size & (bayer_size - 1):
+            raise ValueError(f"Bayer matrix size must be a power of two >= 2, got {bayer_size}")
+        self.dither = dither
+        self.bayer_size = bayer_size
+        self._dither_lut = None
+        self._dither_cell = None
+        self._threshold_maps = dict()  # форма кадра -> замощённый порог
         super().__init__(*args, **kwargs)
 
+    @staticmethod
+    def bayer_matrix(size: int) -> np.ndarray:
+        """Матрица Байера size x size со значениями 0..size^2 - 1: M(2n) = [[4M, 4M + 2], [4M + 3, 4M + 1]]."""
+        matrix = np.zeros((1, 1), dtype=np.int64)
+        while matrix.shape[0] < size:
+            matrix = np.block([[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]])
+        return matrix
+
+    def set_colors(self, colors: int):
+        super().set_colors(colors)
+        # Уровни деквантования идут с шагом step = 255 / (COLORS - 1): v + t даёт уровень floor((v + t) / step)
+        step = 255 / (self.COLORS - 1)
+        self._dither_lut = (np.arange(256) * (self.COLORS - 1) // 255).astype(np.uint8)
+        thresholds = (self.bayer_matrix(self.bayer_size) + 0.5) * step / self.bayer_size ** 2
+        self._dither_cell = np.floor(thresholds).astype(np.uint8)
+        self._threshold_maps.clear()
+
+    def _get_threshold_map(self, shape) -> np.ndarray:
+        threshold_map = self._threshold_maps.get(shape)
+        if threshold_map is None:
+            repeats = (-(-shape[0] // self.bayer_size), -(-shape[1] // self.bayer_size))
+            threshold_map = np.ascontiguousarray(np.tile(self._dither_cell, repeats)[:shape[0], :shape[1]])
+            self._threshold_maps[shape] = threshold_map
+        return threshold_map
+
     def quantize(self, image: np.ndarray) -> np.ndarray:
         # image = cv2.blur(image, (2, 2))
-        return cv2.LUT(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY), self._quant_lut)
+        return self.quantize_gray(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY))
+
+    def quantize_gray(self, gray_image: np.ndarray) -> np.ndarray:
+        """Квантование уже переведённого в оттенки серого кадра (путь захвата BGRA -> GRAY)"""
+        if self.dither == "bayer":
+            return cv2.LUT(cv2.add(gray_image, self._get_threshold_map(gray_image.shape)), self._dither_lut)
+        return cv2.LUT(gray_image, self._quant_lut)
 
     def dequantize(self, quantized_image: np.ndarray) -> np.ndarray:
         return cv2.cvtColor(cv2.LUT(quantized_image, self._dequant_lut), cv2.COLOR_GRAY2RGB)
@@ -77,6 +77,198 @@ class QuantizerBenchmark:
                 print(f"{compress_ratio:.6f}".rjust(10), end="\t")
             print(f"{float(np.mean(compress_ratios)):.6f}")
 
+    @staticmethod
+    def _get_psnr(quantizer: Quantizer, img_array: np.array) -> float:
+        """PSNR восстановленного изображения относительно исходного в дБ"""
+        restored = quantizer.dequantize(quantizer.quantize(img_array))
+        mse = np.mean((restored.astype(np.float64) - img_array[:, :, :3].astype(np.float64)) ** 2)
+        return float("inf") if mse == 0 else float(10 * np.log10(255 ** 2 / mse))
+
+    def test_comb_lut_modes(self, path: Path, colors_list=(4, 16, 64, 256), iterations: int = 20):
+        """Полная таблица 2^24 против уменьшенных кубов цветов CombQuantizer: скорость и качество (PSNR)"""
+        from basic.image.quanting.CombQuantizer import CombQuantizer
+
+        img_array = np.array(Image.open(path), dtype=np.uint8)
+        print(path.name, img_array.shape, img_array.size, f"iterations={iterations}")
+        print("colors/lut_mode".rjust(20), "lut(KB)".rjust(10), "quant(sec)".rjust(10), "dequant(sec)".rjust(12),
+              "psnr(dB)".rjust(10), "same_as_full".rjust(12), sep="\t")
+        for colors in colors_list:
+            full_quantized = None
+            for lut_mode in CombQuantizer.LUT_MODES:
+                quantizer = CombQuantizer(colors, lut_mode=lut_mode)
+                quantized = quantizer.quantize(img_array)
+                if full_quantized is None:
+                    full_quantized = quantized
+                print(f"{colors}/{lut_mode}".rjust(20),
+                      f"{quantizer._quant_palette_lut.nbytes // 1024}".rjust(10),
+                      f"{self._test_quantize(quantizer, img_array, iterations):.6f}".rjust(10),
+                      f"{self._test_dequantize(quantizer, img_array, iterations):.6f}".rjust(12),
+                      f"{self._get_psnr(quantizer, img_array):.2f}".rjust(10),
+                      f"{np.mean(quantized == full_quantized):.4f}".rjust(12), sep="\t")
+
+    @staticmethod
+    def _comb_numpy_quantize(quantizer, image: np.ndarray) -> np.ndarray:
+        """Прежний путь CombQuantizer (полная таблица): плоская копия, упаковка каналов в uint32, выборка из таблицы"""
+        from basic.image.packing.CombPacker import CombPacker
+
+        shifts = 8 * np.arange(3, dtype=np.uint32)[::-1]
+        tamped_array = CombPacker._tamp_array_by_shift(image[:, :, :3].flatten(), np.uint32, 3, shifts)
+        return quantizer._quant_palette_lut[tamped_array].reshape(image.shape[:2])
+
+    @staticmethod
+    def _comb_numpy_dequantize(quantizer, quantized_image: np.ndarray) -> np.ndarray:
+        """Прежний путь CombQuantizer: выборка цветов палитры и три записи каналов с шагом 3"""
+        palette = quantizer._dequant_palette_lut.astype(np.uint32)
+        tamped_image = ((palette[:, 0] << 16) | (palette[:, 1] << 8) | palette[:, 2])[quantized_image].flatten()
+        rgb_image_flatten = np.zeros(tamped_image.size * 3, dtype=np.uint8)
+        rgb_image_flatten[0::3] = (tamped_image >> 16) & 0b11111111
+        rgb_image_flatten[1::3] = (tamped_image >> 8) & 0b11111111
+        rgb_image_flatten[2::3] = tamped_image & 0b11111111
+        return rgb_image_flatten.reshape((quantized_image.shape[0], quantized_image.shape[1], 3))
+
+    @staticmethod
+    def _mean_time(function, iterations: int) -> float:
+        times = []
+        for _ in range(iterations):
+            start_time = time()
+            function()
+            times.append(time() - start_time)
+        return float(np.mean(times))
+
+    def test_comb_fused(self, path: Path, colors_list=(4, 16, 256), iterations: int = 20):
+        """Ядра numba CombQuantizer (один проход по кадру) против прежнего пути numpy с промежуточными кадрами"""
+        from basic.image.quanting.CombQuantizer import CombQuantizer
+
+        img_array = np.array(Image.open(path), dtype=np.uint8)
+        print(path.name, img_array.shape, img_array.size, f"iterations={iterations}")
+        print("colors/input".rjust(20), "quant_numpy".rjust(12), "quant_numba".rjust(12), "dequant_numpy".rjust(14),
+              "dequant_numba".rjust(14), "same".rjust(6), sep="\t")
+        for colors in colors_list:
+            quantizer = CombQuantizer(colors)
+            for name, image in (("rgb", img_array), ("rgba", np.dstack((img_array, img_array[:, :, :1])))):
+                quantized = quantizer.quantize(image)
+                same = (np.array_equal(quantized, self._comb_numpy_quantize(quantizer, image)) and
+                        np.array_equal(quantizer.dequantize(quantized),
+                                       self._comb_numpy_dequantize(quantizer, quantized)))
+                print(f"{colors}/{name}".rjust(20),
+                      f"{self._mean_time(lambda: self._comb_numpy_quantize(quantizer, image), iterations):.6f}".rjust(12),
+                      f"{self._mean_time(lambda: quantizer.quantize(image), iterations):.6f}".rjust(12),
+                      f"{self._mean_time(lambda: self._comb_numpy_dequantize(quantizer, quantized), iterations):.6f}"
+                      .rjust(14),
+                      f"{self._mean_time(lambda: quantizer.dequantize(quantized), iterations):.6f}".rjust(14),
+                      str(same).rjust(6), sep="\t")
+
+    def test_comb_adaptive_palette(self, paths: List[Path], colors_list=(4, 8, 16), frames_per_image: int = 10,
+                                   adapt_period: int = 5, lut_mode: str = "565"):
+        """
+        Адаптивная палитра CombQuantizer против фиксированной на потоке кадров (каждое изображение
+        показывается frames_per_image кадров подряд): качество, сообщения палитры и время пересчёта.
+        """
+        from basic.image.quanting.CombQuantizer import CombQuantizer
+
+        images = [np.array(Image.open(path), dtype=np.uint8)[:, :, :3] for path in paths]
+        print([path.name for path in paths], f"frames_per_image={frames_per_image}, adapt_period={adapt_period}, "
+                                             f"lut_mode={lut_mode}")
+        print("colors".rjust(20), "fixed_psnr(dB)".rjust(14), "adapt_psnr(dB)".rjust(14), "messages".rjust(8),
+              "palette(B)".rjust(10), "adapt_avg(sec)".rjust(14), "adapt_max(sec)".rjust(14), sep="\t")
+        for colors in colors_list:
+            fixed = CombQuantizer(colors, lut_mode=lut_mode)
+            sender = CombQuantizer(colors, lut_mode=lut_mode, palette_mode="adaptive", adapt_period=adapt_period)
+            receiver = CombQuantizer(colors, lut_mode=lut_mode, palette_mode="adaptive")
+            fixed_psnrs, adapt_psnrs, adapt_times, palette_sizes = [], [], [], []
+            for img_array in images:
+                fixed_psnr = self._get_psnr(fixed, img_array)
+                for _ in range(frames_per_image):
+                    start_time = time()
+                    message = sender.adapt_palette(img_array)
+                    adapt_times.append(time() - start_time)
+                    if message is not None:
+                        receiver.unpack_palette(message)
+                        palette_sizes.append(len(message))
+                    restored = receiver.dequantize(sender.quantize(img_array))
+                    mse = np.mean((restored.astype(np.float64) - img_array.astype(np.float64)) ** 2)
+                    adapt_psnrs.append(float(10 * np.log10(255 ** 2 / mse)))
+                    fixed_psnrs.append(fixed_psnr)
+            print(str(colors).rjust(20), f"{np.mean(fixed_psnrs):.2f}".rjust(14), f"{np.mean(adapt_psnrs):.2f}".rjust(14),
+                  str(len(palette_sizes)).rjust(8), str(sum(palette_sizes)).rjust(10),
+                  f"{np.mean(adapt_times):.6f}".rjust(14), f"{np.max(adapt_times):.6f}".rjust(14), sep="\t")
+
+    @staticmethod
+    def test_comb_lut_update(colors_list=(16, 64, 256), changed_list=(1, 4, 16), lut_mode: str = "565"):
+        """Инкрементальное обновление таблицы CombQuantizer при смене части палитры против построения заново"""
+        from basic.image.quanting.CombQuantizer import CombQuantizer
+
+        rng = np.random.default_rng(0)
+        print(f"lut_mode={lut_mode}".rjust(20), "changed".rjust(8), "update(sec)".rjust(12), "build(sec)".rjust(12),
+              sep="\t")
+        for colors in colors_list:
+            quantizer = CombQuantizer(colors, lut_mode=lut_mode)
+            for changed in changed_list:
+                new_palette = quantizer._palette_rbg.copy()
+                new_palette[rng.choice(colors, changed, replace=False)] = rng.integers(0, 256, (changed, 3))
+                quant_lut = quantizer._quant_palette_lut.copy()
+                start_time = time()
+                quantizer.update_quant_lut(quant_lut, quantizer._palette_rbg, new_palette, quantizer.lut_bits)
+                update_time = time() - start_time
+                start_time = time()
+                assert np.array_equal(quant_lut, quantizer.build_quant_lut(new_palette, quantizer.lut_bits))
+                build_time = time() - start_time
+                print(str(colors).rjust(20), str(changed).rjust(8), f"{update_time:.6f}".rjust(12),
+                      f"{build_time:.6f}".rjust(12), sep="\t")
+
+    def test_gray_dither(self, path: Path, stream_paths: List[Path], colors_list=(2, 3, 4), bayer_sizes=(4, 8),
+                         iterations: int = 20):
+        """
+        Упорядоченный дизеринг GrayQuantizer: качество (PSNR и PSNR после размытия 5x5 - грубая модель
+        восприятия глазом), время квантования и сжатый размер потока ToolsManager: первый (опорный)
+        кадр, повтор того же кадра и кадры с изменениями.
+        """
+        import cv2
+        from basic.image.ToolsManager import ToolsManager
+        from basic.image.quanting.GrayQuantizer import GrayQuantizer
+
+        gray = cv2.cvtColor(np.array(Image.open(path), dtype=np.uint8)[:, :, :3], cv2.COLOR_RGB2GRAY)
+        width, height = Image.open(stream_paths[0]).size
+        print(path.name, gray.shape, f"iterations={iterations};", "stream:", [p.name for p in stream_paths])
+        print("colors/dither".rjust(20), "quant(sec)".rjust(10), "psnr(dB)".rjust(10), "blur_psnr(dB)".rjust(14),
+              "first(B)".rjust(10), "repeat(B)".rjust(10), "changes(B)".rjust(10), sep="\t")
+        for colors in colors_list:
+            for dither, bayer_size in [("none", 4)] + [("bayer", size) for size in bayer_sizes]:
+                quantizer = GrayQuantizer(colors, dither=dither, bayer_size=bayer_size)
+                quantize_time = self._mean_time(lambda: quantizer.quantize_gray(gray), iterations)
+                restored = cv2.LUT(quantizer.quantize_gray(gray), quantizer._dequant_lut)
+                psnr, blur_psnr = (
+                    float(10 * np.log10(255 ** 2 / np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)))
+                    for a, b in ((restored, gray), (cv2.blur(restored, (5, 5)), cv2.blur(gray, (5, 5)))))
+
+                tools_manager = ToolsManager(width, height, colors, 100, dither=dither)
+                tools_manager._quantizer = quantizer
+                sizes = []
+                for stream_path in [stream_paths[0]] + list(stream_paths):  # второй кадр - повтор первого
+                    encode_stats, reference, _ = tools_manager.encode_image(stream_path)
+                    tools_manager.update_reference(reference)
+                    sizes.append(encode_stats["encoded_size"])
+                name = dither if dither == "none" else f"{dither}{bayer_size}"
+                print(f"{colors}/{name}".rjust(20), f"{quantize_time:.6f}".rjust(10), f"{psnr:.2f}".rjust(10),
+                      f"{blur_psnr:.2f}".rjust(14), str(sizes[0]).rjust(10), str(sizes[1]).rjust(10),
+                      str(sum(sizes[2:])).rjust(10), sep="\t")
+
+    @staticmethod
+    def test_comb_lut(colors_list=(2, 4, 8, 16, 32, 64, 128, 256)):
+        """Построение таблицы CombQuantizer (2^24 цветов) и открытие её из .npy-кэша через mmap"""
+        from basic.image.quanting.CombQuantizer import CombQuantizer
+
+        print("CombQuantizer LUT".rjust(20), "build(sec)".rjust(12), "load(sec)".rjust(12), sep="\t")
+        for colors in colors_list:
+            quantizer = CombQuantizer(colors)  # Создаёт кэш, если его ещё нет
+            start_time = time()
+            quantizer.build_quant_lut(quantizer._palette_rbg)
+            build_time = time() - start_time
+            start_time = time()
+            quantizer.set_colors(colors)
+            load_time = time() - start_time
+            print(str(colors).rjust(20), f"{build_time:.6f}".rjust(12), f"{load_time:.6f}".rjust(12), sep="\t")
+
 
 if __name__ == "__main__":
     from basic.image.quanting.GrayQuantizer import GrayQuantizer
@@ -87,6 +279,13 @@ if __name__ == "__main__":
     tester = QuantizerBenchmark()
     tester.test([CombQuantizer(), GrayQuantizer(4), RGBQuantizer(4)], img_path, 100)
     tester.test([CombQuantizer(), GrayQuantizer(4), RGBQuantizer(4)], img_path, 100)
+    tester.test_comb_lut()
+    tester.test_comb_lut_modes(Path(__file__).parent.parent.parent / "data" / "a10.jpg")
+    tester.test_comb_fused(img_path)
+    data_path = img_path.parent
+    tester.test_comb_adaptive_palette([data_path / name for name in ("a10.jpg", "ch1.jpg", "a3.jpg", "ch2.jpg")])
+    tester.test_comb_lut_update()
+    tester.test_gray_dither(data_path / "a10.jpg", [data_path / name for name in ("ch1.jpg", "ch2.jpg", "ch3.jpg")])
 
 
 """
@@ -111,4 +310,66 @@ a6.jpg (480, 640, 3) 921600 iterations=100
           quant(sec)	  0.013841	  0.007833	  0.007839	  0.007748	  0.007805	  0.007707	  0.007911	  0.007976	0.008583
         dequant(sec)	  0.005550	  0.005807	  0.005321	  0.005747	  0.005345	  0.005836	  0.005381	  0.005810	0.005600
       compress_ratio	  0.041667	  0.083333	  0.125000	  0.166667	  0.208333	  0.250000	  0.291667	  0.333333	0.187500
+
+   CombQuantizer LUT	  build(sec)	   load(sec)
+                   2	    0.330198	    0.001140
+                   4	    0.382255	    0.001136
+                   8	    0.538778	    0.001147
+                  16	    0.891822	    0.001497
+                  32	    2.024504	    0.001543
+                  64	    2.198942	    0.001280
+                 128	    5.918469	    0.002015
+                 256	   10.855465	    0.003531
+
+a10.jpg (1079, 1917, 3) 6205329 iterations=20
+     colors/lut_mode	   lut(KB)	quant(sec)	dequant(sec)	  psnr(dB)	same_as_full
+              4/full	     16384	  0.010314	    0.003551	     12.20	      1.0000
+               4/666	       256	  0.007015	    0.003542	     12.19	      0.9941
+               4/565	        64	  0.007098	    0.003490	     12.19	      0.9907
+             16/full	     16384	  0.010171	    0.003315	     18.57	      1.0000
+              16/666	       256	  0.007114	    0.003386	     18.57	      0.9953
+              16/565	        64	  0.007035	    0.003249	     18.49	      0.9469
+             64/full	     16384	  0.010553	    0.003315	     19.96	      1.0000
+              64/666	       256	  0.007213	    0.003289	     19.96	      0.9604
+              64/565	        64	  0.007156	    0.003428	     19.96	      0.9571
+            256/full	     16384	  0.010320	    0.003326	     19.99	      1.0000
+             256/666	       256	  0.007197	    0.003230	     19.99	      0.9599
+             256/565	        64	  0.006979	    0.003466	     19.99	      0.9566
+
+a10.jpg (1079, 1917, 3) 6205329 iterations=20
+        colors/input	 quant_numpy	 quant_numba	 dequant_numpy	 dequant_numba	  same
+               4/rgb	    0.021697	    0.008731	      0.023406	      0.002445	  True
+              4/rgba	    0.043044	    0.007013	      0.023074	      0.003039	  True
+              16/rgb	    0.021580	    0.008996	      0.023879	      0.002899	  True
+             16/rgba	    0.040390	    0.007981	      0.023921	      0.004505	  True
+             256/rgb	    0.019929	    0.008926	      0.024410	      0.002815	  True
+            256/rgba	    0.035703	    0.008753	      0.023704	      0.002997	  True
+
+['a10.jpg', 'ch1.jpg', 'a3.jpg', 'ch2.jpg'] frames_per_image=10, adapt_period=5, lut_mode=565
+              colors	fixed_psnr(dB)	adapt_psnr(dB)	messages	palette(B)	adapt_avg(sec)	adapt_max(sec)
+                   4	         11.38	         23.38	       8	       104	      0.000882	      0.004725
+                   8	         14.68	         25.39	       8	       200	      0.000998	      0.005142
+                  16	         18.71	         28.97	       8	       392	      0.001498	      0.011954
+        lut_mode=565	 changed	 update(sec)	  build(sec)
+                  16	       1	    0.006029	    0.004206
+                  16	       4	    0.003973	    0.003885
+                  16	      16	    0.004191	    0.003908
+                  64	       1	    0.005231	    0.007182
+                  64	       4	    0.007466	    0.007347
+                  64	      16	    0.007279	    0.007288
+                 256	       1	    0.005962	    0.028986
+                 256	       4	    0.008697	    0.023860
+                 256	      16	    0.014408	    0.024968
+
+a10.jpg (1079, 1917) iterations=20; stream: ['ch1.jpg', 'ch2.jpg', 'ch3.jpg']
+       colors/dither	quant(sec)	  psnr(dB)	 blur_psnr(dB)	  first(B)	 repeat(B)	changes(B)
+              2/none	  0.001794	     12.67	         13.19	     17628	        17	      6450
+            2/bayer4	  0.002305	      8.06	         25.16	     45420	        17	     11887
+            2/bayer8	  0.002355	      8.25	         25.70	     52267	        17	     13456
+              3/none	  0.001699	     14.42	         14.80	     26750	        17	      8602
+            3/bayer4	  0.002223	     13.24	         31.07	     59971	        17	     16461
+            3/bayer8	  0.002168	     13.22	         31.23	     66642	        17	     18611
+              4/none	  0.001747	     18.83	         19.41	     36163	        17	     11930
+            4/bayer4	  0.002225	     17.14	         34.82	     72827	        17	     20409
+            4/bayer8	  0.002237	     17.18	         34.90	     79962	        17	     22545
 """
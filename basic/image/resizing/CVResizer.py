@@ -22,3 +22,14 @@ class CVResizer(ImageResizer):
 
     def _basic_resize(self, image: np.array, target_size: tuple[int, int]) -> np.array:
         return cv2.resize(image, target_size, interpolation=CVResizer._CV_INTERPOLATION_MAP[self.method])
+
+    def resize_into(self, image: np.array, dst: np.array) -> np.array:
+        """Изменить размер изображения до целевого размера с записью в предвыделенный dst"""
+        if self.scale + 0.01 > 1:
+            return image
+        image_size = (image.shape[1], image.shape[0])
+        if self.original_size is not None and image_size != self.original_size:
+            raise ValueError(f"Image size {image.size} doesn't match expected original size {self.original_size}")
+        target_size = self.target_size if self.original_size is not None \
+            else self.calculate_target_size(image_size, self.scale)
+        return cv2.resize(image, target_size, dst=dst, interpolation=CVResizer._CV_INTERPOLATION_MAP[self.method])
@@ -1,9 +1,13 @@
 import socket
 import urllib.request
 from abc import ABC, abstractmethod
+from threading import Thread
 
 
 class Server(ABC):
+    CONCURRENT = False  # True - каждый клиент обслуживается в своём потоке
+    BACKLOG = 5
+
     def __init__(self, host='0.0.0.0', port=0):
         self.name = self.__class__.__name__
         self.host = host
@@ -32,26 +36,34 @@ class Server(ABC):
     def start(self):
         try:
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(1)
+            self.server_socket.listen(self.BACKLOG if self.CONCURRENT else 1)
             print(self.get_network_info(self.server_socket, self.name))
             while True:
                 print(f"{self.name}: Waiting for client connection ({self.server_socket.getsockname()[1]})...")
                 client_socket, address = self.server_socket.accept()
                 print(f"{self.name}: Client connected: {address}")
-                try:
-                    self.client_loop(client_socket, address)
-                except Exception as e:
-                    print(f"{self.name}: while handle_client({address}): {e}")
-                    raise e
-                finally:
-                    print(f"{self.name}: Client {address} connection is terminated.")
-                    client_socket.close()
+                if self.CONCURRENT:
+                    Thread(target=self.handle_client, args=(client_socket, address), daemon=True).start()
+                else:
+                    self.handle_client(client_socket, address)
         except Exception as e:
             print(f"{self.name}: {e}")
             raise e
         finally:
             self.stop()
 
+    def handle_client(self, client_socket, address):
+        try:
+            self.client_loop(client_socket, address)
+        except Exception as e:
+            print(f"{self.name}: while handle_client({address}): {e}")
+            # В многопоточном режиме ошибка одного клиента не останавливает сервер
+            if not self.CONCURRENT:
+                raise e
+        finally:
+            print(f"{self.name}: Client {address} connection is terminated.")
+            client_socket.close()
+
     @abstractmethod
     def client_loop(self, client_socket, address):
         ...
@@ -0,0 +1,210 @@
+import asyncio
+import socket
+from typing import Sequence
+
+from basic.network.core.SocketTransceiver import SocketTransceiverError, TerminatedSocketTransceiverError, \
+    TimeoutSocketTransceiverError
+
+
+class AsyncSocketTransceiver:
+    """
+    Асинхронный аналог SocketTransceiver для работы многих соединений в одном цикле событий asyncio.
+
+    Формат фрейминга и классы исключений совпадают с SocketTransceiver, поэтому
+    синхронная и асинхронная стороны совместимы между собой.
+
+    Приём идёт через loop.sock_recv_into в переиспользуемый буфер: буфер растёт
+    до размера самого большого сообщения и не выделяется заново на каждое сообщение,
+    а список чанков не склеивается.
+
+    Атрибуты:
+        header_size (int): Размер заголовка в байтах для хранения размера данных
+        max_payload_size (int): Максимальный допустимый размер данных в режиме с фреймингом
+        timeout (float | None): Таймаут одной операции приёма/отправки в секундах
+    """
+
+    def __init__(self, sock: socket.socket, header_size: int = 4):
+        """
+        Args:
+            sock: Сокет для отправки и получения данных, переводится в неблокирующий режим
+            header_size: Размер заголовка в байтах (по умолчанию 4 = 4GB)
+
+        Raises:
+            ValueError: Если header_size меньше 1
+        """
+        self.name = self.__class__.__name__
+
+        if header_size < 1:
+            raise ValueError(f"{self.name}: Header size must be positive, got {header_size}")
+
+        sock.setblocking(False)
+        self._socket = sock
+        self.header_size = header_size
+        self.max_payload_size = (256 ** header_size) - 1
+        self.timeout = None
+        self._receive_buffer = bytearray(4096)
+
+    def _validate_size(self, size: int) -> None:
+        """Проверяет, что размер данных находится в допустимых пределах."""
+        if not isinstance(size, int):
+            raise TypeError(f"{self.name}: Size must be integer, got {type(size)}")
+        if size < 0:
+            raise ValueError(f"{self.name}: Size cannot be negative, got {size}")
+        if size > self.max_payload_size:
+            raise ValueError(f"{self.name}: Size {size} exceeds maximum allowed size {self.max_payload_size}")
+
+    def _validate_data(self, data: bytes) -> None:
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError(f"{self.name}: Data must be bytes-like, got {type(data)}")
+        if not data:
+            raise ValueError(f"{self.name}: Data cannot be empty")
+
+    async def _with_timeout(self, coroutine, message: str):
+        try:
+            return await asyncio.wait_for(coroutine, self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutSocketTransceiverError(f"Timeout while {message}")
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError) as e:
+            raise TerminatedSocketTransceiverError(f"Connection lost while {message}: {e}")
+
+    async def _recv_all(self, num_bytes: int) -> memoryview:
+        """
+        Получает точно num_bytes байт в переиспользуемый буфер.
+
+        Returns:
+            memoryview на начало буфера, действителен до следующего приёма
+
+        Raises:
+            TerminatedSocketTransceiverError: Если соединение закрыто или запрошено 0 байт
+            TimeoutSocketTransceiverError: Если превышен таймаут при получении данных
+        """
+        if self.closed:
+            raise TerminatedSocketTransceiverError(f"Socket is closed")
+
+        if num_bytes == 0:
+            raise TerminatedSocketTransceiverError("Input zero bytes to receive")
+
+        self._validate_size(num_bytes)
+
+        if len(self._receive_buffer) < num_bytes:
+            self._receive_buffer = bytearray(num_bytes)
+        view = memoryview(self._receive_buffer)
+
+        loop = asyncio.get_running_loop()
+        received_bytes = 0
+        while received_bytes < num_bytes:
+            received = await self._with_timeout(
+                loop.sock_recv_into(self._socket, view[received_bytes:num_bytes]),
+                f"receiving data ({received_bytes}/{num_bytes} bytes received)"
+            )
+            if not received:
+                raise TerminatedSocketTransceiverError(
+                    f"Connection closed while receiving data ({received_bytes}/{num_bytes} bytes received)"
+                )
+            received_bytes += received
+
+        return view[:num_bytes]
+
+    async def recv_raw(self, num_bytes: int) -> bytes:
+        """Получает ровно num_bytes байт в сыром режиме."""
+        return bytes(await self._recv_all(num_bytes))
+
+    async def recv_framed(self) -> bytes:
+        """Получает одно сообщение в режиме с фреймингом."""
+        size = int.from_bytes(await self._recv_all(self.header_size), 'big', signed=False)
+        return bytes(await self._recv_all(size))
+
+    async def _send_all(self, data: bytes) -> None:
+        if self.closed:
+            raise TerminatedSocketTransceiverError(f"Socket is closed")
+
+        self._validate_data(data)
+
+        loop = asyncio.get_running_loop()
+        await self._with_timeout(loop.sock_sendall(self._socket, data), f"sending data ({len(data)} bytes)")
+
+    async def _send_all_parts(self, parts: Sequence[bytes]) -> None:
+        """Отправляет буферы подряд без склейки (у цикла событий нет векторной отправки)."""
+        for part in parts:
+            if memoryview(part).nbytes:
+                await self._send_all(memoryview(part).cast("B"))
+
+    async def send_raw(self, data: bytes) -> None:
+        """Отправляет данные в сыром режиме."""
+        self._validate_size(len(data))
+        await self._send_all(data)
+
+    async def send_framed(self, data: bytes) -> None:
+        """Отправляет данные в режиме с фреймингом."""
+        await self.send_framed_parts([data])
+
+    async def send_framed_parts(self, parts: Sequence[bytes]) -> None:
+        """Отправляет одно сообщение в режиме с фреймингом, составленное из нескольких буферов."""
+        size = sum(memoryview(part).nbytes for part in parts)  # len memoryview считает элементы, а не байты
+        self._validate_size(size)
+        if not size:
+            raise ValueError(f"{self.name}: Data cannot be empty")
+        size_bytes = size.to_bytes(self.header_size, 'big', signed=False)
+        await self._send_all_parts([size_bytes, *parts])
+
+    def set_timeout(self, timeout: float | None):
+        """Устанавливает таймаут для операций с сокетом в секундах."""
+        self.timeout = timeout
+
+    async def connect(self, __address) -> None:
+        await asyncio.get_running_loop().sock_connect(self._socket, __address)
+
+    def close(self):
+        """Закрывает базовый сокет."""
+        if self._socket:
+            self._socket.close()
+
+    @property
+    def closed(self) -> bool:
+        """Проверяет, закрыт ли сокет."""
+        return self._socket is None or self._socket.fileno() == -1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+if __name__ == "__main__":
+    from time import time
+
+    from basic.network.core.SocketTransceiver import SocketTransceiver
+
+    async def main():
+        server_socket, client_socket = socket.socketpair()
+        sender = AsyncSocketTransceiver(server_socket)
+        receiver = AsyncSocketTransceiver(client_socket)
+        receiver.set_timeout(1)
+        payloads = [bytes([i % 256]) * size for i, size in enumerate((1, 4096, 100_000, 2_000_000))]
+
+        _start_time = time()
+        for payload in payloads:
+            sending = asyncio.create_task(sender.send_framed(payload))
+            assert await receiver.recv_framed() == payload
+            await sending
+        print(f"{receiver.name}: {len(payloads)} messages in {time() - _start_time:.6f} s")
+
+        try:
+            await receiver.recv_raw(1)
+        except SocketTransceiverError as e:
+            print(f"{receiver.name}: {type(e).__name__}: {e}")
+
+        # Совместимость с синхронным SocketTransceiver
+        sync_socket, async_socket = socket.socketpair()
+        SocketTransceiver(sync_socket).send_framed(b"sync")
+        print(f"{receiver.name}: {await AsyncSocketTransceiver(async_socket).recv_framed()}")
+
+        sender.close()
+        try:
+            await receiver.recv_framed()
+        except SocketTransceiverError as e:
+            print(f"{receiver.name}: {type(e).__name__}: {e}")
+        receiver.close()
+
+    asyncio.run(main())
@@ -1,4 +1,6 @@
+import select
 import socket
+from typing import Sequence
 
 
 class SocketTransceiverError(Exception):
@@ -31,16 +33,20 @@ class SocketTransceiver:
         socket (socket.socket): Базовый объект сокета
         header_size (int): Размер заголовка в байтах для хранения размера данных
         max_payload_size (int): Максимальный допустимый размер данных в режиме с фреймингом
-        receive_chunk_size (int): Размер чанков для приема больших сообщений
+        receive_chunk_size (int): Максимальный размер одного вызова recv_into при приеме больших сообщений
     """
 
-    def __init__(self, sock: socket.socket, header_size: int = 4):
+    HAS_SENDMSG = hasattr(socket.socket, "sendmsg")  # нет на Windows
+    SENDMSG_MIN_SIZE = 16384
+
+    def __init__(self, sock: socket.socket, header_size: int = 4, receive_chunk_size: int = 1 << 20):
         """
         Инициализирует трансмиттер сокета.
 
         Args:
             sock: Сокет для отправки и получения данных
             header_size: Размер заголовка в байтах (по умолчанию 4 = 4GB)
+            receive_chunk_size: Максимальный размер одного вызова recv_into (по умолчанию 1 MB)
 
         Raises:
             ValueError: Если header_size меньше 1
@@ -51,7 +57,7 @@ class SocketTransceiver:
             raise ValueError(f"{self.name}: Header size must be positive, got {header_size}")
 
         self._socket = sock
-        self.receive_chunk_size = 4096
+        self.receive_chunk_size = receive_chunk_size
         self.header_size = header_size
         self.max_payload_size = (256 ** header_size) - 1  # e.g., 4GB for 4 bytes
 
@@ -65,23 +71,24 @@ class SocketTransceiver:
             raise ValueError(f"{self.name}: Size {size} exceeds maximum allowed size {self.max_payload_size}")
 
     def _validate_data(self, data: bytes) -> None:
-        if not isinstance(data, bytes):
-            raise TypeError(f"{self.name}: Data must be bytes, got {type(data)}")
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError(f"{self.name}: Data must be bytes-like, got {type(data)}")
         if not data:
             raise ValueError(f"{self.name}: Data cannot be empty")
 
-    def _recv_all(self, num_bytes: int) -> bytes:
+    def _recv_all(self, num_bytes: int) -> bytearray:
         """
         Получает точно указанное количество байт из сокета.
 
         Гарантирует, что будет получено ровно num_bytes байт, даже если данные
-        приходят частями из-за фрагментации сети.
+        приходят частями из-за фрагментации сети. Буфер нужного размера выделяется
+        один раз и заполняется через recv_into, без промежуточных чанков и склейки.
 
         Args:
             num_bytes: Точное количество байт для получения
 
         Returns:
-            bytes: Полученные данные
+            bytearray: Полученные данные
 
         Raises:
             TerminatedSocketTransceiverError: Если соединение закрыто или запрошено 0 байт
@@ -95,7 +102,8 @@ class SocketTransceiver:
 
         self._validate_size(num_bytes)
 
-        data_chunks = []
+        data = bytearray(num_bytes)
+        view = memoryview(data)
         received_bytes = 0
 
         while received_bytes < num_bytes:
@@ -103,27 +111,26 @@ class SocketTransceiver:
             chunk_size = min(self.receive_chunk_size, remaining_bytes)
 
             try:
-                chunk = self._socket.recv(chunk_size)
+                received = self._socket.recv_into(view[received_bytes:], chunk_size)
             except socket.timeout:
                 raise TimeoutSocketTransceiverError(
                     f"Timeout while receiving data ({received_bytes}/{num_bytes} bytes received)"
                 )
 
-            if not chunk:
+            if not received:
                 raise TerminatedSocketTransceiverError(
                     f"Connection closed while receiving data ({received_bytes}/{num_bytes} bytes received)"
                 )
 
-            data_chunks.append(chunk)
-            received_bytes += len(chunk)
+            received_bytes += received
 
-        return b''.join(data_chunks)
+        return data
 
-    def recv_raw(self, num_bytes: int) -> bytes:
+    def recv_raw(self, num_bytes: int) -> bytearray:
         """Получает ровно num_bytes байт в сыром режиме."""
         return self._recv_all(num_bytes)
 
-    def recv_framed(self) -> bytes:
+    def recv_framed(self) -> bytearray:
         """Получает одно сообщение в режиме с фреймингом."""
         size_bytes = self._recv_all(self.header_size)
         size = int.from_bytes(size_bytes, 'big', signed=False)
@@ -135,13 +142,54 @@ class SocketTransceiver:
 
         self._validate_data(data)
 
+        view = memoryview(data).cast("B")
         total_sent = 0
-        data_length = len(data)
+        data_length = len(view)
 
         while total_sent < data_length:
 
             try:
-                sent = self._socket.send(data[total_sent:])
+                sent = self._socket.send(view[total_sent:])
+            except socket.timeout:
+                raise TimeoutSocketTransceiverError(
+                    f"Timeout while sending data ({total_sent}/{data_length} bytes sent)"
+                )
+
+            if sent == 0:
+                raise TerminatedSocketTransceiverError(
+                    f"Connection closed while sending data ({total_sent}/{data_length} bytes sent)"
+                )
+
+            total_sent += sent
+        return total_sent
+
+    def _send_all_parts(self, parts: Sequence[bytes]) -> int:
+        """
+        Отправляет несколько буферов подряд без их склейки.
+
+        Буферы уходят векторным вызовом socket.sendmsg; после частичной отправки уже
+        отправленные буферы отбрасываются, а первый неотправленный сдвигается срезом memoryview.
+        Где sendmsg недоступен (Windows) или данных меньше SENDMSG_MIN_SIZE (склейка дешевле
+        подготовки векторов), буферы склеиваются и отправляются через _send_all.
+        """
+        # Размер в байтах - nbytes: len многобайтового или многомерного memoryview считает элементы
+        data_length = sum(memoryview(part).nbytes for part in parts)
+        if not self.HAS_SENDMSG or data_length < self.SENDMSG_MIN_SIZE:
+            return self._send_all(b''.join(parts))
+
+        if self.closed:
+            raise TerminatedSocketTransceiverError(f"Socket is closed")
+
+        for part in parts:
+            if not isinstance(part, (bytes, bytearray, memoryview)):
+                raise TypeError(f"{self.name}: Data must be bytes-like, got {type(part)}")
+        views = [memoryview(part).cast("B") for part in parts if memoryview(part).nbytes]
+
+        total_sent = 0
+        while views:
+
+            try:
+                sent = self._socket.sendmsg(views)
             except socket.timeout:
                 raise TimeoutSocketTransceiverError(
                     f"Timeout while sending data ({total_sent}/{data_length} bytes sent)"
@@ -153,6 +201,10 @@ class SocketTransceiver:
                 )
 
             total_sent += sent
+            while views and sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            if sent:
+                views[0] = views[0][sent:]
         return total_sent
 
     def send_raw(self, data: bytes) -> None:
@@ -163,10 +215,34 @@ class SocketTransceiver:
 
     def send_framed(self, data: bytes) -> None:
         """Отправляет данные в режиме с фреймингом."""
-        size = len(data)
+        self.send_framed_parts([data])
+
+    def send_framed_parts(self, parts: Sequence[bytes]) -> None:
+        """
+        Отправляет одно сообщение в режиме с фреймингом, составленное из нескольких буферов.
+
+        Заголовок, метаданные и полезная нагрузка не склеиваются и не копируются,
+        а уходят одним векторным вызовом (см. _send_all_parts).
+        """
+        size = sum(memoryview(part).nbytes for part in parts)
         self._validate_size(size)
         size_bytes = size.to_bytes(self.header_size, 'big', signed=False)
-        self._send_all(size_bytes + data)
+        self._send_all_parts([size_bytes, *parts])
+
+    def has_data(self, timeout: float = 0.0) -> bool:
+        """
+        Проверяет, можно ли прочитать данные из сокета без блокировки.
+
+        Закрытие соединения удалённой стороной тоже считается готовностью к чтению:
+        следующий recv_raw в этом случае выбросит TerminatedSocketTransceiverError.
+
+        Args:
+            timeout: Время ожидания данных в секундах (0 - только проверка)
+        """
+        if self.closed:
+            raise TerminatedSocketTransceiverError(f"Socket is closed")
+        readable, _, _ = select.select([self._socket], [], [], timeout)
+        return bool(readable)
 
     def set_timeout(self, timeout: float | None):
         """Устанавливает таймаут для операций с сокетом в секундах."""
@@ -0,0 +1,107 @@
+import socket
+from threading import Thread
+from time import time
+
+import numpy as np
+
+from basic.network.core.SocketTransceiver import SocketTransceiver
+
+
+class LegacySocketTransceiver(SocketTransceiver):
+    """Прежние приём (recv по 4096 байт, список чанков и b''.join) и отправка (склейка и срезы bytes)"""
+
+    def _recv_all(self, num_bytes: int) -> bytes:
+        data_chunks = []
+        received_bytes = 0
+        while received_bytes < num_bytes:
+            chunk = self._socket.recv(min(4096, num_bytes - received_bytes))
+            if not chunk:
+                raise ConnectionError("Connection closed")
+            data_chunks.append(chunk)
+            received_bytes += len(chunk)
+        return b''.join(data_chunks)
+
+    def send_framed_parts(self, parts) -> None:
+        data = b''.join(parts)
+        data = len(data).to_bytes(self.header_size, 'big') + data
+        total_sent = 0
+        while total_sent < len(data):
+            total_sent += self._socket.send(data[total_sent:])
+
+
+class SocketTransceiverBenchmark:
+    """Сравнение приёма recv + join с приёмом recv_into в предвыделенный буфер через локальный socketpair"""
+    SIZES = {"1 KB": 1 << 10, "64 KB": 1 << 16, "1 MB": 1 << 20, "8 MB": 1 << 23}
+
+    def __init__(self):
+        self._rng = np.random.default_rng(0)
+
+    @staticmethod
+    def _measure(receiver: SocketTransceiver, sender: SocketTransceiver, payload: bytes, iterations: int) -> float:
+        sending = Thread(target=lambda: [sender.send_framed(payload) for _ in range(iterations + 1)])
+        sending.start()
+        receiver.recv_framed()  # Прогрев
+        times = []
+        for _ in range(iterations):
+            start_time = time()
+            receiver.recv_framed()
+            times.append(time() - start_time)
+        sending.join()
+        return float(np.mean(times))
+
+    @staticmethod
+    def _measure_send(sender: SocketTransceiver, receiver: SocketTransceiver, parts, iterations: int) -> float:
+        receiving = Thread(target=lambda: [receiver.recv_framed() for _ in range(iterations + 1)])
+        receiving.start()
+        sender.send_framed_parts(parts)  # Прогрев
+        times = []
+        for _ in range(iterations):
+            start_time = time()
+            sender.send_framed_parts(parts)
+            times.append(time() - start_time)
+        receiving.join()
+        return float(np.mean(times))
+
+    def test_send(self, iterations: int = 30):
+        print(f"iterations={iterations}")
+        print(str().rjust(8), "join+send(sec)".rjust(14), "sendmsg(sec)".rjust(14), sep="\t")
+        for size_name, size in self.SIZES.items():
+            parts = [bytes(24), self._rng.integers(0, 256, size, dtype=np.uint8).tobytes()]
+            row = [size_name.rjust(8)]
+            for sender_class in (LegacySocketTransceiver, SocketTransceiver):
+                sender_socket, receiver_socket = socket.socketpair()
+                with sender_class(sender_socket) as sender, SocketTransceiver(receiver_socket) as receiver:
+                    row.append(f"{self._measure_send(sender, receiver, parts, iterations):.6f}".rjust(14))
+            print(*row, sep="\t")
+
+    def test(self, iterations: int = 30):
+        print(f"iterations={iterations}")
+        print(str().rjust(8), "recv+join(sec)".rjust(14), "recv_into(sec)".rjust(14), sep="\t")
+        for size_name, size in self.SIZES.items():
+            payload = self._rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+            row = [size_name.rjust(8)]
+            for receiver_class in (LegacySocketTransceiver, SocketTransceiver):
+                sender_socket, receiver_socket = socket.socketpair()
+                with SocketTransceiver(sender_socket) as sender, receiver_class(receiver_socket) as receiver:
+                    row.append(f"{self._measure(receiver, sender, payload, iterations):.6f}".rjust(14))
+            print(*row, sep="\t")
+
+
+if __name__ == "__main__":
+    SocketTransceiverBenchmark().test()
+    SocketTransceiverBenchmark().test_send()
+
+"""
+iterations=30
+        	recv+join(sec)	recv_into(sec)
+    1 KB	      0.000018	      0.000008
+   64 KB	      0.000055	      0.000034
+    1 MB	      0.002074	      0.000277
+    8 MB	      0.008510	      0.003251
+iterations=30
+        	join+send(sec)	  sendmsg(sec)
+    1 KB	      0.000004	      0.000009
+   64 KB	      0.000068	      0.000072
+    1 MB	      0.001179	      0.001005
+    8 MB	      0.023934	      0.008674
+"""
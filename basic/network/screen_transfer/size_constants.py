@@ -2,7 +2,18 @@ SCREEN_WIDTH_SIZE = 2
 SCREEN_HEIGHT_SIZE = 2
 COLORS_SIZE = 1
 SCALE_PERCENT_SIZE = 1
+COMPRESSOR_SIZE = 1
+DICTIONARY_LENGTH_SIZE = 4
+QUANTIZER_SIZE = 1
+DITHER_SIZE = 1
 SCREEN_INDEX_SIZE = 4
 SCREEN_TIME_SIZE = 8
 SCREEN_CURSOR_X_SIZE = 2
 SCREEN_CURSOR_Y_SIZE = 2
+STREAM_MODE_SIZE = 1
+STREAM_WINDOW_SIZE = 1
+STREAM_CREDIT_SIZE = 1
+
+# Режимы передачи кадров, согласуются при рукопожатии
+STREAM_MODE_POLL = 0  # кадр по запросу клиента (1 байт на кадр)
+STREAM_MODE_PUSH = 1  # сервер отправляет кадры сам, пока есть кредиты клиента
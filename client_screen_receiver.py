@@ -1,5 +1,5 @@
 import socket
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Optional
 
 import numpy as np
 
@@ -12,7 +12,9 @@ from basic.network.screen_transfer.size_constants import *
 class ScreenReceiverClient:
     SOCKET_TIMEOUT = 100
 
-    def __init__(self, server_host, server_port=8888, colors: int = 3, scale_percent: int = 60):
+    def __init__(self, server_host, server_port=8888, colors: int = 3, scale_percent: int = 60,
+                 stream_mode: int = STREAM_MODE_PUSH, stream_window: int = 2, compressor: str = "zstd_stream",
+                 quantizer: str = "gray", dither: str = "none", dictionary: Optional[bytes] = None):
         self.name = self.__class__.__name__
         self._server_host = server_host
         self._server_port = server_port
@@ -26,6 +28,16 @@ class ScreenReceiverClient:
         self._socket_transceiver.set_timeout(self.SOCKET_TIMEOUT)
 
         self.width, self.height, self.colors, self.scale_percent = 1, 1, colors, scale_percent
+        # В потоковом режиме сервер отправляет до stream_window кадров без подтверждения
+        self.stream_mode, self.stream_window = stream_mode, stream_window
+        self.compressor = compressor  # имя из ToolsManager.COMPRESSOR_MAP
+        # Словарь сжатия (ZstdCompressor.train_dictionary / save_dictionary) передаётся серверу при рукопожатии
+        if dictionary and not hasattr(ToolsManager.COMPRESSOR_MAP[compressor], "set_dictionary"):
+            raise ValueError(f"{self.name}: {compressor} compressor does not support dictionaries")
+        self.dictionary = dictionary
+        self.quantizer = quantizer  # имя из ToolsManager.QUANTIZER_NAMES
+        # Дизеринг выполняет сервер при квантовании ("gray"), деквантование клиента от него не зависит
+        self.dither = dither  # имя из ToolsManager.DITHER_NAMES
         self.tools_manager = ToolsManager()
 
     def get_screen_size(self) -> Tuple[int, int]:
@@ -41,16 +53,32 @@ class ScreenReceiverClient:
             # Отправка параметров выходного изображения
             self._socket_transceiver.send_raw(self.colors.to_bytes(COLORS_SIZE, 'big'))
             self._socket_transceiver.send_raw(self.scale_percent.to_bytes(SCALE_PERCENT_SIZE, 'big'))
+            compressor_code = ToolsManager.COMPRESSOR_NAMES.index(self.compressor)
+            self._socket_transceiver.send_raw(compressor_code.to_bytes(COMPRESSOR_SIZE, 'big'))
+            dictionary = self.dictionary or b""
+            self._socket_transceiver.send_raw(len(dictionary).to_bytes(DICTIONARY_LENGTH_SIZE, 'big'))
+            if dictionary:
+                self._socket_transceiver.send_raw(dictionary)
+            quantizer_code = ToolsManager.QUANTIZER_NAMES.index(self.quantizer)
+            self._socket_transceiver.send_raw(quantizer_code.to_bytes(QUANTIZER_SIZE, 'big'))
+            dither_code = ToolsManager.DITHER_NAMES.index(self.dither)
+            self._socket_transceiver.send_raw(dither_code.to_bytes(DITHER_SIZE, 'big'))
+            # Согласование режима передачи кадров
+            self._socket_transceiver.send_raw(self.stream_mode.to_bytes(STREAM_MODE_SIZE, 'big'))
+            self._socket_transceiver.send_raw(self.stream_window.to_bytes(STREAM_WINDOW_SIZE, 'big'))
         except SocketTransceiverError as e:
             print(f"{self.name}: {e}")
             self.close()
             return False
-        self.tools_manager = ToolsManager(self.width, self.height, self.colors, self.scale_percent)
+        self.tools_manager = ToolsManager(
+            self.width, self.height, self.colors, self.scale_percent, self.compressor, quantizer=self.quantizer)
+        if self.dictionary:
+            self.tools_manager.set_compression_dictionary(self.dictionary)
         print(f"{self.name}: {self.tools_manager} is created!")
         return True
 
     @staticmethod
-    def read_data(data: bytes) -> dict:
+    def read_data(data: bytes | bytearray) -> dict:
         result_dict = dict()
         result_dict["index"] = int.from_bytes(data[:SCREEN_INDEX_SIZE], 'big')
         offset = SCREEN_INDEX_SIZE
@@ -62,14 +90,18 @@ class ScreenReceiverClient:
         offset += SCREEN_CURSOR_X_SIZE
         result_dict["cursor_y"] = int.from_bytes(data[offset:offset + SCREEN_CURSOR_Y_SIZE], 'big')
         offset += SCREEN_CURSOR_Y_SIZE
-        result_dict["data"] = data[offset:]
+        result_dict["data"] = memoryview(data)[offset:]  # без копии полезной нагрузки
         return result_dict
 
     def recv_screen(self) -> Dict:
         # Sending request, Receiving
         _request_time_ms = time_ms()
-        self._socket_transceiver.send_raw(b"\x01")
+        if self.stream_mode == STREAM_MODE_POLL:
+            self._socket_transceiver.send_raw(b"\x01")
         received = self._socket_transceiver.recv_framed()
+        if self.stream_mode == STREAM_MODE_PUSH:
+            # Кредит возвращается до декодирования, чтобы сервер уже кодировал следующий кадр
+            self._socket_transceiver.send_raw((1).to_bytes(STREAM_CREDIT_SIZE, 'big'))
         # sleep(0.2)  # задержка сети
         _received_time_ms = time_ms()
 
@@ -1,10 +1,13 @@
 import socket
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List
 
 import numpy as np
 import pyautogui
 
+from basic.image.EncodePipeline import EncodePipeline
+from basic.image.SharedReferenceSource import SharedReferenceSource
 from basic.image.ToolsManager import ToolsManager
+from basic.image.numba_threading import configure_numba_threading_layer
 from basic.network.core.ABC_Server import Server
 from basic.network.core.SocketTransceiver import SocketTransceiver, TimeoutSocketTransceiverError, \
     SocketTransceiverError
@@ -13,14 +16,23 @@ from basic.network.screen_transfer.size_constants import *
 
 
 class ServerScreener(Server):
+    CONCURRENT = True
+    SHARE_CAPTURE = True  # клиенты с одинаковыми параметрами используют общий захват и квантование
     SOCKET_TIMEOUT = 10
     SOCKET_REQUEST_TIMEOUT = 0.010
+    USE_ENCODE_PIPELINE = False  # захват, разность и сжатие в отдельных потоках
+    ENCODE_PIPELINE_QUEUE_SIZE = 1
+    ENCODE_PIPELINE_STATS_PERIOD = 100  # кадров между выводом статистики конвейера
+    MAX_DICTIONARY_LENGTH = 1 << 20  # словарь сжатия от клиента, байт
 
     def __init__(self, host='0.0.0.0', port=8888):
         super().__init__(host, port)
         self.name = self.__class__.__name__
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+        # Клиенты и этапы конвейера запускают ядра numba не из главного потока; слой потоков
+        # выбирается на весь процесс при первом ядре, поэтому до создания ToolsManager
+        configure_numba_threading_layer()
 
     def init_tools_manager(self, socket_transceiver: SocketTransceiver) -> ToolsManager:
         try:
@@ -31,60 +43,222 @@ class ServerScreener(Server):
             # Получение параметров выходного изображения
             colors = int.from_bytes(socket_transceiver.recv_raw(COLORS_SIZE), byteorder="big")
             scale_percent = int.from_bytes(socket_transceiver.recv_raw(SCALE_PERCENT_SIZE), byteorder="big")
-            return ToolsManager(screen_width, screen_height, colors, scale_percent)
+            # Согласование компрессора (код - индекс в ToolsManager.COMPRESSOR_NAMES)
+            compressor_code = int.from_bytes(socket_transceiver.recv_raw(COMPRESSOR_SIZE), byteorder="big")
+            if compressor_code >= len(ToolsManager.COMPRESSOR_NAMES):
+                raise ValueError(f"Unknown compressor code {compressor_code}")
+            compressor = ToolsManager.COMPRESSOR_NAMES[compressor_code]
+            # Словарь сжатия (ZstdCompressor.train_dictionary): длина и байты, 0 - без словаря
+            dictionary_length = int.from_bytes(socket_transceiver.recv_raw(DICTIONARY_LENGTH_SIZE), byteorder="big")
+            if dictionary_length > self.MAX_DICTIONARY_LENGTH:
+                raise ValueError(f"Dictionary of {dictionary_length} B exceeds {self.MAX_DICTIONARY_LENGTH} B")
+            dictionary = bytes(socket_transceiver.recv_raw(dictionary_length)) if dictionary_length else None
+            # Согласование квантователя (код - индекс в ToolsManager.QUANTIZER_NAMES)
+            quantizer_code = int.from_bytes(socket_transceiver.recv_raw(QUANTIZER_SIZE), byteorder="big")
+            if quantizer_code >= len(ToolsManager.QUANTIZER_NAMES):
+                raise ValueError(f"Unknown quantizer code {quantizer_code}")
+            quantizer = ToolsManager.QUANTIZER_NAMES[quantizer_code]
+            # Согласование дизеринга (код - индекс в ToolsManager.DITHER_NAMES), нужен только серверу
+            dither_code = int.from_bytes(socket_transceiver.recv_raw(DITHER_SIZE), byteorder="big")
+            if dither_code >= len(ToolsManager.DITHER_NAMES):
+                raise ValueError(f"Unknown dither code {dither_code}")
+            dither = ToolsManager.DITHER_NAMES[dither_code]
+            tools_manager = ToolsManager(screen_width, screen_height, colors, scale_percent, compressor,
+                                         dither=dither, quantizer=quantizer)
+            if dictionary is not None:
+                try:
+                    tools_manager.set_compression_dictionary(dictionary)
+                except Exception:
+                    tools_manager.close()
+                    raise
+            return tools_manager
         except Exception as e:
             print(f"{self.name}.init_tools_manager: {e}")
             raise e
 
+    def init_stream_mode(self, socket_transceiver: SocketTransceiver) -> Tuple[int, int]:
+        """Получает режим передачи кадров и окно кредитов для потокового режима."""
+        try:
+            stream_mode = int.from_bytes(socket_transceiver.recv_raw(STREAM_MODE_SIZE), byteorder="big")
+            stream_window = int.from_bytes(socket_transceiver.recv_raw(STREAM_WINDOW_SIZE), byteorder="big")
+            if stream_mode not in (STREAM_MODE_POLL, STREAM_MODE_PUSH):
+                raise ValueError(f"Unknown stream mode {stream_mode}")
+            if stream_mode == STREAM_MODE_PUSH and stream_window < 1:
+                raise ValueError(f"Stream window must be positive, got {stream_window}")
+            return stream_mode, stream_window
+        except Exception as e:
+            print(f"{self.name}.init_stream_mode: {e}")
+            raise e
+
+    def recv_credits(self, socket_transceiver: SocketTransceiver, block: bool) -> int:
+        """Забирает все пришедшие кредиты; при block=True ждёт хотя бы один."""
+        credits = 0
+        if block:
+            socket_transceiver.set_timeout(None)
+            credits += int.from_bytes(socket_transceiver.recv_raw(STREAM_CREDIT_SIZE), byteorder="big")
+            socket_transceiver.set_timeout(self.SOCKET_TIMEOUT)
+        while socket_transceiver.has_data():
+            credits += int.from_bytes(socket_transceiver.recv_raw(STREAM_CREDIT_SIZE), byteorder="big")
+        return credits
+
     @staticmethod
-    def prepare_data_to_send(loop_index: int, tools_manager: ToolsManager) -> Tuple[int, Dict, np.ndarray, bytes]:
-        _screenshotted_time_ms = time_ms()
-        stats, reference, data = tools_manager.encode_image()
+    def build_frame(loop_index: int, screenshotted_time_ms: int, encoded_time_ms: int, data: bytes) -> List[bytes]:
+        """Возвращает части кадра [метаданные, данные] для send_framed_parts, данные не копируются."""
         cursor_x, cursor_y = pyautogui.position()
-        _encoded_time_ms = time_ms()
-        data_to_send_list = [
+        metadata_list = [
             loop_index.to_bytes(SCREEN_INDEX_SIZE, 'big'),
-            _screenshotted_time_ms.to_bytes(SCREEN_TIME_SIZE, 'big'),
-            _encoded_time_ms.to_bytes(SCREEN_TIME_SIZE, 'big'),
+            screenshotted_time_ms.to_bytes(SCREEN_TIME_SIZE, 'big'),
+            encoded_time_ms.to_bytes(SCREEN_TIME_SIZE, 'big'),
             cursor_x.to_bytes(SCREEN_CURSOR_X_SIZE, 'big'),
             cursor_y.to_bytes(SCREEN_CURSOR_Y_SIZE, 'big'),
-            data
         ]
-        return _encoded_time_ms - _screenshotted_time_ms, stats, reference, b''.join(data_to_send_list)
+        return [b''.join(metadata_list), data]
+
+    @staticmethod
+    def prepare_data_to_send(loop_index: int, tools_manager: ToolsManager) -> Tuple[int, Dict, np.ndarray, List[bytes]]:
+        _screenshotted_time_ms = time_ms()
+        stats, reference, data = tools_manager.encode_image()
+        _encoded_time_ms = time_ms()
+        data_to_send = ServerScreener.build_frame(loop_index, _screenshotted_time_ms, _encoded_time_ms, data)
+        return _encoded_time_ms - _screenshotted_time_ms, stats, reference, data_to_send
+
+    def pipeline_loop(self, socket_transceiver: SocketTransceiver, tools_manager: ToolsManager) -> None:
+        """
+        Цикл отправки в конвейерном режиме.
+
+        Конвейер сам обновляет опорный кадр после каждого кадра, поэтому кадры не отбрасываются:
+        на каждый запрос клиента отправляется следующий по порядку кадр из очереди.
+        """
+        with EncodePipeline(tools_manager, queue_size=self.ENCODE_PIPELINE_QUEUE_SIZE) as pipeline:
+            index = 0
+            while True:
+                index += 1
+
+                # Waiting for request
+                socket_transceiver.set_timeout(None)
+                socket_transceiver.recv_raw(1)
+                socket_transceiver.set_timeout(self.SOCKET_TIMEOUT)
+
+                # Screen encoding
+                stats, reference, data, _screenshotted_time_ms, _encoded_time_ms = pipeline.get()
+                data_to_send = self.build_frame(index, _screenshotted_time_ms, _encoded_time_ms, data)
+
+                # Sending
+                socket_transceiver.send_framed_parts(data_to_send)
+                _sent_time_ms = time_ms()
+
+                # Debug
+                index_str = f"{index}: "
+                align = "".ljust(len(index_str))
+                print(f"{index_str}{_encoded_time_ms}: Encoded for {_encoded_time_ms - _screenshotted_time_ms} ms")
+                print(f"{align}{_sent_time_ms}: {sum(map(len, data_to_send))} B is sent!")
+                if index % self.ENCODE_PIPELINE_STATS_PERIOD == 0:
+                    pipeline.print_stats()
+
+    def push_loop(self, socket_transceiver: SocketTransceiver, tools_manager: ToolsManager, window: int) -> None:
+        """
+        Потоковый режим: кадр отправляется сразу после кодирования, без запроса на каждый кадр.
+
+        Управление потоком по кредитам: клиент выдаёт window кредитов при рукопожатии
+        и возвращает по кредиту на каждый принятый кадр. Кадр кодируется только при наличии
+        кредита, поэтому каждый закодированный кадр отправляется и опорный кадр обновляется сразу.
+        """
+        pipeline = EncodePipeline(tools_manager, queue_size=self.ENCODE_PIPELINE_QUEUE_SIZE) \
+            if self.USE_ENCODE_PIPELINE else None
+        try:
+            if pipeline is not None:
+                pipeline.start()
+            credits = window
+            index = 0
+            while True:
+                index += 1
+
+                # Waiting for credits
+                credits += self.recv_credits(socket_transceiver, block=credits == 0)
+
+                # Screen encoding
+                if pipeline is None:
+                    _encode_delta_ms, stats, reference, data_to_send = self.prepare_data_to_send(index, tools_manager)
+                    tools_manager.update_reference(reference)
+                else:
+                    stats, reference, data, _screenshotted_time_ms, _encoded_time_ms = pipeline.get()
+                    _encode_delta_ms = _encoded_time_ms - _screenshotted_time_ms
+                    data_to_send = self.build_frame(index, _screenshotted_time_ms, _encoded_time_ms, data)
+                _encoded_time_ms = time_ms()
+
+                # Sending
+                socket_transceiver.send_framed_parts(data_to_send)
+                credits -= 1
+                _sent_time_ms = time_ms()
+
+                # Debug
+                index_str = f"{index}: "
+                align = "".ljust(len(index_str))
+                print(f"{index_str}{_encoded_time_ms}: Encoded for {_encode_delta_ms} ms")
+                print(f"{align}{_sent_time_ms}: {sum(map(len, data_to_send))} B is sent! Credits: {credits}")
+                if pipeline is not None and index % self.ENCODE_PIPELINE_STATS_PERIOD == 0:
+                    pipeline.print_stats()
+        finally:
+            if pipeline is not None:
+                pipeline.stop()
 
     def client_loop(self, client_socket, address):
         socket_transceiver = SocketTransceiver(client_socket)
         socket_transceiver.set_timeout(None)
-        tools_manager = self.init_tools_manager(socket_transceiver)
-        print(f"{self.name}: {tools_manager} is created!")
-        print(f"{self.name}: start client_loop.")
+        # Всё после рукопожатия - внутри try: сессия захвата, пулы компрессора и общий источник
+        # освобождаются и при обрыве соединения во время рукопожатия
+        tools_manager = None
+        reference_source = None
         try:
+            tools_manager = self.init_tools_manager(socket_transceiver)
+            stream_mode, stream_window = self.init_stream_mode(socket_transceiver)
+            if self.SHARE_CAPTURE:
+                reference_source = SharedReferenceSource.acquire(
+                    tools_manager.parameters, tools_manager.quantizer_name, tools_manager.dither)
+            tools_manager.set_reference_source(reference_source)
+            print(f"{self.name}: {tools_manager} is created with {tools_manager.compressor_name} compressor "
+                  f"and {tools_manager.quantizer_name} quantizer (dither: {tools_manager.dither})!")
+            if reference_source is not None:
+                print(f"{self.name}: {reference_source} is used!")
+            print(f"{self.name}: start client_loop in {'push' if stream_mode == STREAM_MODE_PUSH else 'poll'} mode.")
+            if stream_mode == STREAM_MODE_PUSH:
+                self.push_loop(socket_transceiver, tools_manager, stream_window)
+                return
+            if self.USE_ENCODE_PIPELINE:
+                self.pipeline_loop(socket_transceiver, tools_manager)
+                return
             index = 0
             while True:
                 index += 1
 
+                # Компрессор с состоянием не позволяет отбросить сжатый кадр: запрос ждётся до кодирования
+                if tools_manager.stateful_compression:
+                    socket_transceiver.set_timeout(None)
+                    socket_transceiver.recv_raw(1)
+
                 # Screen encoding
                 _encode_delta_ms, stats, reference, data_to_send = self.prepare_data_to_send(index, tools_manager)
                 _encoded_time_ms = time_ms()
 
                 # Waiting for request
-                socket_transceiver.set_timeout(self.SOCKET_REQUEST_TIMEOUT)
-                try:
-                    socket_transceiver.recv_raw(1)
-                except TimeoutSocketTransceiverError:
-                    continue
+                if not tools_manager.stateful_compression:
+                    socket_transceiver.set_timeout(self.SOCKET_REQUEST_TIMEOUT)
+                    try:
+                        socket_transceiver.recv_raw(1)
+                    except TimeoutSocketTransceiverError:
+                        continue
                 socket_transceiver.set_timeout(self.SOCKET_TIMEOUT)
                 tools_manager.update_reference(reference)
 
                 # Sending
-                socket_transceiver.send_framed(data_to_send)
+                socket_transceiver.send_framed_parts(data_to_send)
                 _sent_time_ms = time_ms()
 
                 # Debug
                 index_str = f"{index}: "
                 align = "".ljust(len(index_str))
                 print(f"{index_str}{_encoded_time_ms}: Encoded for {_encode_delta_ms} ms")
-                print(f"{align}{_sent_time_ms}: {len(data_to_send)} B is sent!")
+                print(f"{align}{_sent_time_ms}: {sum(map(len, data_to_send))} B is sent!")
 
         except (SocketTransceiverError, ConnectionResetError, ConnectionAbortedError) as e:
             print(f"{self.name}: {e}")
@@ -92,6 +266,11 @@ class ServerScreener(Server):
         except Exception as e:
             print(f"{self.name}: {e}")
             raise e
+        finally:
+            if tools_manager is not None:
+                tools_manager.close()
+            if reference_source is not None:
+                reference_source.release()
 
 
 if __name__ == "__main__":